@@ -0,0 +1,151 @@
+# backend/app/application/analysis_report.py
+"""
+Reporte estructurado de un análisis (modo de salida JSON de Gemini).
+
+Características:
+- Validación única de la respuesta con pydantic (sin regex sobre markdown)
+- Render al markdown histórico para historial y clientes existentes
+- Aplicación local de ediciones por rango de líneas (modo OUTPUT_EDITS) validada con ast
+- Unión de hallazgos y reescritura del modo paralelo en un solo reporte
+"""
+
+import ast
+
+from pydantic import BaseModel, Field
+
+
+# ----------------- EXCEPTIONS -----------------
+
+
+class EditApplyError(ValueError):
+    """Las ediciones del modelo no se pueden aplicar o no producen Python válido."""
+    pass
+
+
+# ----------------- SCHEMAS -----------------
+
+
+class CambioItem(BaseModel):
+    """Cambio aplicado en el código mejorado."""
+
+    tipo: str
+    descripcion: str
+
+
+class EdicionItem(BaseModel):
+    """Reemplazo de las líneas [linea_inicio, linea_fin] (1-based, inclusivo)."""
+
+    linea_inicio: int = Field(ge=1)
+    linea_fin: int = Field(ge=0)
+    reemplazo: str = ""
+
+
+class AnalysisReport(BaseModel):
+    """Respuesta JSON del análisis (espejo de ANALYSIS_RESPONSE_SCHEMA)."""
+
+    bugs: list[str] = Field(default_factory=list)
+    code_smells: list[str] = Field(default_factory=list)
+    mejoras_rendimiento: list[str] = Field(default_factory=list)
+    score: int = Field(ge=0, le=100)
+    justificacion: str = ""
+    codigo_mejorado: str = ""
+    cambios: list[CambioItem] = Field(default_factory=list)
+    ediciones: list[EdicionItem] = Field(default_factory=list)
+
+    def to_markdown(self, include_code: bool = True) -> str:
+        """Renderiza el reporte con el mismo formato que el modo markdown."""
+        secciones = [
+            _section("## 🐛 Bugs Potenciales", self.bugs, "✅ No se detectaron bugs"),
+            _section("## 👃 Code Smells", self.code_smells, "✅ Código limpio"),
+            _section("## ⚡ Mejoras de Rendimiento", self.mejoras_rendimiento, "✅ Rendimiento óptimo"),
+            f"## 📊 Score de Calidad: {self.score}/100\n\n**Justificación:** {self.justificacion}",
+        ]
+        if include_code and self.codigo_mejorado:
+            secciones.append(f"## ✨ Código Mejorado\n\n```python\n{self.codigo_mejorado}\n```")
+        if self.cambios:
+            items = "\n".join(
+                f"{i}. **{c.tipo}**: {c.descripcion}" for i, c in enumerate(self.cambios, start=1)
+            )
+            secciones.append(f"## 📝 Cambios Realizados\n{items}")
+        return "\n\n".join(secciones)
+
+
+class RewriteReport(BaseModel):
+    """Respuesta de la request de reescritura del modo paralelo."""
+
+    codigo_mejorado: str
+    cambios: list[CambioItem] = Field(default_factory=list)
+
+
+def _section(title: str, items: list[str], empty: str) -> str:
+    lines = items or [empty]
+    return title + "\n" + "\n".join(f"- {line}" for line in lines)
+
+
+# ----------------- PARSING -----------------
+
+
+def parse_report(text: str | None) -> AnalysisReport:
+    """
+    Valida la respuesta JSON de Gemini en un solo paso.
+
+    Raises:
+        ValidationError: JSON inválido, truncado o que no cumple el esquema
+    """
+    return AnalysisReport.model_validate_json(text or "")
+
+
+def merge_parallel(findings_text: str | None, rewrite_text: str | None) -> AnalysisReport:
+    """
+    Une las dos respuestas del modo paralelo en un AnalysisReport.
+
+    Raises:
+        ValidationError: Alguna de las dos no cumple su esquema
+    """
+    findings = parse_report(findings_text)
+    rewrite = RewriteReport.model_validate_json(rewrite_text or "")
+    return findings.model_copy(
+        update={"codigo_mejorado": rewrite.codigo_mejorado, "cambios": rewrite.cambios}
+    )
+
+
+# ----------------- EDITS -----------------
+
+
+def apply_edits(code: str, ediciones: list[EdicionItem]) -> str:
+    """
+    Aplica las ediciones sobre el código original y valida el resultado.
+
+    Se aplican de abajo hacia arriba para que los números de línea de las
+    ediciones restantes sigan siendo los del código que vio el modelo.
+
+    Raises:
+        EditApplyError: Rango fuera del archivo, rangos superpuestos o
+            resultado que no parsea con ast
+    """
+    lines = code.split("\n")
+    ordenadas = sorted(ediciones, key=lambda e: (e.linea_inicio, e.linea_fin), reverse=True)
+
+    limite = len(lines) + 1  # inicio de la edición anterior (ya aplicada)
+    for edicion in ordenadas:
+        inicio, fin = edicion.linea_inicio, edicion.linea_fin
+        if fin < inicio - 1 or fin > len(lines) or inicio > len(lines) + 1:
+            raise EditApplyError(f"Rango inválido {inicio}-{fin} ({len(lines)} líneas)")
+        if fin >= limite:
+            raise EditApplyError(f"Rango {inicio}-{fin} se superpone con otra edición")
+        reemplazo = edicion.reemplazo.split("\n") if edicion.reemplazo else []
+        lines[inicio - 1:fin] = reemplazo
+        limite = inicio
+
+    resultado = "\n".join(lines)
+    try:
+        ast.parse(resultado)
+    except (SyntaxError, ValueError) as e:
+        raise EditApplyError(f"El código editado no es Python válido: {e}") from e
+    return resultado
+
+
+def resolve_edits(code: str, report: AnalysisReport) -> AnalysisReport:
+    """Completa `codigo_mejorado` aplicando las ediciones del reporte (ver apply_edits)."""
+    report.codigo_mejorado = apply_edits(code, report.ediciones)
+    return report
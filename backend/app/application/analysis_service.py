@@ -3,25 +3,146 @@
 Servicio de análisis de código Python con IA.
 
 Responsabilidades:
-- Orquestar análisis de código con Gemini
+- Orquestar análisis de código con Gemini (modelo según tamaño/complejidad + fallback)
+- Validar el reporte estructurado (JSON) o extraer score/código del markdown
+- Aplicar localmente las ediciones por líneas del modelo en archivos largos
+- Modo paralelo opcional (hallazgos y reescritura concurrentes)
+- Caché de resultados por contenido (LRU en memoria + Redis)
+- Reutilización opcional de análisis previos casi idénticos (MinHash/LSH local y embeddings + pgvector)
+- Coalescing de análisis idénticos en curso (single-flight local y entre workers)
+- Opcionalmente, terminar en segundo plano un análisis cuyo cliente se desconectó
 - Persistir resultados en base de datos
-- Gestionar estadísticas e historial de usuarios
+- Gestionar estadísticas, historial y consumo de tokens de usuarios
 """
 
+import asyncio
+import hashlib
 import logging
+import math
 import re
-from datetime import date, datetime
-from typing import Any, Optional
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
+from pydantic import ValidationError
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.application.analysis_report import (
+    AnalysisReport,
+    EditApplyError,
+    merge_parallel,
+    parse_report,
+    resolve_edits,
+)
+from app.application.code_normalizer import code_fingerprint
+from app.application.minhash import (
+    Signature,
+    band_hashes,
+    best_match,
+    minhash_signature,
+    pack_signature,
+    unpack_signature,
+)
+from app.application.model_router import ModelRoute, ModelRouter, is_fallback_error
+from app.core import json_codec
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.domain.models import Analysis, User
-from app.infrastructure.gemini_client import GeminiClient
+from app.infrastructure.analysis_minhash import (
+    MinHashIndexError,
+    find_lsh_candidates,
+    index_minhash,
+    load_similar_analysis,
+)
+from app.infrastructure.analysis_vectors import (
+    SimilarAnalysis,
+    VectorSearchError,
+    find_similar_analysis,
+    store_code_embedding,
+)
+from app.infrastructure.gemini_client import (
+    ANALYSIS_EMPTY_MESSAGE,
+    ANALYSIS_GENERATION_CONFIG,
+    ANALYSIS_PROMPT_VERSION,
+    ANALYSIS_TIMEOUT_MESSAGE,
+    OUTPUT_EDITS,
+    OUTPUT_JSON,
+    OUTPUT_MARKDOWN,
+    ROLE_ANONYMOUS,
+    GeminiClient,
+    GeminiClientRegistry,
+    GeminiError,
+    GeminiTimeoutError,
+    GeminiUnavailableError,
+    GenerationResult,
+    TokenUsage,
+    key_fingerprint,
+    size_bucket,
+)
+from app.infrastructure.result_cache import ResultCache
+from app.infrastructure.single_flight import FlightResult, SingleFlight
+
 
 logger = logging.getLogger(__name__)
 
+# Etiqueta `output` de las métricas para el par de requests del modo paralelo
+OUTPUT_PARALLEL = "parallel"
+
+# Un coordinador por proceso (los servicios se crean por request)
+_analysis_flight = SingleFlight(
+    "analysis",
+    wait_timeout=settings.ANALYSIS_SINGLE_FLIGHT_WAIT,
+    lock_ttl=settings.ANALYSIS_SINGLE_FLIGHT_LOCK_TTL,
+)
+_analysis_cache = ResultCache(
+    "analysis",
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    ttl=settings.ANALYSIS_CACHE_TTL,
+)
+
+# Análisis que siguen tras desconectarse el cliente (referencia fuerte hasta terminar)
+_orphan_flights: set[asyncio.Task] = set()
+
+
+def _record_orphan_flight(task: asyncio.Task) -> None:
+    """Cuenta el resultado de un análisis que terminó sin nadie esperándolo."""
+    _orphan_flights.discard(task)
+    if task.cancelled():
+        outcome = "cancelled"
+    elif task.exception() is not None:
+        outcome = "error"
+    else:
+        outcome = "warm"
+    metrics.inc("analysis_wasted_total", outcome=outcome)
+    logger.info(f"♨️ Análisis huérfano terminado ({outcome})")
+
+
+@dataclass(slots=True)
+class _IndexEntry:
+    """Firma MinHash y embedding calculados al buscar casi duplicados (se indexan al persistir)."""
+
+    embedding: Optional[list[float]] = None
+    minhash: Optional[Signature] = None
+
+
+# Re-análisis en segundo plano de código servido como casi duplicado
+_background_refreshes: set[asyncio.Task] = set()
+
+
+def _record_refresh(task: asyncio.Task) -> None:
+    """Cuenta el resultado de un re-análisis en segundo plano."""
+    _background_refreshes.discard(task)
+    if task.cancelled():
+        outcome = "cancelled"
+    elif task.exception() is not None:
+        outcome = "error"
+        logger.warning(f"⚠️ Re-análisis en segundo plano fallido: {task.exception()}")
+    else:
+        outcome = "ok"
+    metrics.inc("analysis_semantic_refresh_total", outcome=outcome)
+
 
 # ----------------- CONSTANTS -----------------
 
@@ -69,6 +190,10 @@ class AnalysisService:
         self,
         db: Optional[AsyncSession] = None,
         gemini_client: Optional[GeminiClient] = None,
+        gemini_registry: Optional[GeminiClientRegistry] = None,
+        model_router: Optional[ModelRouter] = None,
+        single_flight: Optional[SingleFlight] = None,
+        result_cache: Optional[ResultCache] = None,
     ):
         """
         Inicializa el servicio.
@@ -76,9 +201,23 @@ class AnalysisService:
         Args:
             db: Sesión de base de datos (opcional)
             gemini_client: Cliente de Gemini (opcional)
+            gemini_registry: Registro de clientes por API key (opcional)
+            model_router: Selector de modelo por tamaño/complejidad (opcional)
+            single_flight: Coordinador de análisis idénticos (default: el del proceso)
+            result_cache: Caché de resultados (default: la del proceso)
         """
         self.db = db
-        self.gemini_client = gemini_client or GeminiClient(api_key=settings.GEMINI_API_KEY)
+        self.model_router = model_router or ModelRouter()
+        self.single_flight = single_flight or _analysis_flight
+        self.result_cache = result_cache or _analysis_cache
+        self.gemini_registry = gemini_registry
+        if gemini_client is None:
+            gemini_client = (
+                gemini_registry.system_client
+                if gemini_registry
+                else GeminiClient(api_key=settings.GEMINI_API_KEY)
+            )
+        self.gemini_client = gemini_client
 
     @staticmethod
     def _extract_score(analisis: str) -> Optional[int]:
@@ -97,11 +236,695 @@ class AnalysisService:
                 return match.group(1).strip()
         return None
 
+    @staticmethod
+    def _validate_code(codigo: str, timestamp: datetime) -> Optional[dict[str, Any]]:
+        """Valida el código de entrada. Retorna el resultado de error o None si es válido."""
+        if not codigo or not codigo.strip():
+            return {
+                "success": False,
+                "error": "El código no puede estar vacío",
+                "codigo": codigo or "",
+                "timestamp": timestamp,
+            }
+
+        if len(codigo) > MAX_CODE_LENGTH:
+            return {
+                "success": False,
+                "error": f"El código es demasiado largo (máximo {MAX_CODE_LENGTH:,} caracteres)",
+                "codigo": codigo[:100] + "...",
+                "timestamp": timestamp,
+            }
+
+        return None
+
+    @staticmethod
+    def _error_result(codigo: str, timestamp: datetime) -> dict[str, Any]:
+        """Resultado genérico de error (sin filtrar detalles internos al cliente)."""
+        return {
+            "success": False,
+            "error": "Error al procesar el análisis. Intente nuevamente.",
+            "codigo": codigo[:100] + "..." if len(codigo) > 100 else codigo,
+            "timestamp": timestamp,
+        }
+
+    @staticmethod
+    def _unavailable_result(
+        codigo: str, timestamp: datetime, error: GeminiUnavailableError
+    ) -> dict[str, Any]:
+        """Resultado cuando Gemini no está disponible (circuito abierto): HTTP 503."""
+        return {
+            "success": False,
+            "error": str(error),
+            "codigo": codigo[:100] + "..." if len(codigo) > 100 else codigo,
+            "timestamp": timestamp,
+            "status_code": 503,
+            "retry_after": max(1, math.ceil(error.retry_after)),
+        }
+
+    def _select_client(self, user_api_key: Optional[str]) -> GeminiClient:
+        """Usar API key del usuario si tiene, sino la del sistema (mismo pool HTTP)."""
+        if user_api_key:
+            logger.info("Usando API key del usuario")
+            if self.gemini_registry:
+                return self.gemini_registry.get(user_api_key)
+            return self.gemini_client.with_api_key(user_api_key)
+        return self.gemini_client
+
+    @staticmethod
+    def _record_fallback(route: ModelRoute, model: str, error: GeminiError) -> None:
+        """Registra que un modelo de la cadena falló y se pasa al siguiente."""
+        metrics.inc("analysis_model_fallbacks_total", tier=route.tier, model=model, reason=type(error).__name__)
+        logger.warning(f"⚠️ Modelo {model} falló ({type(error).__name__}), probando el siguiente de la cadena")
+
+    @staticmethod
+    def _attempt_timeout(route: ModelRoute, model: str, deadline: float, first: bool) -> Optional[float]:
+        """
+        Segundos que le quedan a un intento de la cadena, o None si no alcanzan.
+
+        Todos los intentos comparten GEMINI_FALLBACK_DEADLINE: un read timeout
+        del principal no le da al fallback otros 3 minutos. El primer modelo
+        siempre se intenta; un fallback con menos de GEMINI_FALLBACK_MIN_REMAINING
+        no llegaría a responder y se corta la cadena.
+        """
+        remaining = deadline - time.monotonic()
+        if first or remaining >= settings.GEMINI_FALLBACK_MIN_REMAINING:
+            return max(remaining, 0.0)
+        metrics.inc("analysis_model_fallbacks_skipped_total", tier=route.tier, model=model)
+        logger.warning(f"⏱️ Sin tiempo para probar {model} ({remaining:.1f}s restantes), se corta la cadena")
+        return None
+
+    @staticmethod
+    async def _within(attempt: Awaitable[Any], timeout: float) -> Any:
+        """Espera un intento de la cadena hasta su timeout (GeminiTimeoutError si se agota)."""
+        try:
+            return await asyncio.wait_for(attempt, timeout)
+        except asyncio.TimeoutError as e:
+            raise GeminiTimeoutError(ANALYSIS_TIMEOUT_MESSAGE) from e
+
+    async def _analyze_with_fallback(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+        output: str = OUTPUT_MARKDOWN,
+    ) -> GenerationResult:
+        """
+        Analiza con el modelo del tier y recorre la cadena de fallback.
+
+        Toda la cadena comparte un deadline (GEMINI_FALLBACK_DEADLINE).
+
+        Returns:
+            GenerationResult del modelo que respondió
+
+        Raises:
+            GeminiError: El último error si todos los modelos fallan o se agota
+                el deadline, o el primero que no justifica fallback (ej: 400,
+                API key inválida)
+        """
+        last_error: Optional[GeminiError] = None
+        deadline = time.monotonic() + settings.GEMINI_FALLBACK_DEADLINE
+        for i, model in enumerate(route.models):
+            timeout = self._attempt_timeout(route, model, deadline, first=i == 0)
+            if timeout is None:
+                break
+            started = time.perf_counter()
+            try:
+                generacion = await self._within(
+                    client.analyze_code(code=codigo, model=model, role=rol, output=output),
+                    timeout,
+                )
+            except GeminiError as e:
+                if not is_fallback_error(e):
+                    raise
+                last_error = e
+                self._record_fallback(route, model, e)
+                continue
+            self._record_generation(route, codigo, generacion, output, started)
+            return generacion
+        raise last_error
+
+    @staticmethod
+    def _record_generation(
+        route: ModelRoute,
+        codigo: str,
+        generacion: GenerationResult,
+        output: str,
+        started: float,
+    ) -> None:
+        """Latencia y tokens de salida por modo (compara reescritura completa vs ediciones)."""
+        labels = {"tier": route.tier, "model": generacion.model, "size": size_bucket(codigo), "output": output}
+        metrics.observe("analysis_latency_seconds", time.perf_counter() - started, **labels)
+        if generacion.usage.output_tokens:
+            metrics.observe("analysis_output_tokens", generacion.usage.output_tokens, **labels)
+        if generacion.usage.total_tokens:
+            metrics.observe("analysis_total_tokens", generacion.usage.total_tokens, **labels)
+
+    async def _analyze_parallel(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """
+        Hallazgos y reescritura en paralelo, recorriendo la cadena de fallback.
+
+        Returns:
+            (generación combinada, reporte unido) o reporte None si alguna
+            respuesta no cumple su esquema (el caller sigue en modo secuencial)
+        """
+        last_error: Optional[GeminiError] = None
+        deadline = time.monotonic() + settings.GEMINI_FALLBACK_DEADLINE
+        for i, model in enumerate(route.models):
+            timeout = self._attempt_timeout(route, model, deadline, first=i == 0)
+            if timeout is None:
+                break
+            started = time.perf_counter()
+            try:
+                findings, rewrite = await self._within(
+                    client.analyze_code_parallel(code=codigo, model=model, role=rol),
+                    timeout,
+                )
+            except GeminiError as e:
+                if not is_fallback_error(e):
+                    raise
+                last_error = e
+                self._record_fallback(route, model, e)
+                continue
+            generacion = GenerationResult(
+                text=findings.text,
+                model=model,
+                finish_reason=rewrite.finish_reason,
+                usage=findings.usage + rewrite.usage,
+            )
+            self._record_generation(route, codigo, generacion, OUTPUT_PARALLEL, started)
+            try:
+                return generacion, merge_parallel(findings.text, rewrite.text)
+            except ValidationError as e:
+                metrics.inc(
+                    "analysis_structured_fallbacks_total",
+                    model=model,
+                    output=OUTPUT_PARALLEL,
+                    reason=type(e).__name__,
+                )
+                logger.warning(f"⚠️ Respuesta paralela inválida de {model}: {e}")
+                return generacion, None
+        raise last_error
+
+    async def _generate(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """Una generación completa según la configuración (estructurada o markdown)."""
+        if settings.ANALYSIS_STRUCTURED_OUTPUT:
+            return await self._analyze_structured(client, codigo, route, rol)
+        return await self._analyze_with_fallback(client, codigo, route, rol), None
+
+    @staticmethod
+    def _generation_signature(rol: Optional[str]) -> list[Any]:
+        """Configuración que cambia la respuesta: sampling, techos de tokens y modos de salida."""
+        rol = rol or ROLE_ANONYMOUS
+        return [
+            ANALYSIS_GENERATION_CONFIG,
+            settings.GEMINI_MAX_OUTPUT_TOKENS_BY_ROLE.get(rol),
+            settings.GEMINI_THINKING_BUDGET_BY_ROLE.get(rol),
+            settings.GEMINI_OUTPUT_TOKENS_BASE,
+            settings.GEMINI_OUTPUT_TOKENS_PER_INPUT_TOKEN,
+            settings.GEMINI_THINKING_TOKENS_PER_INPUT_TOKEN,
+            settings.GEMINI_THINKING_MIN_BUDGET,
+            settings.GEMINI_MAX_CONTINUATIONS,
+            settings.ANALYSIS_STRUCTURED_OUTPUT,
+            settings.ANALYSIS_EDITS_ENABLED,
+            settings.ANALYSIS_EDITS_MIN_LINES,
+            settings.ANALYSIS_PARALLEL_ENABLED,
+        ]
+
+    def _cache_key(self, codigo: str, route: ModelRoute, rol: Optional[str]) -> str:
+        """
+        Clave de la caché de resultados: código normalizado, modelos, prompts y configuración.
+
+        El código se compara por AST (sin formato ni comentarios); si no
+        parsea, por su texto.
+        """
+        huella = code_fingerprint(codigo, settings.ANALYSIS_CACHE_KEY_CANONICAL_DOCSTRINGS)
+        metrics.inc("analysis_cache_key_total", kind=huella.kind)
+        partes = (
+            huella.digest,
+            ",".join(route.models),
+            ANALYSIS_PROMPT_VERSION,
+            json_codec.dumps(self._generation_signature(rol)).decode("utf-8"),
+        )
+        return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _flight_key(cache_key: str, user_api_key: Optional[str]) -> str:
+        """Clave de coalescing: la de la caché más la API key que paga la llamada."""
+        partes = (cache_key, key_fingerprint(user_api_key or settings.GEMINI_API_KEY))
+        return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _to_payload(
+        generacion: GenerationResult, reporte: Optional[AnalysisReport]
+    ) -> dict[str, Any]:
+        """Generación serializable a JSON (viaja por Redis y se guarda en caché)."""
+        return {
+            "text": generacion.text,
+            "model": generacion.model,
+            "finish_reason": generacion.finish_reason,
+            "usage": asdict(generacion.usage),
+            "reporte": reporte.model_dump() if reporte is not None else None,
+        }
+
+    @staticmethod
+    def _from_payload(
+        valor: dict[str, Any], shared: bool
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """
+        Reconstruye la generación de un payload.
+
+        Un resultado compartido (de otra llamada o de la caché) lleva tokens
+        en 0: el consumo queda registrado una sola vez, en el análisis que lo pagó.
+        """
+        generacion = GenerationResult(
+            text=valor["text"],
+            model=valor["model"],
+            finish_reason=valor["finish_reason"],
+            usage=TokenUsage() if shared else TokenUsage(**valor["usage"]),
+        )
+        reporte = AnalysisReport.model_validate(valor["reporte"]) if valor["reporte"] else None
+        return generacion, reporte
+
+    @staticmethod
+    def _is_cacheable(generacion: GenerationResult) -> bool:
+        """Solo se cachean respuestas completas (no truncadas, bloqueadas ni vacías)."""
+        return generacion.finish_reason == "STOP" and generacion.text not in ("", ANALYSIS_EMPTY_MESSAGE)
+
+    async def _cached_generation(
+        self, cache_key: str
+    ) -> Optional[tuple[GenerationResult, Optional[AnalysisReport]]]:
+        """Generación cacheada para la clave, o None (caché desactivada o miss)."""
+        if not settings.ANALYSIS_CACHE_ENABLED:
+            return None
+        hit = await self.result_cache.get(cache_key)
+        if hit is None:
+            return None
+        logger.info(f"⚡ Análisis en caché ({hit.tier}): se reutiliza sin llamar a Gemini")
+        return self._from_payload(hit.value, shared=True)
+
+    async def _store_generation(
+        self, cache_key: str, generacion: GenerationResult, reporte: Optional[AnalysisReport]
+    ) -> None:
+        """Guarda la generación en la caché si está completa."""
+        if settings.ANALYSIS_CACHE_ENABLED and self._is_cacheable(generacion):
+            await self.result_cache.set(cache_key, self._to_payload(generacion, reporte))
+
+    async def _generate_shared(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+        user_api_key: Optional[str],
+        cache_key: str,
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """
+        Genera el análisis una vez por grupo de requests idénticas en curso y lo cachea.
+
+        El single-flight es la protección contra estampidas de la caché: ante
+        un miss, las requests idénticas concurrentes esperan una sola llamada,
+        que guarda el resultado en caché antes de compartirlo.
+        """
+        async def generar() -> dict[str, Any]:
+            generacion, reporte = await self._generate(client, codigo, route, rol)
+            await self._store_generation(cache_key, generacion, reporte)
+            return self._to_payload(generacion, reporte)
+
+        if not settings.ANALYSIS_SINGLE_FLIGHT_ENABLED:
+            return self._from_payload(await generar(), shared=False)
+
+        resultado = await self._run_flight(self._flight_key(cache_key, user_api_key), generar)
+        if resultado.shared:
+            logger.info(
+                f"🔗 Análisis idéntico en curso: se reutiliza su resultado ({resultado.value['model']})"
+            )
+        return self._from_payload(resultado.value, resultado.shared)
+
+    # --- Reutilización: caché exacta y análisis casi duplicados ---
+
+    async def _find_near_duplicate(
+        self, client: GeminiClient, codigo: str, usuario_id: Optional[int]
+    ) -> tuple[Optional[SimilarAnalysis], Optional[list[float]]]:
+        """
+        Busca un análisis previo casi idéntico por similitud de embeddings.
+
+        Returns:
+            (análisis sobre el umbral o None, embedding del código para
+            guardarlo si finalmente se analiza)
+        """
+        if not settings.ANALYSIS_SEMANTIC_DEDUP_ENABLED or self.db is None:
+            return None, None
+        cross_user = settings.ANALYSIS_SEMANTIC_DEDUP_CROSS_USER
+        if len(codigo) > settings.ANALYSIS_SEMANTIC_DEDUP_MAX_CHARS or (
+            usuario_id is None and not cross_user
+        ):
+            metrics.inc("analysis_semantic_lookups_total", result="skipped")
+            return None, None
+
+        started = time.perf_counter()
+        try:
+            vector = await client.create_embedding(codigo)
+            similar = await find_similar_analysis(
+                self.db, vector, user_id=None if cross_user else usuario_id
+            )
+        except (GeminiError, VectorSearchError) as e:
+            logger.warning(f"⚠️ Deduplicación semántica no disponible: {e}")
+            metrics.inc("analysis_semantic_lookups_total", result="error")
+            return None, None
+        metrics.observe("analysis_semantic_lookup_seconds", time.perf_counter() - started)
+
+        if similar is not None:
+            metrics.observe("analysis_semantic_similarity", similar.similarity)
+        if similar is None or similar.similarity < settings.ANALYSIS_SEMANTIC_DEDUP_THRESHOLD:
+            metrics.inc("analysis_semantic_lookups_total", result="miss")
+            return None, vector
+        metrics.inc("analysis_semantic_lookups_total", result="hit")
+        logger.info(
+            f"🪞 Análisis casi duplicado (ID={similar.analysis_id}, "
+            f"similitud {similar.similarity:.3f}): se reutiliza sin llamar a Gemini"
+        )
+        return similar, vector
+
+    @staticmethod
+    def _from_similar(
+        similar: SimilarAnalysis,
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """Generación equivalente a un análisis previo (tokens en 0)."""
+        generacion = GenerationResult(
+            text=similar.analysis_result,
+            model=similar.model_used or "",
+            finish_reason="STOP",
+        )
+        reporte = None
+        if similar.report:
+            try:
+                reporte = AnalysisReport.model_validate(similar.report)
+            except ValidationError:
+                # Reporte de un esquema anterior: se usa el markdown guardado
+                reporte = None
+        return generacion, reporte
+
+    async def _find_minhash_duplicate(
+        self, codigo: str, usuario_id: Optional[int]
+    ) -> tuple[Optional[SimilarAnalysis], Optional[Signature]]:
+        """
+        Busca un análisis previo casi idéntico por MinHash/LSH (sin llamadas a la API).
+
+        Returns:
+            (análisis sobre el umbral o None, firma del código para indexarla
+            si finalmente se analiza)
+        """
+        if not settings.ANALYSIS_MINHASH_ENABLED or self.db is None:
+            return None, None
+        started = time.perf_counter()
+        firma = minhash_signature(
+            codigo, settings.ANALYSIS_MINHASH_NUM_PERM, settings.ANALYSIS_MINHASH_SHINGLE_SIZE
+        )
+        metrics.observe("analysis_minhash_signature_seconds", time.perf_counter() - started)
+        cross_user = settings.ANALYSIS_MINHASH_CROSS_USER
+        if firma is None or (usuario_id is None and not cross_user):
+            metrics.inc("analysis_minhash_lookups_total", result="skipped")
+            return None, firma
+
+        started = time.perf_counter()
+        try:
+            candidatos = await find_lsh_candidates(
+                self.db,
+                band_hashes(firma, settings.ANALYSIS_MINHASH_BANDS),
+                settings.ANALYSIS_MINHASH_MAX_CANDIDATES,
+                user_id=None if cross_user else usuario_id,
+            )
+            # Firmas de otro NUM_PERM no son comparables
+            match = best_match(
+                firma,
+                {i: unpack_signature(data) for i, data in candidatos.items() if len(data) == len(firma) * 4},
+                settings.ANALYSIS_MINHASH_THRESHOLD,
+            )
+            similar = (
+                await load_similar_analysis(self.db, match.item_id, match.similarity)
+                if match is not None
+                else None
+            )
+        except MinHashIndexError as e:
+            logger.warning(f"⚠️ Índice MinHash no disponible: {e}")
+            metrics.inc("analysis_minhash_lookups_total", result="error")
+            return None, firma
+        metrics.observe("analysis_minhash_lookup_seconds", time.perf_counter() - started)
+        metrics.observe("analysis_minhash_candidates", len(candidatos))
+
+        if similar is None:
+            metrics.inc("analysis_minhash_lookups_total", result="miss")
+            return None, firma
+        metrics.inc("analysis_minhash_lookups_total", result="hit")
+        logger.info(
+            f"🧬 Análisis casi duplicado por MinHash (ID={similar.analysis_id}, "
+            f"Jaccard {similar.similarity:.2f}, {len(candidatos)} candidatos)"
+        )
+        return similar, firma
+
+    async def _index_analysis(
+        self, analysis_id: Optional[int], usuario_id: Optional[int], indice: _IndexEntry
+    ) -> None:
+        """Indexa el análisis recién persistido para futuras búsquedas de casi duplicados."""
+        if analysis_id is None or usuario_id is None or self.db is None:
+            return
+        if indice.embedding is not None:
+            try:
+                await store_code_embedding(self.db, analysis_id, indice.embedding)
+            except VectorSearchError as e:
+                logger.warning(f"⚠️ {e}")
+        if indice.minhash is not None:
+            try:
+                await index_minhash(
+                    self.db,
+                    analysis_id,
+                    usuario_id,
+                    pack_signature(indice.minhash),
+                    band_hashes(indice.minhash, settings.ANALYSIS_MINHASH_BANDS),
+                )
+            except MinHashIndexError as e:
+                logger.warning(f"⚠️ {e}")
+
+    def _schedule_refresh(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+        user_api_key: Optional[str],
+        cache_key: str,
+    ) -> None:
+        """Analiza en segundo plano el código servido como casi duplicado (queda en caché)."""
+        tarea = asyncio.create_task(
+            self._generate_shared(client, codigo, route, rol, user_api_key, cache_key)
+        )
+        _background_refreshes.add(tarea)
+        tarea.add_done_callback(_record_refresh)
+
+    async def _reuse_previous(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+        usuario_id: Optional[int],
+        user_api_key: Optional[str],
+        timestamp: datetime,
+        cache_key: str,
+    ) -> tuple[Optional[dict[str, Any]], _IndexEntry]:
+        """
+        Resultado sin llamar a Gemini: caché exacta y, si no, análisis casi
+        duplicado (MinHash local primero, embeddings después).
+
+        Returns:
+            (resultado final o None, firma/embedding calculados para indexar
+            el análisis si finalmente se hace)
+        """
+        cacheado = await self._cached_generation(cache_key)
+        if cacheado is not None:
+            generacion, reporte = cacheado
+            resultado = await self._finalize_analysis(
+                codigo, generacion, usuario_id, timestamp, route.tier, reporte, cache_hit=True
+            )
+            return resultado, _IndexEntry()
+
+        similar, firma = await self._find_minhash_duplicate(codigo, usuario_id)
+        vector = None
+        if similar is None:
+            similar, vector = await self._find_near_duplicate(client, codigo, usuario_id)
+        if similar is None:
+            return None, _IndexEntry(embedding=vector, minhash=firma)
+        if settings.ANALYSIS_SEMANTIC_DEDUP_REFRESH:
+            self._schedule_refresh(client, codigo, route, rol, user_api_key, cache_key)
+        generacion, reporte = self._from_similar(similar)
+        resultado = await self._finalize_analysis(
+            codigo, generacion, usuario_id, timestamp, route.tier, reporte, near_duplicate=similar
+        )
+        # Un casi duplicado no se indexa: las búsquedas apuntan al original
+        return resultado, _IndexEntry()
+
+    async def _run_flight(
+        self, key: str, generar: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> FlightResult:
+        """
+        Ejecuta el single-flight; si el llamador se cancela (cliente desconectado)
+        y ANALYSIS_FINISH_ON_DISCONNECT está activo, la llamada a Gemini sigue en
+        segundo plano y su resultado queda para las requests idénticas.
+        """
+        if not settings.ANALYSIS_FINISH_ON_DISCONNECT:
+            return await self.single_flight.do(key, generar)
+
+        tarea = asyncio.ensure_future(self.single_flight.do(key, generar))
+        try:
+            return await asyncio.shield(tarea)
+        except asyncio.CancelledError:
+            if not tarea.done():
+                _orphan_flights.add(tarea)
+                tarea.add_done_callback(_record_orphan_flight)
+                logger.info("⏳ Cliente desconectado: el análisis sigue en segundo plano")
+            raise
+
+    @staticmethod
+    def _structured_outputs(route: ModelRoute) -> list[str]:
+        """Modos a intentar en orden: ediciones (archivos largos) y reescritura completa."""
+        if settings.ANALYSIS_EDITS_ENABLED and route.profile.lines >= settings.ANALYSIS_EDITS_MIN_LINES:
+            return [OUTPUT_EDITS, OUTPUT_JSON]
+        return [OUTPUT_JSON]
+
+    async def _analyze_structured(
+        self,
+        client: GeminiClient,
+        codigo: str,
+        route: ModelRoute,
+        rol: Optional[str],
+    ) -> tuple[GenerationResult, Optional[AnalysisReport]]:
+        """
+        Analiza en modo JSON y valida el reporte una sola vez.
+
+        En archivos largos se piden primero ediciones por rango de líneas y se
+        aplican localmente; si no cumplen el esquema, no se pueden aplicar o el
+        resultado no parsea, se pide la reescritura completa. Si tampoco hay un
+        JSON válido (ej: cortado por MAX_TOKENS) se repite una vez en markdown.
+        Con ANALYSIS_PARALLEL_ENABLED se intenta antes el modo paralelo.
+        Los tokens de todas las llamadas se suman.
+        """
+        usage = TokenUsage()
+        if settings.ANALYSIS_PARALLEL_ENABLED:
+            generacion, reporte = await self._analyze_parallel(client, codigo, route, rol)
+            if reporte is not None:
+                return generacion, reporte
+            usage = generacion.usage
+
+        for output in self._structured_outputs(route):
+            generacion = await self._analyze_with_fallback(client, codigo, route, rol, output)
+            usage = usage + generacion.usage
+            try:
+                reporte = parse_report(generacion.text)
+                if output == OUTPUT_EDITS:
+                    reporte = resolve_edits(codigo, reporte)
+            except (ValidationError, EditApplyError) as e:
+                metrics.inc(
+                    "analysis_structured_fallbacks_total",
+                    model=generacion.model,
+                    output=output,
+                    reason=type(e).__name__,
+                )
+                logger.warning(
+                    f"⚠️ Respuesta {output} inválida de {generacion.model} "
+                    f"(finishReason={generacion.finish_reason}): {e}"
+                )
+                continue
+            generacion.usage = usage
+            return generacion, reporte
+
+        markdown = await self._analyze_with_fallback(client, codigo, route, rol, OUTPUT_MARKDOWN)
+        markdown.usage = usage + markdown.usage
+        return markdown, None
+
+    async def _finalize_analysis(
+        self,
+        codigo: str,
+        generacion: GenerationResult,
+        usuario_id: Optional[int],
+        timestamp: datetime,
+        tier: str,
+        reporte: Optional[AnalysisReport] = None,
+        cache_hit: bool = False,
+        near_duplicate: Optional[SimilarAnalysis] = None,
+    ) -> dict[str, Any]:
+        """
+        Obtiene score y código mejorado, persiste y arma el resultado final.
+
+        Con reporte estructurado se usan sus campos y el markdown se renderiza
+        desde él; sin reporte se extraen del markdown con los regex compilados.
+        """
+        modelo = generacion.model
+        if reporte is not None:
+            analisis = reporte.to_markdown()
+            score = reporte.score
+            codigo_mejorado = reporte.codigo_mejorado.strip() or None
+        else:
+            analisis = generacion.text or ANALYSIS_EMPTY_MESSAGE
+            score = self._extract_score(analisis)
+            codigo_mejorado = self._extract_improved_code(analisis)
+        if score is not None:
+            metrics.observe("analysis_quality_score", score, tier=tier, model=modelo)
+
+        # Guardar en DB si hay usuario autenticado y DB disponible
+        analysis_id = await self._persist_analysis(
+            usuario_id=usuario_id,
+            codigo=codigo,
+            codigo_mejorado=codigo_mejorado,
+            analisis=analisis,
+            score=score,
+            generacion=generacion,
+            reporte=reporte,
+            duplicate_of=near_duplicate.analysis_id if near_duplicate is not None else None,
+        )
+
+        return {
+            "success": True,
+            "analisis": analisis,
+            "score": score,
+            "codigo_mejorado": codigo_mejorado,
+            "reporte": reporte.model_dump() if reporte is not None else None,
+            "codigo": codigo,
+            "usuario_id": usuario_id,
+            "timestamp": timestamp,
+            "modelo_usado": modelo,
+            "tokens_usados": generacion.usage.total_tokens or None,
+            "analysis_id": analysis_id,
+            "cache_hit": cache_hit,
+            "near_duplicate": (
+                {
+                    "analysis_id": near_duplicate.analysis_id,
+                    "similarity": near_duplicate.similarity,
+                    "method": near_duplicate.method,
+                }
+                if near_duplicate is not None
+                else None
+            ),
+        }
+
     async def analizar_codigo(
         self,
         codigo: str,
         usuario_id: Optional[int] = None,
         user_api_key: Optional[str] = None,
+        rol: Optional[str] = None,
     ) -> dict[str, Any]:
         """
         Analiza código Python y retorna sugerencias de mejora.
@@ -110,6 +933,7 @@ class AnalysisService:
             codigo: Código Python a analizar
             usuario_id: ID del usuario (opcional)
             user_api_key: API key propia del usuario (opcional)
+            rol: Rol del usuario para los techos de tokens (None = anónimo)
 
         Returns:
             Diccionario con el análisis y metadatos
@@ -117,64 +941,123 @@ class AnalysisService:
         timestamp = datetime.now()
         
         # Validar código
-        if not codigo or not codigo.strip():
-            return {
-                "success": False,
-                "error": "El código no puede estar vacío",
-                "codigo": codigo or "",
-                "timestamp": timestamp,
-            }
-
-        if len(codigo) > MAX_CODE_LENGTH:
-            return {
-                "success": False,
-                "error": f"El código es demasiado largo (máximo {MAX_CODE_LENGTH:,} caracteres)",
-                "codigo": codigo[:100] + "...",
-                "timestamp": timestamp,
-            }
+        error = self._validate_code(codigo, timestamp)
+        if error:
+            return error
 
         try:
             logger.info(f"Analizando código para usuario_id={usuario_id}")
+            client = self._select_client(user_api_key)
+            route = self.model_router.route(codigo)
+            logger.info(
+                f"🧭 Tier {route.tier} → {route.primary} "
+                f"({route.profile.lines} líneas, complejidad {route.profile.complexity})"
+            )
 
-            # Usar API key del usuario si tiene, sino la del sistema
-            client = GeminiClient(api_key=user_api_key) if user_api_key else self.gemini_client
-            if user_api_key:
-                logger.info("Usando API key del usuario")
+            cache_key = self._cache_key(codigo, route, rol)
+            reutilizado, indice = await self._reuse_previous(
+                client, codigo, route, rol, usuario_id, user_api_key, timestamp, cache_key
+            )
+            if reutilizado is not None:
+                return reutilizado
 
-            # Llamar a Gemini
-            analisis = await client.analyze_code(code=codigo, model=settings.GEMINI_MODEL)
+            # Llamar a Gemini (con fallback por la cadena de modelos), una vez
+            # por grupo de requests idénticas en curso
+            generacion, reporte = await self._generate_shared(
+                client, codigo, route, rol, user_api_key, cache_key
+            )
 
-            # Extraer datos del análisis
-            score = self._extract_score(analisis)
-            codigo_mejorado = self._extract_improved_code(analisis)
+            resultado = await self._finalize_analysis(
+                codigo, generacion, usuario_id, timestamp, route.tier, reporte
+            )
+            await self._index_analysis(resultado["analysis_id"], usuario_id, indice)
+            return resultado
+
+        except GeminiUnavailableError as e:
+            logger.warning(f"Gemini no disponible (fail-fast): {e}")
+            return self._unavailable_result(codigo, timestamp, e)
+        except Exception as e:
+            logger.error(f"Error en análisis de código: {e}", exc_info=True)
+            return self._error_result(codigo, timestamp)
+
+    async def analizar_codigo_stream(
+        self,
+        codigo: str,
+        usuario_id: Optional[int] = None,
+        user_api_key: Optional[str] = None,
+        rol: Optional[str] = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Analiza código Python emitiendo el markdown a medida que Gemini lo genera.
+
+        Eventos emitidos (dicts con claves "event" y "data"):
+        - chunk: {"text": fragmento} por cada fragmento recibido
+        - done: mismo resultado que `analizar_codigo`, calculado sobre el texto completo
+        - error: resultado de error (validación o fallo de Gemini)
 
-            # Guardar en DB si hay usuario autenticado y DB disponible
-            analysis_id = await self._persist_analysis(
-                usuario_id=usuario_id,
-                codigo=codigo,
-                codigo_mejorado=codigo_mejorado,
-                analisis=analisis,
-                score=score,
+        La persistencia ocurre antes de emitir "done"; el commit es del caller.
+        El fallback de modelo solo aplica antes del primer fragmento emitido.
+        Un resultado reutilizado (caché o casi duplicado) se emite completo en un solo "chunk".
+        """
+        timestamp = datetime.now()
+
+        error = self._validate_code(codigo, timestamp)
+        if error:
+            yield {"event": "error", "data": error}
+            return
+
+        emitido = False
+        try:
+            logger.info(f"Analizando código (stream) para usuario_id={usuario_id}")
+            client = self._select_client(user_api_key)
+            route = self.model_router.route(codigo)
+            logger.info(f"🧭 Tier {route.tier} → {route.primary} (stream)")
+
+            # Un resultado reutilizado se emite como un único fragmento
+            cache_key = self._cache_key(codigo, route, rol)
+            reutilizado, indice = await self._reuse_previous(
+                client, codigo, route, rol, usuario_id, user_api_key, timestamp, cache_key
             )
+            if reutilizado is not None:
+                yield {"event": "chunk", "data": {"text": reutilizado["analisis"]}}
+                yield {"event": "done", "data": reutilizado}
+                return
 
-            return {
-                "success": True,
-                "analisis": analisis,
-                "codigo": codigo,
-                "usuario_id": usuario_id,
-                "timestamp": timestamp,
-                "modelo_usado": settings.GEMINI_MODEL,
-                "analysis_id": analysis_id,
-            }
+            for index, modelo in enumerate(route.models):
+                started = time.perf_counter()
+                generacion = GenerationResult(model=modelo)
+                try:
+                    async for fragmento in client.stream_analysis(
+                        code=codigo, model=modelo, summary=generacion, role=rol
+                    ):
+                        emitido = True
+                        yield {"event": "chunk", "data": {"text": fragmento}}
+                except GeminiError as e:
+                    # Con texto ya emitido no se puede cambiar de modelo
+                    if emitido or not is_fallback_error(e) or index == len(route.models) - 1:
+                        raise
+                    self._record_fallback(route, modelo, e)
+                    continue
+                self._record_generation(route, codigo, generacion, OUTPUT_MARKDOWN, started)
+                break
+
+            # El stream siempre es markdown: solo coincide con la clave si el
+            # modo bloqueante también lo es
+            if not settings.ANALYSIS_STRUCTURED_OUTPUT:
+                await self._store_generation(cache_key, generacion, None)
+
+            resultado = await self._finalize_analysis(
+                codigo, generacion, usuario_id, timestamp, route.tier
+            )
+            await self._index_analysis(resultado["analysis_id"], usuario_id, indice)
+            yield {"event": "done", "data": resultado}
 
+        except GeminiUnavailableError as e:
+            logger.warning(f"Gemini no disponible (fail-fast, stream): {e}")
+            yield {"event": "error", "data": self._unavailable_result(codigo, timestamp, e)}
         except Exception as e:
-            logger.error(f"Error en análisis de código: {e}", exc_info=True)
-            return {
-                "success": False,
-                "error": "Error al procesar el análisis. Intente nuevamente.",
-                "codigo": codigo[:100] + "..." if len(codigo) > 100 else codigo,
-                "timestamp": timestamp,
-            }
+            logger.error(f"Error en análisis de código (stream): {e}", exc_info=True)
+            yield {"event": "error", "data": self._error_result(codigo, timestamp)}
 
     async def _persist_analysis(
         self,
@@ -183,6 +1066,9 @@ class AnalysisService:
         codigo_mejorado: Optional[str],
         analisis: str,
         score: Optional[int],
+        generacion: GenerationResult,
+        reporte: Optional[AnalysisReport] = None,
+        duplicate_of: Optional[int] = None,
     ) -> Optional[int]:
         """
         Persiste el análisis y actualiza contadores de forma atómica.
@@ -193,6 +1079,11 @@ class AnalysisService:
             codigo_mejorado: Código mejorado extraído
             analisis: Resultado del análisis
             score: Score de calidad
+            generacion: Modelo y tokens de la respuesta de Gemini
+            reporte: Reporte estructurado (solo en modo JSON)
+            duplicate_of: ID del análisis reutilizado (casi duplicado): el
+                resultado se guarda completo y el ID queda como procedencia
+                (borrar el original no deja al registro sin contenido)
             
         Returns:
             ID del análisis guardado o None si no se pudo guardar
@@ -210,8 +1101,14 @@ class AnalysisService:
                 code_original=codigo,
                 code_improved=codigo_mejorado,
                 analysis_result=analisis,
+                report=reporte.model_dump() if reporte is not None else None,
                 quality_score=score,
-                model_used=settings.GEMINI_MODEL,
+                model_used=generacion.model,
+                tokens_used=generacion.usage.total_tokens or None,
+                prompt_tokens=generacion.usage.prompt_tokens or None,
+                output_tokens=generacion.usage.output_tokens or None,
+                thinking_tokens=generacion.usage.thinking_tokens or None,
+                duplicate_of_id=duplicate_of,
             )
             self.db.add(analysis_record)
             await self.db.flush()
@@ -348,3 +1245,53 @@ class AnalysisService:
             "limit": limit,
             "offset": offset,
         }
+
+    async def obtener_uso_tokens(self, usuario_id: int, dias: int = 30) -> dict[str, Any]:
+        """
+        Obtiene los tokens consumidos por un usuario, agrupados por día y modelo.
+
+        Args:
+            usuario_id: ID del usuario
+            dias: Ventana hacia atrás en días
+
+        Returns:
+            Dict con items (fecha, modelo, tokens), total_tokens y dias
+        """
+        if not self.db:
+            return {"items": [], "total_tokens": 0, "dias": dias}
+
+        desde = datetime.now(timezone.utc) - timedelta(days=dias)
+        fecha = func.date(Analysis.created_at).label("fecha")
+        result = await self.db.execute(
+            select(
+                fecha,
+                Analysis.model_used,
+                func.count(Analysis.id),
+                func.coalesce(func.sum(Analysis.prompt_tokens), 0),
+                func.coalesce(func.sum(Analysis.output_tokens), 0),
+                func.coalesce(func.sum(Analysis.thinking_tokens), 0),
+                func.coalesce(func.sum(Analysis.tokens_used), 0),
+            )
+            .where(Analysis.user_id == usuario_id, Analysis.created_at >= desde)
+            .group_by(fecha, Analysis.model_used)
+            .order_by(fecha.desc(), Analysis.model_used)
+        )
+
+        items = [
+            {
+                "fecha": row[0],
+                "modelo": row[1],
+                "analisis": row[2],
+                "prompt_tokens": int(row[3]),
+                "output_tokens": int(row[4]),
+                "thinking_tokens": int(row[5]),
+                "total_tokens": int(row[6]),
+            }
+            for row in result.all()
+        ]
+
+        return {
+            "items": items,
+            "total_tokens": sum(item["total_tokens"] for item in items),
+            "dias": dias,
+        }
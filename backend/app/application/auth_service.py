@@ -281,6 +281,41 @@ class AuthService:
         }, ""
 
 
+# ----------------- USER CREDENTIALS -----------------
+
+
+def get_user_api_key(user: Optional[User]) -> Optional[str]:
+    """
+    Obtiene y desencripta la API key del usuario si existe.
+
+    Args:
+        user: Usuario autenticado o None
+
+    Returns:
+        API key desencriptada o None (usará key del sistema)
+    """
+    if not user or not user.gemini_api_key_encrypted:
+        return None
+
+    try:
+        encryption = get_encryption_service()
+        api_key = encryption.decrypt(user.gemini_api_key_encrypted)
+        # Log sin PII - solo user_id, no email
+        logger.info(f"🔓 API key desencriptada para user_id: {user.id}")
+        return api_key
+    except Exception as e:
+        logger.error(f"Error al desencriptar API key para user_id {user.id}: {e}")
+        # Fallback a key del sistema (manejado por AnalysisService)
+        return None
+
+
+def get_user_role(user: Optional[User]) -> Optional[str]:
+    """Nombre del rol del usuario (None = anónimo) para los límites de tokens."""
+    if not user or not user.role:
+        return None
+    return user.role.name
+
+
 # ----------------- DEPENDENCY -----------------
 
 
@@ -0,0 +1,97 @@
+# backend/app/application/code_normalizer.py
+"""
+Normalización de código Python para las claves de caché y de coalescing.
+
+Dos códigos con el mismo AST comparten clave aunque difieran en espacios,
+indentación de continuación, comentarios, estilo de comillas, paréntesis
+redundantes o saltos de línea finales. Opcionalmente, los docstrings se
+comparan sin su formato (solo el texto con los espacios colapsados).
+
+El código que no parsea cae al hash del texto con los finales de línea
+normalizados (igual que antes de esta normalización).
+"""
+
+import ast
+import hashlib
+import sys
+from dataclasses import dataclass
+
+
+# ----------------- CONSTANTS -----------------
+
+KIND_AST = "ast"
+KIND_RAW = "raw"
+
+# El dump del AST cambia entre versiones de Python: forma parte de la clave
+_AST_PREFIX = f"ast:{sys.version_info.major}.{sys.version_info.minor}\x1f"
+_RAW_PREFIX = "raw\x1f"
+
+_DOCSTRING_OWNERS = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+# Campos con listas de sentencias (o de handlers/cases que las contienen)
+_STATEMENT_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+# ----------------- FINGERPRINT -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class CodeFingerprint:
+    """Hash del código normalizado y cómo se obtuvo."""
+
+    digest: str
+    kind: str  # KIND_AST o KIND_RAW (no parsea)
+
+
+def normalize_text(code: str) -> str:
+    """Normaliza saltos de línea y espacios finales (fallback sin AST)."""
+    lineas = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(linea.rstrip() for linea in lineas).strip("\n")
+
+
+def _canonicalize_docstrings(tree: ast.AST) -> None:
+    """
+    Reemplaza cada docstring por su texto con los espacios colapsados.
+
+    Recorre solo listas de sentencias (no expresiones): los docstrings solo
+    existen ahí y así se evita visitar la mayoría de los nodos (ast.walk).
+    """
+    pendientes = [tree]
+    while pendientes:
+        node = pendientes.pop()
+        if isinstance(node, _DOCSTRING_OWNERS) and node.body:
+            first = node.body[0]
+            if (
+                isinstance(first, ast.Expr)
+                and isinstance(first.value, ast.Constant)
+                and isinstance(first.value.value, str)
+            ):
+                first.value.value = " ".join(first.value.value.split())
+        for field in _STATEMENT_FIELDS:
+            hijos = getattr(node, field, None)
+            if isinstance(hijos, list):
+                pendientes.extend(hijos)
+
+
+def code_fingerprint(code: str, canonical_docstrings: bool = True) -> CodeFingerprint:
+    """
+    Hash estable del código, independiente del formato.
+
+    Args:
+        code: Código Python
+        canonical_docstrings: Ignorar el formato de los docstrings (no su texto)
+
+    Returns:
+        CodeFingerprint con el sha256 del dump del AST, o del texto si no parsea
+    """
+    try:
+        tree = ast.parse(code)
+        if canonical_docstrings:
+            _canonicalize_docstrings(tree)
+        # Sin posiciones (include_attributes=False) ni nombres de campo: más corto
+        dump = _AST_PREFIX + ast.dump(tree, annotate_fields=False)
+    except (SyntaxError, ValueError, RecursionError):
+        # ValueError: bytes nulos; RecursionError: anidamiento patológico
+        texto = _RAW_PREFIX + normalize_text(code)
+        return CodeFingerprint(hashlib.sha256(texto.encode("utf-8")).hexdigest(), KIND_RAW)
+    return CodeFingerprint(hashlib.sha256(dump.encode("utf-8")).hexdigest(), KIND_AST)
@@ -11,6 +11,9 @@ from typing import Any
 
 import requests
 
+from app.core import json_codec
+
+
 logger = logging.getLogger(__name__)
 
 # URL por defecto de la API de Gemini embeddings
@@ -100,7 +103,7 @@ class EmbeddingsService:
             # Extraer embedding de la respuesta de Gemini
             embedding = data.get("embedding", {}).get("values", [])
             if not embedding:
-                logger.warning(f"Respuesta sin embedding: {data}")
+                logger.warning(f"Respuesta sin embedding: {json_codec.preview(data)}")
                 raise EmbeddingsAPIError("Respuesta de API sin embedding válido")
             
             return embedding
@@ -0,0 +1,244 @@
+# backend/app/application/minhash.py
+"""
+Firmas MinHash de código y búsqueda de casi duplicados con LSH por bandas.
+
+Sin llamadas de red: todo se calcula localmente a partir del texto.
+
+- Tokens: identificadores, números, strings y operadores (sin comentarios ni espacios)
+- Shingles: k tokens consecutivos con hash rolling de 64 bits (estable entre procesos)
+- Firma: one-permutation hashing con densificación por rotación: una pasada
+  sobre los shingles en lugar de num_perm funciones de hash por shingle
+- Firma compacta: num_perm enteros de 32 bits (512 bytes con 128)
+- LSH: `bands` bandas de num_perm / bands filas; dos códigos con similitud
+  de Jaccard s comparten alguna banda con probabilidad 1 - (1 - s^r)^b
+"""
+
+import hashlib
+import re
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+
+
+# ----------------- CONSTANTS -----------------
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+
+_MASK64 = (1 << 64) - 1
+_MASK32 = (1 << 32) - 1
+_EMPTY = 1 << 32  # mayor que cualquier valor de 32 bits: bin vacío
+_ROLLING_BASE = 0x100000001B3  # primo FNV de 64 bits
+_DENSIFY_OFFSET = 0x9E3779B1  # separa valores prestados desde distintas distancias
+
+# Comentarios (sin grupo: se descartan), strings de una línea, identificadores,
+# números y cualquier otro carácter no blanco como operador
+_TOKEN_RE = re.compile(
+    r"#[^\n]*"
+    r"|(\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|[A-Za-z_]\w*|\d[\w.]*|\S)"
+)
+
+Signature = tuple[int, ...]
+
+
+# ----------------- SIGNATURES -----------------
+
+
+def code_tokens(code: str) -> list[str]:
+    """Tokens del código sin comentarios ni espacios (aproximado, no requiere que parsee)."""
+    return [token for token in _TOKEN_RE.findall(code) if token]
+
+
+def shingle_hashes(tokens: list[str], size: int = DEFAULT_SHINGLE_SIZE) -> set[int]:
+    """Hashes de 64 bits de cada secuencia de `size` tokens consecutivos."""
+    if not tokens:
+        return set()
+    ids_cache: dict[str, int] = {}
+    ids: list[int] = []
+    for token in tokens:
+        token_id = ids_cache.get(token)
+        if token_id is None:
+            token_id = ids_cache[token] = zlib.crc32(token.encode("utf-8"))
+        ids.append(token_id)
+    size = min(size, len(ids))
+
+    # Hash rolling: h(i+1) = (h(i) - id(i) * B^(k-1)) * B + id(i+k)  (mod 2^64)
+    top = pow(_ROLLING_BASE, size - 1, 1 << 64)
+    h = 0
+    for x in ids[:size]:
+        h = (h * _ROLLING_BASE + x) & _MASK64
+    hashes = {h}
+    for i in range(size, len(ids)):
+        h = ((h - ids[i - size] * top) * _ROLLING_BASE + ids[i]) & _MASK64
+        hashes.add(h)
+    return hashes
+
+
+def _mix64(x: int) -> int:
+    """Finalizador splitmix64: reparte los bits antes de elegir bin y valor."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def minhash_signature(
+    code: str,
+    num_perm: int = DEFAULT_NUM_PERM,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+) -> Signature | None:
+    """
+    Firma MinHash del código (one-permutation hashing densificado).
+
+    Returns:
+        num_perm valores de 32 bits, o None si el código no tiene tokens
+    """
+    hashes = shingle_hashes(code_tokens(code), shingle_size)
+    if not hashes:
+        return None
+
+    firma = [_EMPTY] * num_perm
+    for h in hashes:
+        h = _mix64(h)
+        bin_ = h % num_perm
+        value = h >> 32
+        if value < firma[bin_]:
+            firma[bin_] = value
+
+    # Densificación: un bin vacío toma el valor del siguiente bin no vacío
+    # (circular) más un desplazamiento según la distancia
+    if _EMPTY in firma:
+        origen = firma[:]
+        for i in range(num_perm):
+            if origen[i] != _EMPTY:
+                continue
+            distancia = 1
+            while origen[(i + distancia) % num_perm] == _EMPTY:
+                distancia += 1
+            prestado = origen[(i + distancia) % num_perm]
+            firma[i] = (prestado + distancia * _DENSIFY_OFFSET) & _MASK32
+    return tuple(firma)
+
+
+def estimate_jaccard(a: Signature, b: Signature) -> float:
+    """Similitud de Jaccard estimada: fracción de posiciones iguales."""
+    if len(a) != len(b) or not a:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b, strict=True)) / len(a)
+
+
+def pack_signature(signature: Signature) -> bytes:
+    """Firma en bytes (uint32 little-endian): 4 bytes por posición."""
+    data = array("I", signature)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data.tobytes()
+
+
+def unpack_signature(data: bytes) -> Signature:
+    """Inversa de `pack_signature`."""
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return tuple(values)
+
+
+def band_hashes(signature: Signature, bands: int = DEFAULT_BANDS) -> list[int]:
+    """
+    Bucket LSH de cada banda (enteros de 64 bits con signo, aptos para BIGINT).
+
+    Raises:
+        ValueError: Si bands no divide el largo de la firma
+    """
+    if bands <= 0 or len(signature) % bands:
+        raise ValueError(f"bands={bands} debe dividir num_perm={len(signature)}")
+    rows = len(signature) // bands
+    packed = pack_signature(signature)
+    width = rows * 4
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                packed[b * width:(b + 1) * width], digest_size=8, person=b.to_bytes(2, "little")
+            ).digest(),
+            "little",
+            signed=True,
+        )
+        for b in range(bands)
+    ]
+
+
+# ----------------- IN-MEMORY INDEX -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class LSHMatch:
+    """Casi duplicado encontrado por el índice."""
+
+    item_id: int
+    similarity: float  # Jaccard estimada por las firmas
+
+
+@dataclass(frozen=True, slots=True)
+class LSHQueryResult:
+    """Resultado de una búsqueda: mejor match y candidatos verificados."""
+
+    match: LSHMatch | None
+    candidates: int
+
+
+def best_match(
+    signature: Signature,
+    candidates: dict[int, Signature],
+    threshold: float,
+) -> LSHMatch | None:
+    """Candidato con mayor Jaccard estimada, si alcanza el umbral."""
+    mejor: LSHMatch | None = None
+    for item_id, firma in candidates.items():
+        similitud = estimate_jaccard(signature, firma)
+        if similitud >= threshold and (mejor is None or similitud > mejor.similarity):
+            mejor = LSHMatch(item_id, similitud)
+    return mejor
+
+
+class LSHIndex:
+    """
+    Índice LSH en memoria (tests, benchmark y despliegues chicos).
+
+    En producción las bandas viven en Postgres (ver analysis_minhash); la
+    lógica de candidatos y verificación es la misma.
+    """
+
+    def __init__(self, bands: int = DEFAULT_BANDS) -> None:
+        self.bands = bands
+        self._buckets: list[dict[int, list[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: dict[int, bytes] = {}  # empaquetadas: 4 bytes por posición
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, item_id: int, signature: Signature) -> None:
+        """Indexa una firma."""
+        self._signatures[item_id] = pack_signature(signature)
+        for band, bucket in enumerate(band_hashes(signature, self.bands)):
+            self._buckets[band][bucket].append(item_id)
+
+    def query(
+        self, signature: Signature, threshold: float, max_candidates: int = 50
+    ) -> LSHQueryResult:
+        """
+        Busca el casi duplicado más parecido.
+
+        Solo se verifican hasta max_candidates candidatos (costo acotado
+        aunque un bucket esté muy poblado).
+        """
+        candidatos: dict[int, Signature] = {}
+        for band, bucket in enumerate(band_hashes(signature, self.bands)):
+            for item_id in self._buckets[band].get(bucket, ()):
+                if len(candidatos) >= max_candidates:
+                    break
+                if item_id not in candidatos:
+                    candidatos[item_id] = unpack_signature(self._signatures[item_id])
+        return LSHQueryResult(best_match(signature, candidatos, threshold), len(candidatos))
@@ -0,0 +1,184 @@
+# backend/app/application/model_router.py
+"""
+Enrutado de análisis a modelos de Gemini según tamaño y complejidad del código.
+
+Características:
+- Perfil barato del código: líneas, nodos AST, anidamiento y ramas (complejidad ciclomática aprox.)
+- Tier "lite" para snippets triviales y tier "standard" para el resto
+- Cadena de fallback configurable ante timeouts, 5xx/429 o circuito abierto
+"""
+
+import ast
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.infrastructure.gemini_client import (
+    RETRYABLE_STATUS_CODES,
+    GeminiAPIError,
+    GeminiTimeoutError,
+    GeminiUnavailableError,
+)
+
+
+# ----------------- CONSTANTS -----------------
+
+
+TIER_LITE = "lite"
+TIER_STANDARD = "standard"
+
+# Nodos que agregan un camino de ejecución (aproximación a McCabe)
+_BRANCH_NODES = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.Try,
+    ast.ExceptHandler,
+    ast.With,
+    ast.AsyncWith,
+    ast.BoolOp,
+    ast.IfExp,
+    ast.comprehension,
+    ast.Match,
+)
+
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+
+
+# ----------------- PROFILE -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class CodeProfile:
+    """Métricas estáticas del código usadas para elegir el tier."""
+
+    lines: int
+    nodes: int
+    branches: int
+    max_depth: int
+    parsed: bool
+
+    @property
+    def complexity(self) -> int:
+        """Complejidad ciclomática aproximada (1 + puntos de decisión)."""
+        return 1 + self.branches
+
+
+def _scope_depth(tree: ast.AST) -> int:
+    """Profundidad máxima de funciones/clases anidadas."""
+    deepest = 0
+    stack: list[tuple[ast.AST, int]] = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, _SCOPE_NODES):
+            depth += 1
+            deepest = max(deepest, depth)
+        stack.extend((child, depth) for child in ast.iter_child_nodes(node))
+    return deepest
+
+
+def profile_code(code: str) -> CodeProfile:
+    """
+    Calcula el perfil del código.
+
+    Si el código no parsea se marca `parsed=False`: un snippet roto no es
+    "trivial" (suele necesitar el modelo más capaz para explicarlo).
+    """
+    lines = sum(1 for line in code.splitlines() if line.strip())
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return CodeProfile(lines=lines, nodes=0, branches=0, max_depth=0, parsed=False)
+
+    nodes = 0
+    branches = 0
+    for node in ast.walk(tree):
+        nodes += 1
+        if isinstance(node, _BRANCH_NODES):
+            branches += 1
+    return CodeProfile(
+        lines=lines,
+        nodes=nodes,
+        branches=branches,
+        max_depth=_scope_depth(tree),
+        parsed=True,
+    )
+
+
+# ----------------- ROUTING -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class ModelRoute:
+    """Decisión de enrutado: tier elegido y modelos a intentar en orden."""
+
+    tier: str
+    models: tuple[str, ...]
+    profile: CodeProfile
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+
+def _parse_models(value: str) -> list[str]:
+    """Lista de modelos separada por comas (ignora vacíos)."""
+    return [m.strip() for m in value.split(",") if m.strip()]
+
+
+class ModelRouter:
+    """
+    Elige el modelo de Gemini para un análisis.
+
+    Uso:
+        route = ModelRouter().route(codigo)
+        for model in route.models:
+            ...  # intentar y pasar al siguiente si is_fallback_error(e)
+    """
+
+    __slots__ = ("_lite_model", "_standard_model", "_fallbacks", "_enabled", "_max_lines", "_max_complexity")
+
+    def __init__(
+        self,
+        standard_model: str | None = None,
+        lite_model: str | None = None,
+        fallback_models: list[str] | None = None,
+        enabled: bool | None = None,
+    ) -> None:
+        self._standard_model = standard_model or settings.GEMINI_MODEL
+        self._lite_model = lite_model or settings.GEMINI_LITE_MODEL
+        self._fallbacks = (
+            fallback_models
+            if fallback_models is not None
+            else _parse_models(settings.GEMINI_FALLBACK_MODELS)
+        )
+        self._enabled = settings.GEMINI_ROUTING_ENABLED if enabled is None else enabled
+        self._max_lines = settings.GEMINI_ROUTING_LITE_MAX_LINES
+        self._max_complexity = settings.GEMINI_ROUTING_LITE_MAX_COMPLEXITY
+
+    def _is_trivial(self, profile: CodeProfile) -> bool:
+        return (
+            profile.parsed
+            and profile.lines <= self._max_lines
+            and profile.complexity <= self._max_complexity
+            and profile.max_depth <= 2
+        )
+
+    def route(self, code: str) -> ModelRoute:
+        """Perfila el código y arma la cadena [modelo del tier, *fallbacks]."""
+        profile = profile_code(code)
+        if self._enabled and self._lite_model and self._is_trivial(profile):
+            tier, primary = TIER_LITE, self._lite_model
+        else:
+            tier, primary = TIER_STANDARD, self._standard_model
+
+        models = [primary]
+        models.extend(m for m in self._fallbacks if m not in models)
+        return ModelRoute(tier=tier, models=tuple(models), profile=profile)
+
+
+def is_fallback_error(error: BaseException) -> bool:
+    """Errores por los que conviene probar el siguiente modelo de la cadena."""
+    if isinstance(error, GeminiTimeoutError | GeminiUnavailableError):
+        return True
+    return isinstance(error, GeminiAPIError) and error.status_code in RETRYABLE_STATUS_CODES
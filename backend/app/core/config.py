@@ -76,9 +76,281 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = Field(..., description="API Key de Gemini")
     GEMINI_MODEL: str = Field(default="gemini-2.5-flash")
 
+    # --- Gemini: límites de salida por request (según tamaño del código y rol) ---
+    GEMINI_OUTPUT_TOKENS_BASE: int = Field(
+        default=1536,
+        description="Tokens de salida para las secciones fijas del análisis",
+    )
+    GEMINI_OUTPUT_TOKENS_PER_INPUT_TOKEN: float = Field(
+        default=1.5,
+        description="Tokens de salida por token de código (código mejorado + cambios)",
+    )
+    GEMINI_THINKING_TOKENS_PER_INPUT_TOKEN: float = Field(default=1.0)
+    GEMINI_THINKING_MIN_BUDGET: int = Field(default=512)
+    # Un código de 40000 caracteres (~10000 tokens) necesita ~16.5k de salida visible
+    # más el thinking: los techos tienen que cubrirlo o el análisis se corta en MAX_TOKENS
+    GEMINI_MAX_OUTPUT_TOKENS_BY_ROLE: dict[str, int] = Field(
+        default={"anonymous": 20480, "free": 20480, "pro": 32768, "custom": 32768, "admin": 32768},
+        description="Techo de maxOutputTokens por rol (JSON; incluye el thinking)",
+    )
+    GEMINI_THINKING_BUDGET_BY_ROLE: dict[str, int] = Field(
+        default={"anonymous": 1024, "free": 2048, "pro": 8192, "custom": 8192, "admin": 8192},
+        description="Techo de thinkingBudget por rol (JSON)",
+    )
+    GEMINI_MAX_CONTINUATIONS: int = Field(
+        default=1,
+        description="Continuaciones tras un corte por MAX_TOKENS (0 = ninguna)",
+    )
+
+    # --- Gemini: salida estructurada ---
+    ANALYSIS_STRUCTURED_OUTPUT: bool = Field(
+        default=False,
+        description="Modo opcional: análisis bloqueante en JSON con responseSchema (streaming sigue en markdown)",
+    )
+    ANALYSIS_EDITS_ENABLED: bool = Field(
+        default=False,
+        description="Pedir ediciones por rango de líneas en vez del código completo "
+        "(requiere ANALYSIS_STRUCTURED_OUTPUT; comparar analysis_output_tokens por output antes de activarlo)",
+    )
+    ANALYSIS_EDITS_MIN_LINES: int = Field(
+        default=60,
+        description="Líneas (no vacías) desde las que se usa el modo ediciones",
+    )
+    ANALYSIS_PARALLEL_ENABLED: bool = Field(
+        default=False,
+        description="Hallazgos y código mejorado en dos requests concurrentes (2x RPM y tokens de entrada)",
+    )
+
+    # --- Análisis: coalescing de requests idénticas en curso (single-flight) ---
+    ANALYSIS_SINGLE_FLIGHT_ENABLED: bool = Field(default=True)
+    ANALYSIS_SINGLE_FLIGHT_WAIT: float = Field(
+        default=240.0,
+        description="Espera máxima (s) al análisis idéntico en curso en otro worker",
+    )
+    ANALYSIS_SINGLE_FLIGHT_LOCK_TTL: float = Field(
+        default=15.0,
+        description="TTL (s) del lock del líder en Redis; se renueva mientras calcula",
+    )
+
+    # --- Análisis: caché de resultados (memoria + Redis) ---
+    ANALYSIS_CACHE_ENABLED: bool = Field(default=True)
+    ANALYSIS_CACHE_MAX_BYTES: int = Field(
+        default=64 * 1024 * 1024,
+        description="Tamaño máximo (bytes) de la caché de resultados en memoria de cada worker",
+    )
+    ANALYSIS_CACHE_TTL: float = Field(
+        default=86400.0,
+        description="Vida (s) de un resultado cacheado; cambiar prompts o modelos ya cambia la clave",
+    )
+    ANALYSIS_CACHE_KEY_CANONICAL_DOCSTRINGS: bool = Field(
+        default=True,
+        description="Ignorar el formato (espacios, saltos) de los docstrings al comparar código",
+    )
+
+    # --- Análisis: reutilización de análisis casi duplicados (embeddings + pgvector) ---
+    ANALYSIS_SEMANTIC_DEDUP_ENABLED: bool = Field(default=False)
+    ANALYSIS_SEMANTIC_DEDUP_THRESHOLD: float = Field(
+        default=0.97,
+        description="Similitud coseno mínima para devolver un análisis previo sin llamar a Gemini",
+    )
+    ANALYSIS_SEMANTIC_DEDUP_MAX_CHARS: int = Field(
+        default=8000,
+        description="Código más largo no se deduplica (el embedding solo ve el comienzo)",
+    )
+    ANALYSIS_SEMANTIC_DEDUP_CROSS_USER: bool = Field(
+        default=False,
+        description="Reutilizar análisis de otros usuarios (expone su código mejorado)",
+    )
+    ANALYSIS_SEMANTIC_DEDUP_REFRESH: bool = Field(
+        default=False,
+        description="Tras reutilizar, analizar igual en segundo plano y dejar el resultado en caché",
+    )
+
+    # --- Análisis: casi duplicados por MinHash/LSH (local, sin llamadas a la API) ---
+    ANALYSIS_MINHASH_ENABLED: bool = Field(default=False)
+    ANALYSIS_MINHASH_THRESHOLD: float = Field(
+        default=0.9,
+        description="Similitud de Jaccard estimada mínima para reutilizar un análisis previo",
+    )
+    ANALYSIS_MINHASH_NUM_PERM: int = Field(
+        default=128,
+        description="Posiciones de la firma (4 bytes c/u); cambiarlo invalida las firmas guardadas",
+    )
+    ANALYSIS_MINHASH_BANDS: int = Field(
+        default=16,
+        description="Bandas LSH (divide NUM_PERM); cambiarlo invalida los buckets guardados",
+    )
+    ANALYSIS_MINHASH_SHINGLE_SIZE: int = Field(default=5)
+    ANALYSIS_MINHASH_MAX_CANDIDATES: int = Field(
+        default=50,
+        description="Candidatos verificados por búsqueda como máximo (acota la latencia)",
+    )
+    ANALYSIS_MINHASH_CROSS_USER: bool = Field(
+        default=False,
+        description="Reutilizar análisis de otros usuarios (expone su código mejorado)",
+    )
+
+    # --- Análisis: desconexión del cliente ---
+    ANALYSIS_DISCONNECT_POLL_INTERVAL: float = Field(
+        default=1.0,
+        description="Cada cuántos segundos se verifica si el cliente sigue conectado",
+    )
+    ANALYSIS_FINISH_ON_DISCONNECT: bool = Field(
+        default=False,
+        description="Si el cliente se desconecta, terminar igual la llamada a Gemini "
+        "para dejar el resultado a requests idénticas (libera la sesión de DB, no el cupo)",
+    )
+
+    # --- Análisis: modo asíncrono (jobs en workers Celery) ---
+    ANALYSIS_JOBS_ENABLED: bool = Field(
+        default=False,
+        description="Habilita POST /api/analysis/jobs (requiere Redis y workers Celery)",
+    )
+    ANALYSIS_JOB_TTL: int = Field(
+        default=86400,
+        description="Segundos que se conservan el estado y el resultado de un job",
+    )
+    ANALYSIS_JOB_TIME_LIMIT: int = Field(
+        default=300,
+        description="Tiempo máximo de un análisis en el worker (luego se aborta)",
+    )
+    ANALYSIS_JOB_SOFT_TIME_LIMIT: int = Field(
+        default=270,
+        description="Tiempo tras el cual el worker marca el job como fallido (504); menor que ANALYSIS_JOB_TIME_LIMIT",
+    )
+    ANALYSIS_JOB_EVENTS_TIMEOUT: float = Field(
+        default=600.0,
+        description="Duración máxima de una suscripción SSE al estado de un job",
+    )
+
+    # --- Gemini: enrutado de modelos por tamaño/complejidad ---
+    GEMINI_ROUTING_ENABLED: bool = Field(default=True)
+    GEMINI_LITE_MODEL: str = Field(
+        default="gemini-2.5-flash-lite",
+        description="Modelo para snippets triviales (vacío = sin tier lite)",
+    )
+    GEMINI_ROUTING_LITE_MAX_LINES: int = Field(default=30)
+    GEMINI_ROUTING_LITE_MAX_COMPLEXITY: int = Field(
+        default=5,
+        description="Complejidad ciclomática aproximada máxima para el tier lite",
+    )
+    GEMINI_FALLBACK_MODELS: str = Field(
+        default="gemini-2.5-flash-lite,gemini-2.0-flash",
+        description="Modelos a probar en orden si el principal falla (separados por coma)",
+    )
+    GEMINI_FALLBACK_DEADLINE: float = Field(
+        default=240.0,
+        description="Tiempo total (s) de la cadena de modelos; cada intento recibe solo lo que queda",
+    )
+    GEMINI_FALLBACK_MIN_REMAINING: float = Field(
+        default=30.0,
+        description="No se prueba el siguiente modelo con menos segundos restantes",
+    )
+
+    # --- Gemini: pool HTTP compartido ---
+    GEMINI_HTTP2: bool = Field(default=True, description="Usar HTTP/2 hacia la API de Gemini")
+    GEMINI_MAX_CONNECTIONS: int = Field(default=20)
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=10)
+    GEMINI_KEEPALIVE_EXPIRY: float = Field(
+        default=120.0,
+        description="Segundos que una conexión ociosa se mantiene abierta",
+    )
+
+    # --- Gemini: reintentos (por operación) ---
+    GEMINI_RETRY_BASE_DELAY: float = Field(default=1.0)
+    GEMINI_RETRY_MAX_DELAY: float = Field(default=30.0)
+    GEMINI_ANALYSIS_RETRY_ATTEMPTS: int = Field(default=3)
+    GEMINI_ANALYSIS_RETRY_MAX_ELAPSED: float = Field(
+        default=240.0,
+        description="Presupuesto total (s) de un análisis incluyendo reintentos",
+    )
+    GEMINI_EMBEDDING_RETRY_ATTEMPTS: int = Field(default=4)
+    GEMINI_EMBEDDING_RETRY_MAX_ELAPSED: float = Field(default=45.0)
+
+    # --- Gemini: circuit breaker (por modelo + API key) ---
+    GEMINI_BREAKER_FAILURE_RATE: float = Field(
+        default=0.5,
+        description="Tasa de errores/timeouts en la ventana que abre el circuito",
+    )
+    GEMINI_BREAKER_MIN_CALLS: int = Field(default=5)
+    GEMINI_BREAKER_WINDOW_SECONDS: float = Field(default=60.0)
+    GEMINI_BREAKER_OPEN_SECONDS: float = Field(default=30.0)
+    GEMINI_BREAKER_HALF_OPEN_PROBES: int = Field(default=1)
+
+    # --- Gemini: límites de concurrencia saliente ---
+    GEMINI_MAX_CONCURRENCY: int = Field(
+        default=8,
+        description="Llamadas simultáneas a Gemini en todo el proceso",
+    )
+    GEMINI_SYSTEM_KEY_MAX_CONCURRENCY: int = Field(default=4)
+    GEMINI_USER_KEY_MAX_CONCURRENCY: int = Field(default=2)
+    GEMINI_QUEUE_TIMEOUT: float = Field(
+        default=30.0,
+        description="Segundos máximos en cola esperando un slot",
+    )
+
+    # --- Gemini: ritmo por cuotas RPM/TPM (0 = sin límite; opt-in según el plan) ---
+    GEMINI_ANALYSIS_RPM: int = Field(default=0)
+    GEMINI_ANALYSIS_TPM: int = Field(default=0)
+    GEMINI_EMBEDDING_RPM: int = Field(default=0)
+    GEMINI_EMBEDDING_TPM: int = Field(default=0)
+    GEMINI_PACING_SAFETY_FACTOR: float = Field(
+        default=0.9,
+        description="Fracción de la cuota publicada que se usa como límite efectivo",
+    )
+    GEMINI_PACING_BURST_SECONDS: float = Field(
+        default=60.0,
+        description="Ráfaga máxima expresada en segundos de cuota (60 = la cuota de un minuto)",
+    )
+    GEMINI_PACING_MAX_WAIT: float = Field(default=60.0)
+
+    # --- Gemini: context caching de las instrucciones de análisis ---
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = Field(
+        default=False,
+        description="Solo rinde si las instrucciones superan el mínimo cacheable del modelo",
+    )
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = Field(
+        default=1024,
+        description="Mínimo de tokens de un cachedContent (2.5 Flash: 1024, 2.5 Pro: 4096)",
+    )
+    GEMINI_CONTEXT_CACHE_TTL: float = Field(default=3600.0)
+    GEMINI_CONTEXT_CACHE_REFRESH_MARGIN: float = Field(
+        default=300.0,
+        description="Segundos antes del vencimiento en que se extiende el TTL del caché",
+    )
+    GEMINI_CONTEXT_CACHE_RETRY_AFTER: float = Field(
+        default=1800.0,
+        description="Segundos con prompt inline tras un fallo al crear el caché",
+    )
+
+    # --- Gemini: hedging de análisis (request duplicada si la primera tarda) ---
+    GEMINI_HEDGING_ENABLED: bool = Field(default=False)
+    GEMINI_HEDGE_QUANTILE: float = Field(
+        default=0.95,
+        description="Percentil de latencia reciente tras el que se lanza el hedge",
+    )
+    GEMINI_HEDGE_MIN_DELAY: float = Field(default=5.0)
+    GEMINI_HEDGE_MIN_SAMPLES: int = Field(default=20)
+    GEMINI_HEDGE_MAX_PERCENT: float = Field(
+        default=5.0,
+        description="Máximo de requests duplicadas como % del tráfico de análisis",
+    )
+
+    # --- Gemini: registro de clientes por API key de usuario ---
+    GEMINI_CLIENT_REGISTRY_SIZE: int = Field(default=256)
+    GEMINI_CLIENT_IDLE_TTL: float = Field(
+        default=900.0,
+        description="Segundos sin uso tras los que se descarta el cliente de una key",
+    )
+
     # --- Redis ---
     REDIS_HOST: str = Field(default="redis")
     REDIS_PORT: int = Field(default=6379)
+    REDIS_ENABLED: bool = Field(
+        default=True,
+        description="Coordinación entre workers por Redis (sin él: solo local)",
+    )
+    REDIS_SOCKET_TIMEOUT: float = Field(default=2.0)
     
     @property
     def REDIS_URL(self) -> str:
@@ -0,0 +1,66 @@
+# backend/app/core/json_codec.py
+"""
+Codificación JSON rápida para el tráfico con Gemini y las respuestas de la API.
+
+Características:
+- orjson cuando está instalado (encode/decode en C, directo a/desde bytes)
+- Fallback transparente a la librería estándar `json`
+- Vista previa acotada de payloads para logs (costo fijo aunque la respuesta pese MB)
+"""
+
+import json
+import reprlib
+from typing import Any
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+# ----------------- CONSTANTS -----------------
+
+
+ORJSON_AVAILABLE = orjson is not None
+
+# Tope de caracteres de un payload en los logs
+LOG_PREVIEW_CHARS = 500
+
+
+# ----------------- CODEC -----------------
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializa a JSON UTF-8 (bytes, listo para el body HTTP)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Deserializa JSON desde bytes o str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# ----------------- LOGGING -----------------
+
+
+# repr con límites de profundidad, items y largo de strings: no recorre ni
+# formatea el payload completo (ej: candidates con todo el markdown)
+_preview_repr = reprlib.Repr()
+_preview_repr.maxlevel = 6
+_preview_repr.maxdict = 8
+_preview_repr.maxlist = 4
+_preview_repr.maxstring = 120
+_preview_repr.maxother = 120
+
+
+def preview(data: Any, limit: int = LOG_PREVIEW_CHARS) -> str:
+    """Representación truncada de un payload para logs."""
+    text = _preview_repr.repr(data)
+    if len(text) > limit:
+        return f"{text[:limit]}… ({len(text)} chars)"
+    return text
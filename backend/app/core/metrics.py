@@ -0,0 +1,172 @@
+# backend/app/core/metrics.py
+"""
+Métricas en proceso para observabilidad de la aplicación.
+
+Características:
+- Contadores, gauges y resúmenes (count/sum/max + percentiles recientes)
+- Etiquetas arbitrarias por métrica (ej: model, operation)
+- Sin dependencias externas (apto para OrangePi)
+- Snapshot serializable a JSON (expuesto en /health/metrics)
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any
+
+
+# ----------------- CONSTANTS -----------------
+
+
+# Cantidad de observaciones recientes retenidas por resumen (para percentiles)
+SUMMARY_WINDOW = 512
+
+# Percentiles reportados en el snapshot
+SNAPSHOT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    """Normaliza las etiquetas a una clave hashable y ordenada."""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(q * len(values)) - 1)
+    return values[index]
+
+
+# ----------------- SUMMARY -----------------
+
+
+class _Summary:
+    """Resumen de observaciones: totales acumulados + ventana reciente."""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: deque[float] = deque(maxlen=SUMMARY_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.recent:
+            return None
+        return _percentile(sorted(self.recent), q)
+
+    def to_dict(self) -> dict[str, float]:
+        ordered = sorted(self.recent)
+        data = {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+        }
+        for q in SNAPSHOT_QUANTILES:
+            data[f"p{int(q * 100)}"] = round(_percentile(ordered, q), 6)
+        return data
+
+
+# ----------------- REGISTRY -----------------
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas en memoria del proceso.
+
+    Uso:
+        metrics.inc("gemini_requests_total", operation="analyze")
+        metrics.observe("gemini_latency_seconds", 1.25, model="gemini-2.5-flash")
+        metrics.set_gauge("gemini_inflight", 3, key="system")
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._gauges: dict[str, dict[LabelKey, float]] = {}
+        self._summaries: dict[str, dict[LabelKey, _Summary]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Incrementa un contador."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Fija el valor actual de un gauge."""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def add_gauge(self, name: str, delta: float, **labels: Any) -> None:
+        """Suma (o resta) un delta al valor actual de un gauge."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Registra una observación (latencia, tamaño, etc.) en un resumen."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = _Summary()
+            summary.observe(value)
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        """Valor actual de un contador (0 si no existe)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def quantile(self, name: str, q: float, **labels: Any) -> float | None:
+        """Percentil reciente de un resumen (None si no hay observaciones)."""
+        with self._lock:
+            summary = self._summaries.get(name, {}).get(_label_key(labels))
+            return summary.quantile(q) if summary else None
+
+    def summary_count(self, name: str, **labels: Any) -> int:
+        """Cantidad total de observaciones de un resumen (0 si no existe)."""
+        with self._lock:
+            summary = self._summaries.get(name, {}).get(_label_key(labels))
+            return summary.count if summary else 0
+
+    def snapshot(self) -> dict[str, Any]:
+        """Retorna todas las métricas en un dict serializable a JSON."""
+
+        def _series(values: dict[LabelKey, Any], render: Any) -> list[dict[str, Any]]:
+            return [{"labels": dict(key), "value": render(v)} for key, v in values.items()]
+
+        with self._lock:
+            return {
+                "counters": {n: _series(s, float) for n, s in self._counters.items()},
+                "gauges": {n: _series(s, float) for n, s in self._gauges.items()},
+                "summaries": {n: _series(s, _Summary.to_dict) for n, s in self._summaries.items()},
+            }
+
+    def reset(self) -> None:
+        """Elimina todas las métricas (útil en tests)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# ----------------- SINGLETON -----------------
+
+
+metrics = MetricsRegistry()
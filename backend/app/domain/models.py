@@ -6,12 +6,15 @@ Define las entidades principales:
 - Role: Roles de usuario (free, pro, custom, admin)
 - User: Usuarios del sistema
 - Analysis: Registros de análisis de código
+- AnalysisLSHBand: Buckets LSH de las firmas MinHash (casi duplicados)
 """
 
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy import (
+    JSON,
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
@@ -19,12 +22,15 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
+    SmallInteger,
     String,
     Text,
 )
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import Mapped, declarative_base, relationship
 
+
 # Type checking para evitar imports circulares
 if TYPE_CHECKING:
     from typing import List
@@ -162,7 +168,7 @@ class Analysis(Base, AsyncAttrs):
     
     Almacena:
     - Código original y mejorado
-    - Resultado del análisis (markdown)
+    - Resultado del análisis (markdown) y reporte estructurado (JSON)
     - Score de calidad (0-100)
     - Metadata (modelo, tokens)
     """
@@ -194,6 +200,11 @@ class Analysis(Base, AsyncAttrs):
         nullable=False,
         comment="Resultado del análisis en formato markdown"
     )
+    report: Mapped[Optional[dict]] = Column(
+        JSON,
+        nullable=True,
+        comment="Reporte estructurado (modo JSON) validado contra el esquema"
+    )
     quality_score: Mapped[Optional[int]] = Column(
         Integer, 
         nullable=True,
@@ -206,7 +217,27 @@ class Analysis(Base, AsyncAttrs):
         default="gemini-2.5-flash",
         nullable=False
     )
-    tokens_used: Mapped[Optional[int]] = Column(Integer, nullable=True)
+    tokens_used: Mapped[Optional[int]] = Column(
+        Integer,
+        nullable=True,
+        comment="totalTokenCount de Gemini (prompt + salida + thinking)"
+    )
+    prompt_tokens: Mapped[Optional[int]] = Column(Integer, nullable=True)
+    output_tokens: Mapped[Optional[int]] = Column(Integer, nullable=True)
+    thinking_tokens: Mapped[Optional[int]] = Column(Integer, nullable=True)
+
+    # Casi duplicados
+    minhash: Mapped[Optional[bytes]] = Column(
+        LargeBinary,
+        nullable=True,
+        comment="Firma MinHash del código original (uint32 little-endian)"
+    )
+    duplicate_of_id: Mapped[Optional[int]] = Column(
+        Integer,
+        ForeignKey("analyses.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="Análisis previo reutilizado (casi duplicado): procedencia del resultado copiado; no se indexa"
+    )
 
     # Timestamps (timezone-aware)
     created_at: Mapped[datetime] = Column(
@@ -229,3 +260,32 @@ class Analysis(Base, AsyncAttrs):
             return self.code_original[:100] + "..."
         return self.code_original
 
+
+class AnalysisLSHBand(Base, AsyncAttrs):
+    """
+    Bucket LSH de una banda de la firma MinHash de un análisis.
+
+    Una fila por (análisis, banda): dos análisis que comparten algún
+    (band, bucket) son candidatos a casi duplicados.
+    """
+
+    __tablename__ = "analysis_lsh_bands"
+    __table_args__ = (
+        Index("ix_analysis_lsh_bands_bucket", "band", "bucket"),
+    )
+
+    analysis_id: Mapped[int] = Column(
+        Integer,
+        ForeignKey("analyses.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    band: Mapped[int] = Column(SmallInteger, primary_key=True)
+    bucket: Mapped[int] = Column(BigInteger, nullable=False)
+    user_id: Mapped[int] = Column(
+        Integer,
+        nullable=False,
+        comment="Dueño del análisis (filtro sin join)"
+    )
+
+    def __repr__(self) -> str:
+        return f"<AnalysisLSHBand(analysis_id={self.analysis_id}, band={self.band})>"
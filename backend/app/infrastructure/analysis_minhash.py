@@ -0,0 +1,146 @@
+# backend/app/infrastructure/analysis_minhash.py
+"""
+Índice LSH de firmas MinHash de análisis, en Postgres.
+
+Características:
+- La firma compacta vive en `analyses.minhash` (4 bytes por posición)
+- Una fila por banda en `analysis_lsh_bands`, indexada por (band, bucket)
+- Búsqueda de candidatos acotada a max_candidates (primero los que comparten
+  más bandas, luego los más recientes); la verificación por Jaccard
+  estimada es del llamador (app.application.minhash)
+- Cada operación corre en un savepoint: un error no aborta la transacción del análisis
+"""
+
+import logging
+
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.domain.models import Analysis, AnalysisLSHBand
+from app.infrastructure.analysis_vectors import SimilarAnalysis
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- ERRORS -----------------
+
+
+class MinHashIndexError(Exception):
+    """Error al consultar o actualizar el índice LSH."""
+    pass
+
+
+# ----------------- QUERIES -----------------
+
+
+async def find_lsh_candidates(
+    db: AsyncSession,
+    buckets: list[int],
+    max_candidates: int,
+    user_id: int | None = None,
+) -> dict[int, bytes]:
+    """
+    Firmas de los análisis que comparten algún bucket LSH.
+
+    Args:
+        db: Sesión de base de datos
+        buckets: Bucket de cada banda de la firma consultada
+        max_candidates: Candidatos devueltos como máximo (los de más bandas
+            en común y, a igualdad, los más recientes)
+        user_id: Limitar a los análisis de este usuario (None = todos)
+
+    Returns:
+        analysis_id → firma empaquetada
+
+    Raises:
+        MinHashIndexError: Si la consulta falla
+    """
+    candidatos = (
+        select(AnalysisLSHBand.analysis_id)
+        .where(tuple_(AnalysisLSHBand.band, AnalysisLSHBand.bucket).in_(list(enumerate(buckets))))
+        .group_by(AnalysisLSHBand.analysis_id)
+        # Más bandas en común = Jaccard más alta; el límite no corta al azar
+        .order_by(func.count().desc(), AnalysisLSHBand.analysis_id.desc())
+        .limit(max_candidates)
+    )
+    if user_id is not None:
+        candidatos = candidatos.where(AnalysisLSHBand.user_id == user_id)
+
+    try:
+        async with db.begin_nested():
+            result = await db.execute(
+                select(Analysis.id, Analysis.minhash).where(
+                    Analysis.id.in_(candidatos.scalar_subquery()), Analysis.minhash.isnot(None)
+                )
+            )
+            return dict(result.all())
+    except SQLAlchemyError as e:
+        raise MinHashIndexError(f"Búsqueda de candidatos LSH fallida: {e}") from e
+
+
+async def load_similar_analysis(
+    db: AsyncSession, analysis_id: int, similarity: float
+) -> SimilarAnalysis | None:
+    """
+    Carga el análisis elegido como casi duplicado.
+
+    Raises:
+        MinHashIndexError: Si la consulta falla
+    """
+    try:
+        async with db.begin_nested():
+            row = (
+                await db.execute(
+                    select(
+                        Analysis.analysis_result,
+                        Analysis.code_improved,
+                        Analysis.report,
+                        Analysis.quality_score,
+                        Analysis.model_used,
+                    ).where(Analysis.id == analysis_id)
+                )
+            ).first()
+    except SQLAlchemyError as e:
+        raise MinHashIndexError(f"No se pudo cargar el análisis {analysis_id}: {e}") from e
+
+    if row is None:
+        return None
+    return SimilarAnalysis(
+        analysis_id=analysis_id,
+        similarity=similarity,
+        analysis_result=row.analysis_result,
+        code_improved=row.code_improved,
+        report=row.report,
+        quality_score=row.quality_score,
+        model_used=row.model_used,
+        method="minhash",
+    )
+
+
+async def index_minhash(
+    db: AsyncSession,
+    analysis_id: int,
+    user_id: int,
+    signature: bytes,
+    buckets: list[int],
+) -> None:
+    """
+    Guarda la firma empaquetada de un análisis ya persistido y sus buckets LSH.
+
+    Raises:
+        MinHashIndexError: Si la escritura falla
+    """
+    try:
+        async with db.begin_nested():
+            await db.execute(
+                update(Analysis).where(Analysis.id == analysis_id).values(minhash=signature)
+            )
+            db.add_all(
+                AnalysisLSHBand(analysis_id=analysis_id, band=band, bucket=bucket, user_id=user_id)
+                for band, bucket in enumerate(buckets)
+            )
+            await db.flush()
+    except SQLAlchemyError as e:
+        raise MinHashIndexError(f"No se pudo indexar la firma MinHash: {e}") from e
@@ -0,0 +1,156 @@
+# backend/app/infrastructure/analysis_vectors.py
+"""
+Búsqueda por similitud de embeddings sobre análisis previos (pgvector).
+
+Características:
+- Columna `analyses.code_embedding vector(VECTOR_DIM)` con índice HNSW (coseno)
+- El esquema se crea en init_db solo si la deduplicación semántica está activa
+- SQL directo: el modelo ORM no mapea la columna (no requiere el paquete pgvector)
+- Cada operación corre en un savepoint: un error (p. ej. extensión ausente)
+  no aborta la transacción del análisis
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- SCHEMA -----------------
+
+
+# Idempotentes; requieren la extensión pgvector (imagen ankane/pgvector)
+VECTOR_SCHEMA_UPGRADES: list[str] = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    f"ALTER TABLE analyses ADD COLUMN IF NOT EXISTS code_embedding vector({settings.VECTOR_DIM})",
+    "CREATE INDEX IF NOT EXISTS ix_analyses_code_embedding "
+    "ON analyses USING hnsw (code_embedding vector_cosine_ops)",
+]
+
+
+async def init_vector_schema(conn: AsyncConnection) -> bool:
+    """
+    Crea la columna e índice de embeddings.
+
+    Returns:
+        False si pgvector no está disponible (la deduplicación queda sin efecto)
+    """
+    try:
+        async with conn.begin_nested():
+            for statement in VECTOR_SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
+    except SQLAlchemyError as e:
+        logger.warning(f"⚠️ pgvector no disponible, sin deduplicación semántica: {e}")
+        return False
+    return True
+
+
+# ----------------- ERRORS -----------------
+
+
+class VectorSearchError(Exception):
+    """Error al buscar o guardar embeddings de análisis."""
+    pass
+
+
+# ----------------- QUERIES -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class SimilarAnalysis:
+    """Análisis previo más parecido al código consultado (por embeddings o MinHash)."""
+
+    analysis_id: int
+    similarity: float  # coseno (embedding) o Jaccard estimada (minhash); 1 = idéntico
+    analysis_result: str
+    code_improved: str | None
+    report: dict[str, Any] | None
+    quality_score: int | None
+    model_used: str | None
+    method: str = "embedding"  # "embedding" o "minhash"
+
+
+def _vector_literal(vector: list[float]) -> str:
+    """Formato de texto de pgvector ('[0.1,0.2,...]')."""
+    if len(vector) != settings.VECTOR_DIM:
+        raise VectorSearchError(f"Embedding de {len(vector)} dimensiones (se esperaban {settings.VECTOR_DIM})")
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+# El parámetro viaja como texto y se castea en el servidor (asyncpg no tiene codec de vector)
+_FIND_SIMILAR = """
+    SELECT id, analysis_result, code_improved, report, quality_score, model_used,
+           1 - (code_embedding <=> CAST(CAST(:vector AS text) AS vector)) AS similarity
+    FROM analyses
+    WHERE code_embedding IS NOT NULL {user_filter}
+    ORDER BY code_embedding <=> CAST(CAST(:vector AS text) AS vector)
+    LIMIT 1
+"""
+
+_STORE_EMBEDDING = """
+    UPDATE analyses SET code_embedding = CAST(CAST(:vector AS text) AS vector)
+    WHERE id = :analysis_id
+"""
+
+
+async def find_similar_analysis(
+    db: AsyncSession, vector: list[float], user_id: int | None = None
+) -> SimilarAnalysis | None:
+    """
+    Análisis previo con el embedding más cercano.
+
+    Args:
+        db: Sesión de base de datos
+        vector: Embedding del código consultado
+        user_id: Limitar a los análisis de este usuario (None = todos)
+
+    Raises:
+        VectorSearchError: Si la consulta falla (p. ej. sin pgvector)
+    """
+    params: dict[str, Any] = {"vector": _vector_literal(vector)}
+    user_filter = ""
+    if user_id is not None:
+        user_filter = "AND user_id = :user_id"
+        params["user_id"] = user_id
+    try:
+        async with db.begin_nested():
+            result = await db.execute(text(_FIND_SIMILAR.format(user_filter=user_filter)), params)
+            row = result.mappings().first()
+    except SQLAlchemyError as e:
+        raise VectorSearchError(f"Búsqueda por similitud fallida: {e}") from e
+
+    if row is None:
+        return None
+    return SimilarAnalysis(
+        analysis_id=row["id"],
+        similarity=float(row["similarity"]),
+        analysis_result=row["analysis_result"],
+        code_improved=row["code_improved"],
+        report=row["report"],
+        quality_score=row["quality_score"],
+        model_used=row["model_used"],
+    )
+
+
+async def store_code_embedding(db: AsyncSession, analysis_id: int, vector: list[float]) -> None:
+    """
+    Guarda el embedding del código de un análisis ya persistido.
+
+    Raises:
+        VectorSearchError: Si la actualización falla
+    """
+    try:
+        async with db.begin_nested():
+            await db.execute(
+                text(_STORE_EMBEDDING), {"vector": _vector_literal(vector), "analysis_id": analysis_id}
+            )
+    except SQLAlchemyError as e:
+        raise VectorSearchError(f"No se pudo guardar el embedding: {e}") from e
@@ -12,11 +12,13 @@ import logging
 from enum import IntEnum
 from typing import AsyncGenerator, TypedDict
 
-from sqlalchemy import insert, select
+from sqlalchemy import insert, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.core.config import settings, Environment
+from app.core.config import Environment, settings
 from app.domain.models import Base, Role
+from app.infrastructure.analysis_vectors import init_vector_schema
+
 
 logger = logging.getLogger(__name__)
 
@@ -118,10 +120,27 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 # ----------------- INIT DB -----------------
 
 
+# Columnas agregadas a tablas existentes (create_all solo crea tablas nuevas).
+# Idempotentes: se ejecutan en cada arranque.
+SCHEMA_UPGRADES: list[str] = [
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER",
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS output_tokens INTEGER",
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS thinking_tokens INTEGER",
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS report JSON",
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS minhash BYTEA",
+    "ALTER TABLE analyses ADD COLUMN IF NOT EXISTS duplicate_of_id INTEGER "
+    "REFERENCES analyses(id) ON DELETE SET NULL",
+]
+
+
 async def init_db() -> None:
-    """Crear todas las tablas en la base de datos."""
+    """Crear todas las tablas en la base de datos y aplicar columnas nuevas."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+        if settings.ANALYSIS_SEMANTIC_DEDUP_ENABLED:
+            await init_vector_schema(conn)
     logger.info("✅ Base de datos inicializada")
 
 
@@ -3,20 +3,54 @@
 Cliente asíncrono para la API de Google Gemini.
 
 Características:
-- Reutilización de conexiones HTTP (connection pooling)
+- Pool HTTP compartido por proceso (HTTP/2 + keep-alive), creado en el lifespan
+- Métricas de conexiones nuevas vs reutilizadas
 - Context manager async para manejo de recursos
-- Soporte para análisis de código y embeddings
+- Soporte para análisis de código (bloqueante o streaming SSE) y embeddings
 - Timeouts configurables por operación
+- Reintentos con backoff + jitter respetando Retry-After (por operación)
+- Circuit breaker por modelo + API key (fail-fast con half-open probing)
+- Límites de concurrencia global y por API key (cola FIFO con timeout)
+- Ritmo de envío por cuotas RPM/TPM con tokens de entrada estimados
+- Conteo de tokens (prompt, salida, thinking, cacheados) desde usageMetadata
+- Context caching de las instrucciones fijas del análisis (cachedContents)
+- Salida del análisis en markdown, JSON estructurado (responseSchema) o ediciones por rango de líneas
+- Modo paralelo opcional: hallazgos y código mejorado en dos requests concurrentes
+- maxOutputTokens y thinkingBudget según tamaño del código y rol, con continuación ante MAX_TOKENS
+- Hedging opcional de análisis (p95 reciente) acotado a un % del tráfico
+- Registro LRU de clientes por API key de usuario sobre el mismo pool
+- JSON con orjson (si está instalado) y logs de respuestas acotados
 """
 
 import asyncio
+import hashlib
 import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from types import TracebackType
-from typing import Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
 import httpx
 
+from app.core import json_codec
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.infrastructure.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitPermit,
+    FifoLimiter,
+    HedgeBudget,
+    LimiterTimeoutError,
+    RatePacer,
+    RateWaitExceededError,
+    RetryPolicy,
+    parse_retry_after,
+)
+
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +75,40 @@ ANALYSIS_TIMEOUT = httpx.Timeout(
 )
 EMBEDDING_TIMEOUT = 30.0
 
+# Límites de batchEmbedContents (por request)
+BATCH_EMBED_MAX_ITEMS = 100
+BATCH_EMBED_MAX_BYTES = 2_000_000
+BATCH_EMBED_ITEM_OVERHEAD = 96  # bytes aprox. de JSON por item (model, content, parts)
+BATCH_EMBED_CONCURRENCY = 2
+
+# Eventos de trazado de httpcore usados para contar conexiones
+_TRACE_CONNECT_EVENT = "connection.connect_tcp.complete"
+_TRACE_SEND_HEADERS_EVENTS = frozenset({
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+})
+
+# Operaciones (clave de políticas de reintento y etiqueta de métricas)
+OPERATION_ANALYZE = "analyze"
+OPERATION_EMBED = "embed"
+
+# Estimación de tokens de entrada (regla de Google: ~4 caracteres por token)
+ESTIMATED_CHARS_PER_TOKEN = 4
+
+# Errores de generateContent que indican un cachedContent vencido o ajeno
+CACHE_INVALID_STATUS_CODES = frozenset({403, 404})
+
+# Errores transitorios que justifican reintentar
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+RETRYABLE_EXCEPTIONS: tuple[type[Exception], ...] = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.ReadError,
+    httpx.WriteError,
+    httpx.RemoteProtocolError,
+)
+
 # Configuración de generación
 ANALYSIS_GENERATION_CONFIG = {
     "temperature": 0.3,
@@ -49,6 +117,25 @@ ANALYSIS_GENERATION_CONFIG = {
     "topK": 10,
 }
 
+# Formatos de salida del análisis
+# Body pre-serializado con json_codec (en vez de `json=`, que usa la librería estándar)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+OUTPUT_MARKDOWN = "markdown"
+OUTPUT_JSON = "json"
+OUTPUT_EDITS = "edits"  # JSON con ediciones por líneas en vez del archivo completo
+OUTPUT_FINDINGS = "findings"  # Modo paralelo: hallazgos y score
+OUTPUT_REWRITE = "rewrite"  # Modo paralelo: código mejorado y cambios
+
+# Rol de las requests sin usuario autenticado (clave de los techos por rol)
+ROLE_ANONYMOUS = "anonymous"
+
+# Modelos sin thinkingConfig (la API rechaza el campo)
+_NON_THINKING_MODEL_PREFIXES = ("gemini-1.", "gemini-2.0")
+
+# Buckets de tamaño del código (tokens estimados) para métricas de latencia
+SIZE_BUCKETS: tuple[tuple[int, str], ...] = ((250, "xs"), (1000, "s"), (4000, "m"))
+
 
 # ----------------- EXCEPTIONS -----------------
 
@@ -75,15 +162,127 @@ class GeminiConfigError(GeminiError):
     pass
 
 
+class GeminiUnavailableError(GeminiError):
+    """Gemini no disponible temporalmente (circuito abierto): fail-fast."""
+    def __init__(self, message: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+# ----------------- RESULTS -----------------
+
+
+@dataclass(slots=True)
+class TokenUsage:
+    """Tokens consumidos por una generación (usageMetadata de Gemini)."""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    total_tokens: int = 0
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[dict]) -> "TokenUsage":
+        """Construye el conteo desde el `usageMetadata` de una respuesta."""
+        metadata = metadata or {}
+        return cls(
+            prompt_tokens=metadata.get("promptTokenCount", 0),
+            cached_tokens=metadata.get("cachedContentTokenCount", 0),
+            output_tokens=metadata.get("candidatesTokenCount", 0),
+            thinking_tokens=metadata.get("thoughtsTokenCount", 0),
+            total_tokens=metadata.get("totalTokenCount", 0),
+        )
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        """Suma de dos generaciones (ej: respuesta + continuación)."""
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            cached_tokens=self.cached_tokens + other.cached_tokens,
+            output_tokens=self.output_tokens + other.output_tokens,
+            thinking_tokens=self.thinking_tokens + other.thinking_tokens,
+            total_tokens=self.total_tokens + other.total_tokens,
+        )
+
+
+@dataclass(slots=True)
+class GenerationResult:
+    """
+    Resultado de una generación de análisis: texto + metadatos de la respuesta.
+
+    En streaming se pasa vacío a `stream_analysis` y se completa a medida que
+    llegan los fragmentos (el usageMetadata final llega con el último).
+    """
+
+    text: str = ""
+    model: str = ""
+    finish_reason: Optional[str] = None
+    usage: TokenUsage = field(default_factory=TokenUsage)
+
+
+@dataclass(frozen=True, slots=True)
+class GenerationBudget:
+    """Límites de salida de un análisis (maxOutputTokens incluye el thinking)."""
+
+    max_output_tokens: int
+    thinking_budget: int
+
+
+def _record_usage(model: str, usage: TokenUsage) -> None:
+    """Acumula los tokens de una generación en las métricas del proceso."""
+    for kind, value in (
+        ("prompt", usage.prompt_tokens),
+        ("cached", usage.cached_tokens),
+        ("output", usage.output_tokens),
+        ("thinking", usage.thinking_tokens),
+    ):
+        if value:
+            metrics.inc("gemini_tokens_total", value, model=model, kind=kind)
+    if usage.total_tokens:
+        metrics.observe("gemini_tokens_per_request", usage.total_tokens, model=model)
+
+
+@dataclass(frozen=True, slots=True)
+class EmbeddingResult:
+    """Resultado de embedding de un texto dentro de un batch."""
+
+    index: int
+    text: str
+    values: list[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """True si se obtuvo un vector válido."""
+        return self.error is None and bool(self.values)
+
+
+# ----------------- MESSAGES -----------------
+
+
+ANALYSIS_TIMEOUT_MESSAGE = (
+    "⏱️ **Timeout**: El análisis está tomando más tiempo del esperado.\n\n"
+    "**Sugerencias:**\n"
+    "- Intenta de nuevo (a veces Gemini tarda más)\n"
+    "- Divide el código en partes más pequeñas"
+)
+
+ANALYSIS_EMPTY_MESSAGE = "⚠️ No se pudo generar el análisis"
+
+
 # ----------------- PROMPT -----------------
 
 
-ANALYSIS_PROMPT_TEMPLATE = """Eres un experto en Python con 10 años de experiencia. Analiza este código y proporciona un análisis detallado.
+# Pedido de continuación cuando la respuesta se cortó por MAX_TOKENS
+ANALYSIS_CONTINUATION_PROMPT = (
+    "Tu respuesta anterior se cortó por límite de longitud. Continúa exactamente "
+    "desde donde quedó, sin repetir nada de lo ya escrito y respetando el formato."
+)
 
-**CÓDIGO A ANALIZAR:**
-```python
-{code}
-```
+
+# Instrucciones fijas (systemInstruction): idénticas en cada request, se
+# guardan una vez por modelo + API key con la API cachedContents
+ANALYSIS_SYSTEM_INSTRUCTION = """Eres un experto en Python con 10 años de experiencia. Analiza el código que te envíe el usuario y proporciona un análisis detallado.
 
 **INSTRUCCIONES:**
 1. Identifica bugs, code smells y mejoras de rendimiento
@@ -123,6 +322,665 @@ ANALYSIS_PROMPT_TEMPLATE = """Eres un experto en Python con 10 años de experien
 - Si el código está perfecto, di "✅ Código excelente, no requiere cambios"
 - Siempre incluye el código mejorado completo, no fragmentos"""
 
+# Contenido variable de cada request: solo el código del usuario
+ANALYSIS_USER_TEMPLATE = """**CÓDIGO A ANALIZAR:**
+```python
+{code}
+```"""
+
+# Instrucciones del modo JSON: mismo criterio, la forma la impone responseSchema
+ANALYSIS_JSON_SYSTEM_INSTRUCTION = """Eres un experto en Python con 10 años de experiencia. Analiza el código que te envíe el usuario y responde con un objeto JSON.
+
+**INSTRUCCIONES:**
+1. `bugs`: bugs potenciales encontrados (lista vacía si no hay)
+2. `code_smells`: malas prácticas encontradas (lista vacía si no hay)
+3. `mejoras_rendimiento`: optimizaciones posibles (lista vacía si no hay)
+4. `score`: score de calidad de 0 a 100 y `justificacion` en 2-3 líneas
+5. `codigo_mejorado`: el código CORREGIDO completo (no fragmentos), sin bloques markdown
+6. `cambios`: cada cambio realizado con su `tipo` y una `descripcion` breve
+
+**IMPORTANTE:**
+- Sé específico y constructivo; cada ítem en una oración
+- Si el código está perfecto, deja las listas vacías y devuelve el mismo código"""
+
+# Esquema de la respuesta JSON (subconjunto OpenAPI de Gemini)
+_STRING_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "bugs": _STRING_LIST,
+        "code_smells": _STRING_LIST,
+        "mejoras_rendimiento": _STRING_LIST,
+        "score": {"type": "INTEGER", "minimum": 0, "maximum": 100},
+        "justificacion": {"type": "STRING"},
+        "codigo_mejorado": {"type": "STRING"},
+        "cambios": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"tipo": {"type": "STRING"}, "descripcion": {"type": "STRING"}},
+                "required": ["tipo", "descripcion"],
+            },
+        },
+    },
+    "required": [
+        "bugs",
+        "code_smells",
+        "mejoras_rendimiento",
+        "score",
+        "justificacion",
+        "codigo_mejorado",
+        "cambios",
+    ],
+    "propertyOrdering": [
+        "bugs",
+        "code_smells",
+        "mejoras_rendimiento",
+        "score",
+        "justificacion",
+        "codigo_mejorado",
+        "cambios",
+    ],
+}
+
+# Modo ediciones: el código llega numerado y el modelo devuelve solo los rangos a
+# reemplazar (los tokens de salida dominan la latencia; no regenera el archivo)
+ANALYSIS_EDITS_SYSTEM_INSTRUCTION = """Eres un experto en Python con 10 años de experiencia. Analiza el código que te envíe el usuario (cada línea lleva su número como `N| `) y responde con un objeto JSON.
+
+**INSTRUCCIONES:**
+1. `bugs`: bugs potenciales encontrados (lista vacía si no hay)
+2. `code_smells`: malas prácticas encontradas (lista vacía si no hay)
+3. `mejoras_rendimiento`: optimizaciones posibles (lista vacía si no hay)
+4. `score`: score de calidad de 0 a 100 y `justificacion` en 2-3 líneas
+5. `ediciones`: NO devuelvas el código completo; solo los rangos que cambian:
+   - `linea_inicio` y `linea_fin`: rango a reemplazar (1-based, inclusivo, números del código recibido)
+   - `reemplazo`: líneas nuevas completas con su indentación, sin números ni bloques markdown ("" para borrar)
+   - Para insertar sin borrar usa `linea_fin` = `linea_inicio` - 1 (inserta antes de `linea_inicio`)
+   - Los rangos no se superponen
+6. `cambios`: cada cambio realizado con su `tipo` y una `descripcion` breve
+
+**IMPORTANTE:**
+- Sé específico y constructivo; cada ítem en una oración
+- Aplicadas todas las ediciones, el archivo debe ser Python válido
+- Si el código está perfecto, deja las listas vacías (sin ediciones)"""
+
+ANALYSIS_EDITS_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        **{k: v for k, v in ANALYSIS_RESPONSE_SCHEMA["properties"].items() if k != "codigo_mejorado"},
+        "ediciones": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "linea_inicio": {"type": "INTEGER"},
+                    "linea_fin": {"type": "INTEGER"},
+                    "reemplazo": {"type": "STRING"},
+                },
+                "required": ["linea_inicio", "linea_fin", "reemplazo"],
+                "propertyOrdering": ["linea_inicio", "linea_fin", "reemplazo"],
+            },
+        },
+    },
+    "required": [
+        "bugs",
+        "code_smells",
+        "mejoras_rendimiento",
+        "score",
+        "justificacion",
+        "ediciones",
+        "cambios",
+    ],
+    "propertyOrdering": [
+        "bugs",
+        "code_smells",
+        "mejoras_rendimiento",
+        "score",
+        "justificacion",
+        "ediciones",
+        "cambios",
+    ],
+}
+
+# Modo paralelo: cada request genera solo su parte y ambas corren a la vez
+ANALYSIS_FINDINGS_SYSTEM_INSTRUCTION = """Eres un experto en Python con 10 años de experiencia. Revisa el código que te envíe el usuario y responde con un objeto JSON.
+
+**INSTRUCCIONES:**
+1. `bugs`: bugs potenciales encontrados (lista vacía si no hay)
+2. `code_smells`: malas prácticas encontradas (lista vacía si no hay)
+3. `mejoras_rendimiento`: optimizaciones posibles (lista vacía si no hay)
+4. `score`: score de calidad de 0 a 100 y `justificacion` en 2-3 líneas
+
+**IMPORTANTE:**
+- Sé específico y constructivo; cada ítem en una oración
+- No escribas el código corregido"""
+
+ANALYSIS_REWRITE_SYSTEM_INSTRUCTION = """Eres un experto en Python con 10 años de experiencia. Corrige y mejora el código que te envíe el usuario (bugs, malas prácticas y rendimiento) y responde con un objeto JSON.
+
+**INSTRUCCIONES:**
+1. `codigo_mejorado`: el código CORREGIDO completo (no fragmentos), sin bloques markdown
+2. `cambios`: cada cambio realizado con su `tipo` y una `descripcion` breve
+
+**IMPORTANTE:**
+- Si el código está perfecto, devuelve el mismo código y `cambios` vacío"""
+
+
+def _subschema(keys: list[str]) -> dict:
+    """Subconjunto de ANALYSIS_RESPONSE_SCHEMA con las propiedades `keys` (en ese orden)."""
+    properties = ANALYSIS_RESPONSE_SCHEMA["properties"]
+    return {
+        "type": "OBJECT",
+        "properties": {k: properties[k] for k in keys},
+        "required": keys,
+        "propertyOrdering": keys,
+    }
+
+
+ANALYSIS_FINDINGS_RESPONSE_SCHEMA = _subschema(
+    ["bugs", "code_smells", "mejoras_rendimiento", "score", "justificacion"]
+)
+ANALYSIS_REWRITE_RESPONSE_SCHEMA = _subschema(["codigo_mejorado", "cambios"])
+
+ANALYSIS_SYSTEM_INSTRUCTIONS = {
+    OUTPUT_MARKDOWN: ANALYSIS_SYSTEM_INSTRUCTION,
+    OUTPUT_JSON: ANALYSIS_JSON_SYSTEM_INSTRUCTION,
+    OUTPUT_EDITS: ANALYSIS_EDITS_SYSTEM_INSTRUCTION,
+    OUTPUT_FINDINGS: ANALYSIS_FINDINGS_SYSTEM_INSTRUCTION,
+    OUTPUT_REWRITE: ANALYSIS_REWRITE_SYSTEM_INSTRUCTION,
+}
+
+_RESPONSE_SCHEMAS = {
+    OUTPUT_JSON: ANALYSIS_RESPONSE_SCHEMA,
+    OUTPUT_EDITS: ANALYSIS_EDITS_RESPONSE_SCHEMA,
+    OUTPUT_FINDINGS: ANALYSIS_FINDINGS_RESPONSE_SCHEMA,
+    OUTPUT_REWRITE: ANALYSIS_REWRITE_RESPONSE_SCHEMA,
+}
+
+# Versión corta de cada prompt: cambia el nombre del caché si cambian las instrucciones
+ANALYSIS_PROMPT_HASHES = {
+    output: hashlib.sha256(instruction.encode("utf-8")).hexdigest()[:12]
+    for output, instruction in ANALYSIS_SYSTEM_INSTRUCTIONS.items()
+}
+
+# Versión del conjunto de prompts y esquemas (claves de coalescing y caché de resultados)
+ANALYSIS_PROMPT_VERSION = hashlib.sha256(
+    json_codec.dumps([ANALYSIS_SYSTEM_INSTRUCTIONS, ANALYSIS_USER_TEMPLATE, _RESPONSE_SCHEMAS])
+).hexdigest()[:12]
+
+
+# ----------------- RETRY POLICIES -----------------
+
+
+def default_retry_policies() -> dict[str, RetryPolicy]:
+    """Políticas de reintento por operación, según settings."""
+    return {
+        OPERATION_ANALYZE: RetryPolicy(
+            max_attempts=settings.GEMINI_ANALYSIS_RETRY_ATTEMPTS,
+            base_delay=settings.GEMINI_RETRY_BASE_DELAY,
+            max_delay=settings.GEMINI_RETRY_MAX_DELAY,
+            max_elapsed=settings.GEMINI_ANALYSIS_RETRY_MAX_ELAPSED,
+            # Un read timeout de análisis ya consumió ~3 min: no repetir
+            retry_on_read_timeout=False,
+        ),
+        OPERATION_EMBED: RetryPolicy(
+            max_attempts=settings.GEMINI_EMBEDDING_RETRY_ATTEMPTS,
+            base_delay=settings.GEMINI_RETRY_BASE_DELAY,
+            max_delay=settings.GEMINI_RETRY_MAX_DELAY,
+            max_elapsed=settings.GEMINI_EMBEDDING_RETRY_MAX_ELAPSED,
+            retry_on_read_timeout=True,
+        ),
+    }
+
+
+# ----------------- CIRCUIT BREAKERS -----------------
+
+
+# Un breaker por (modelo, fingerprint de API key)
+_circuit_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Identificador no reversible de una API key ("system" para la del sistema)."""
+    if api_key == settings.GEMINI_API_KEY:
+        return "system"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def get_circuit_breaker(model: str, api_key: str) -> CircuitBreaker:
+    """Obtiene (o crea) el circuit breaker para un modelo y una API key."""
+    key = (model, key_fingerprint(api_key))
+    breaker = _circuit_breakers.get(key)
+    if breaker is None:
+        breaker = _circuit_breakers[key] = CircuitBreaker(
+            name=f"{key[0]}:{key[1]}",
+            failure_rate_threshold=settings.GEMINI_BREAKER_FAILURE_RATE,
+            min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+            window_seconds=settings.GEMINI_BREAKER_WINDOW_SECONDS,
+            open_seconds=settings.GEMINI_BREAKER_OPEN_SECONDS,
+            half_open_max_probes=settings.GEMINI_BREAKER_HALF_OPEN_PROBES,
+        )
+    return breaker
+
+
+def circuit_breakers_snapshot() -> list[dict]:
+    """Estado de todos los circuit breakers (para /health/gemini)."""
+    return [breaker.snapshot() for breaker in _circuit_breakers.values()]
+
+
+def _is_breaker_failure(error: BaseException) -> bool:
+    """Indica si un error cuenta para abrir el circuito (5xx, 429, timeouts, red)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+# ----------------- CONCURRENCY LIMITS -----------------
+
+
+# Límite global del proceso + uno por API key (sistema o de usuario)
+_global_limiter = FifoLimiter("global", settings.GEMINI_MAX_CONCURRENCY)
+_key_limiters: dict[str, FifoLimiter] = {}
+
+
+def get_key_limiter(api_key: str) -> tuple[FifoLimiter, str]:
+    """
+    Obtiene (o crea) el limitador de concurrencia de una API key.
+
+    Returns:
+        Tupla (limitador, scope) con scope "system" o "user" (etiqueta de métricas)
+    """
+    fingerprint = key_fingerprint(api_key)
+    scope = "system" if fingerprint == "system" else "user"
+    limiter = _key_limiters.get(fingerprint)
+    if limiter is None:
+        limit = (
+            settings.GEMINI_SYSTEM_KEY_MAX_CONCURRENCY
+            if scope == "system"
+            else settings.GEMINI_USER_KEY_MAX_CONCURRENCY
+        )
+        limiter = _key_limiters[fingerprint] = FifoLimiter(fingerprint, limit)
+    return limiter, scope
+
+
+def _forget_key_state(fingerprint: str) -> None:
+    """
+    Descarta breakers, pacers y limitador de una API key sin uso.
+
+    El limitador solo se descarta si no tiene llamadas en curso ni en cola.
+    """
+    limiter = _key_limiters.get(fingerprint)
+    if limiter and not limiter.inflight and not limiter.queued:
+        del _key_limiters[fingerprint]
+    for key in [k for k in _circuit_breakers if k[1] == fingerprint]:
+        del _circuit_breakers[key]
+    for key in [k for k in _rate_pacers if k[1] == fingerprint]:
+        del _rate_pacers[key]
+    # Los cachedContents remotos vencen solos por TTL
+    for key in [k for k in _prompt_caches if k[1] == fingerprint]:
+        del _prompt_caches[key]
+
+
+def concurrency_snapshot() -> list[dict]:
+    """Estado de los limitadores de concurrencia (para /health/gemini)."""
+    return [_global_limiter.snapshot(), *(limiter.snapshot() for limiter in _key_limiters.values())]
+
+
+# ----------------- RATE PACING -----------------
+
+
+# Un pacer por (modelo, fingerprint de API key): las cuotas son por modelo y proyecto
+_rate_pacers: dict[tuple[str, str], RatePacer] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens de entrada de un texto."""
+    return max(1, math.ceil(len(text) / ESTIMATED_CHARS_PER_TOKEN))
+
+
+def estimate_payload_tokens(payload: dict) -> int:
+    """Suma los tokens estimados de todos los textos de un payload de Gemini."""
+    total = 0
+    stack: list = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            text = node.get("text")
+            if isinstance(text, str):
+                total += estimate_tokens(text)
+            stack.extend(v for k, v in node.items() if k != "text")
+        elif isinstance(node, list):
+            stack.extend(node)
+    return total
+
+
+def get_rate_pacer(operation: str, model: str, api_key: str) -> RatePacer:
+    """Obtiene (o crea) el pacer RPM/TPM para un modelo y una API key."""
+    key = (model, key_fingerprint(api_key))
+    pacer = _rate_pacers.get(key)
+    if pacer is None:
+        if operation == OPERATION_EMBED:
+            rpm, tpm = settings.GEMINI_EMBEDDING_RPM, settings.GEMINI_EMBEDDING_TPM
+        else:
+            rpm, tpm = settings.GEMINI_ANALYSIS_RPM, settings.GEMINI_ANALYSIS_TPM
+        factor = settings.GEMINI_PACING_SAFETY_FACTOR
+        pacer = _rate_pacers[key] = RatePacer(
+            name=f"{key[0]}:{key[1]}",
+            rpm=rpm * factor,
+            tpm=tpm * factor,
+            burst_seconds=settings.GEMINI_PACING_BURST_SECONDS,
+        )
+    return pacer
+
+
+def rate_pacers_snapshot() -> list[dict]:
+    """Cuota disponible de cada pacer (para /health/gemini)."""
+    return [pacer.snapshot() for pacer in _rate_pacers.values()]
+
+
+# ----------------- GENERATION BUDGET -----------------
+
+
+def size_bucket(code: str) -> str:
+    """Bucket de tamaño del código (xs/s/m/l) para etiquetar métricas."""
+    tokens = estimate_tokens(code)
+    for limit, name in SIZE_BUCKETS:
+        if tokens <= limit:
+            return name
+    return "l"
+
+
+def generation_budget(code: str, role: Optional[str] = None) -> GenerationBudget:
+    """
+    Calcula maxOutputTokens y thinkingBudget a partir del tamaño del código.
+
+    La salida visible escala con la entrada (el análisis incluye el código
+    mejorado completo) y el thinking se suma porque en los modelos 2.5 cuenta
+    dentro de maxOutputTokens. Ambos se acotan con los techos del rol.
+    """
+    role = role or ROLE_ANONYMOUS
+    input_tokens = estimate_tokens(code)
+    output_ceiling = settings.GEMINI_MAX_OUTPUT_TOKENS_BY_ROLE.get(
+        role, ANALYSIS_GENERATION_CONFIG["maxOutputTokens"]
+    )
+    thinking_ceiling = settings.GEMINI_THINKING_BUDGET_BY_ROLE.get(
+        role, settings.GEMINI_THINKING_MIN_BUDGET
+    )
+
+    thinking = max(
+        settings.GEMINI_THINKING_MIN_BUDGET,
+        math.ceil(input_tokens * settings.GEMINI_THINKING_TOKENS_PER_INPUT_TOKEN),
+    )
+    thinking = min(thinking, thinking_ceiling)
+    visible = settings.GEMINI_OUTPUT_TOKENS_BASE + math.ceil(
+        input_tokens * settings.GEMINI_OUTPUT_TOKENS_PER_INPUT_TOKEN
+    )
+    return GenerationBudget(
+        max_output_tokens=min(output_ceiling, visible + thinking),
+        thinking_budget=thinking,
+    )
+
+
+def _supports_thinking(model: str) -> bool:
+    """Indica si el modelo acepta thinkingConfig."""
+    return not model.startswith(_NON_THINKING_MODEL_PREFIXES)
+
+
+def analysis_generation_config(
+    model: str,
+    budget: Optional[GenerationBudget],
+    output: str = OUTPUT_MARKDOWN,
+) -> dict:
+    """generationConfig del análisis: base fija + límites del presupuesto + formato."""
+    if budget is None and output == OUTPUT_MARKDOWN:
+        return ANALYSIS_GENERATION_CONFIG
+    config = dict(ANALYSIS_GENERATION_CONFIG)
+    if budget is not None:
+        config["maxOutputTokens"] = budget.max_output_tokens
+        if _supports_thinking(model):
+            config["thinkingConfig"] = {"thinkingBudget": budget.thinking_budget}
+    if output in _RESPONSE_SCHEMAS:
+        config["responseMimeType"] = "application/json"
+        config["responseSchema"] = _RESPONSE_SCHEMAS[output]
+    return config
+
+
+def number_lines(code: str) -> str:
+    """Antepone el número de línea (1-based) para que el modelo referencie rangos."""
+    return "\n".join(f"{i}| {line}" for i, line in enumerate(code.split("\n"), start=1))
+
+
+# ----------------- HEDGING -----------------
+
+
+# Presupuesto compartido por el proceso: hedges <= GEMINI_HEDGE_MAX_PERCENT % de los análisis
+_hedge_budget = HedgeBudget(settings.GEMINI_HEDGE_MAX_PERCENT)
+
+
+def hedge_delay(model: str, mode: str) -> Optional[float]:
+    """
+    Segundos a esperar antes de lanzar un hedge (None = no hacer hedging).
+
+    Usa el percentil configurado de la latencia reciente del modelo: total en
+    modo bloqueante, hasta el primer fragmento (TTFB) en streaming. Sin
+    suficientes muestras no se hace hedging.
+    """
+    if not settings.GEMINI_HEDGING_ENABLED:
+        return None
+    if mode == "stream":
+        name, labels = "gemini_analysis_ttfb_seconds", {"model": model}
+    else:
+        name, labels = "gemini_analysis_latency_seconds", {"model": model, "mode": mode}
+    if metrics.summary_count(name, **labels) < settings.GEMINI_HEDGE_MIN_SAMPLES:
+        return None
+    value = metrics.quantile(name, settings.GEMINI_HEDGE_QUANTILE, **labels)
+    return max(value or 0.0, settings.GEMINI_HEDGE_MIN_DELAY)
+
+
+async def _race_hedged(
+    launch: Callable[[], Awaitable[Any]],
+    delay: float,
+    model: str,
+    mode: str,
+) -> tuple[asyncio.Task, list[asyncio.Task]]:
+    """
+    Lanza una request y, si no terminó tras `delay`, una segunda idéntica.
+
+    Returns:
+        (tarea ganadora, tareas restantes). La ganadora es la primera que
+        termina sin error; si todas fallan se devuelve la original (su error
+        es el que se propaga). Las restantes quedan a cargo del caller.
+    """
+    tasks = [asyncio.ensure_future(launch())]
+    _hedge_budget.deposit()
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if _hedge_budget.try_spend():
+                hedged = True
+                tasks.append(asyncio.ensure_future(launch()))
+                metrics.inc("gemini_hedges_total", model=model, mode=mode)
+                logger.info(f"🪢 Hedge lanzado para {model} ({mode}) tras {delay:.1f}s sin respuesta")
+            else:
+                metrics.inc("gemini_hedges_skipped_total", model=model, mode=mode)
+
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    if hedged:
+                        winner = "primary" if task is tasks[0] else "hedge"
+                        metrics.inc("gemini_hedge_wins_total", model=model, mode=mode, winner=winner)
+                    return task, [t for t in tasks if t is not task]
+        return tasks[0], tasks[1:]
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _discard_tasks(tasks: list[asyncio.Task]) -> list[Any]:
+    """
+    Cancela las tareas perdedoras y espera su cierre (libera slots y breakers).
+
+    Returns:
+        Resultado (o excepción) de cada tarea, para cerrar recursos que ya abrieron
+    """
+    for task in tasks:
+        task.cancel()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _close_losing_streams(tasks: list[asyncio.Task]) -> None:
+    """
+    Descarta los streams perdedores de un hedge y cierra los que ya habían
+    emitido su primer fragmento (si no, su stream HTTP/2 sigue abierto hasta el GC).
+    """
+    streams = [result[0] for result in await _discard_tasks(tasks) if isinstance(result, tuple)]
+    for stream in streams:
+        try:
+            await stream.aclose()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cerrar un stream perdedor del hedge: {e}")
+
+
+# ----------------- CONTEXT CACHE -----------------
+
+
+@dataclass(slots=True)
+class _PromptCache:
+    """Estado local de un cachedContent con las instrucciones de análisis."""
+
+    name: Optional[str] = None
+    expires_at: float = 0.0
+    disabled_until: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+# (modelo, fingerprint de API key, formato) -> caché; los cachedContents
+# pertenecen al proyecto de la API key, así que cada key tiene el suyo
+_prompt_caches: dict[tuple[str, str, str], _PromptCache] = {}
+
+
+def _format_ttl(seconds: float) -> str:
+    """Duración en el formato de la API ("3600s")."""
+    return f"{int(seconds)}s"
+
+
+def _is_cache_rejection(error: GeminiAPIError) -> bool:
+    """Indica si generateContent rechazó el cachedContent (vencido, borrado o ajeno)."""
+    if error.status_code in CACHE_INVALID_STATUS_CODES:
+        return True
+    return error.status_code == 400 and "cache" in str(error).lower()
+
+
+def prompt_caches_snapshot() -> list[dict]:
+    """Estado de los cachés de prompt (para /health/gemini)."""
+    now = time.monotonic()
+    return [
+        {
+            "name": f"{model}:{fingerprint}:{output}",
+            "active": bool(entry.name) and entry.expires_at > now,
+            "expires_in": max(0.0, round(entry.expires_at - now, 1)) if entry.name else 0.0,
+        }
+        for (model, fingerprint, output), entry in _prompt_caches.items()
+    ]
+
+
+# ----------------- HTTP POOL -----------------
+
+
+def _http2_available() -> bool:
+    """Indica si el paquete `h2` (extra httpx[http2]) está instalado."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP compartido para todas las llamadas a Gemini.
+
+    Se instancia una sola vez por proceso (en `main.lifespan`) para que
+    DNS, TCP y TLS se paguen una vez y las conexiones se reutilicen.
+
+    Returns:
+        Cliente httpx con HTTP/2 (si está disponible) y límites de pool
+    """
+    http2 = settings.GEMINI_HTTP2 and _http2_available()
+    if settings.GEMINI_HTTP2 and not http2:
+        logger.warning("⚠️ Paquete 'h2' no instalado, usando HTTP/1.1 para Gemini")
+
+    limits = httpx.Limits(
+        max_connections=settings.GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY,
+    )
+    logger.info(
+        f"Pool HTTP Gemini: http2={http2}, max_connections={limits.max_connections}, "
+        f"keepalive={limits.max_keepalive_connections}"
+    )
+    return httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=limits, http2=http2)
+
+
+class _ConnectionTracer:
+    """
+    Traza una petición para saber si abrió conexión nueva o reutilizó una.
+
+    Se engancha vía la extensión `trace` de httpcore (una instancia por petición).
+    """
+
+    __slots__ = ("_connected",)
+
+    def __init__(self) -> None:
+        self._connected = False
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        if event_name == _TRACE_CONNECT_EVENT:
+            self._connected = True
+        elif event_name in _TRACE_SEND_HEADERS_EVENTS:
+            outcome = "new" if self._connected else "reused"
+            metrics.inc("gemini_http_connections_total", outcome=outcome)
+
+
+def connection_stats() -> dict[str, int]:
+    """Resumen de conexiones nuevas vs reutilizadas desde el arranque."""
+    new = int(metrics.counter_value("gemini_http_connections_total", outcome="new"))
+    reused = int(metrics.counter_value("gemini_http_connections_total", outcome="reused"))
+    return {"requests": new + reused, "new_connections": new, "reused_connections": reused}
+
+
+# ----------------- BATCHING -----------------
+
+
+def _chunk_for_batch(texts: list[str], indices: list[int]) -> list[list[int]]:
+    """
+    Agrupa índices de textos en chunks aptos para batchEmbedContents.
+
+    Cada chunk respeta BATCH_EMBED_MAX_ITEMS y BATCH_EMBED_MAX_BYTES
+    (un texto que excede el límite de bytes va solo en su chunk).
+    """
+    chunks: list[list[int]] = []
+    current: list[int] = []
+    current_bytes = 0
+
+    for index in indices:
+        size = len(texts[index].encode("utf-8")) + BATCH_EMBED_ITEM_OVERHEAD
+        if current and (
+            len(current) >= BATCH_EMBED_MAX_ITEMS or current_bytes + size > BATCH_EMBED_MAX_BYTES
+        ):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+
+    if current:
+        chunks.append(current)
+    return chunks
+
 
 # ----------------- CLIENT -----------------
 
@@ -131,7 +989,11 @@ class GeminiClient:
     """
     Cliente asíncrono para la API de Google Gemini.
     
-    Uso como context manager (recomendado para múltiples llamadas):
+    Uso con pool compartido (recomendado en la API, ver `create_http_client`):
+        client = GeminiClient(http_client=app.state.gemini_http)
+        result = await client.analyze_code(code)  # result.text, result.usage
+
+    Uso como context manager (scripts con múltiples llamadas):
         async with GeminiClient() as client:
             analysis = await client.analyze_code(code)
             embedding = await client.create_embedding(text)
@@ -142,12 +1004,14 @@ class GeminiClient:
         await client.close()
     """
 
-    __slots__ = ("_api_key", "_base_url", "_client", "_owns_client")
+    __slots__ = ("_api_key", "_base_url", "_client", "_owns_client", "_retry_policies")
 
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: str = GEMINI_API_BASE_URL,
+        http_client: Optional[httpx.AsyncClient] = None,
+        retry_policies: Optional[dict[str, RetryPolicy]] = None,
     ) -> None:
         """
         Inicializa el cliente de Gemini.
@@ -155,6 +1019,8 @@ class GeminiClient:
         Args:
             api_key: API key de Gemini (o usa GEMINI_API_KEY del entorno)
             base_url: URL base de la API
+            http_client: Cliente HTTP compartido (no se cierra en close())
+            retry_policies: Políticas de reintento por operación (default: settings)
             
         Raises:
             GeminiConfigError: Si no hay API key configurada
@@ -164,13 +1030,29 @@ class GeminiClient:
             raise GeminiConfigError("GEMINI_API_KEY es requerida")
         
         self._base_url = base_url
-        self._client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[httpx.AsyncClient] = http_client
         self._owns_client = False
+        self._retry_policies = retry_policies or default_retry_policies()
+
+    @property
+    def http_client(self) -> Optional[httpx.AsyncClient]:
+        """Cliente HTTP actual (compartido o propio), si existe."""
+        return self._client
+
+    def with_api_key(self, api_key: str) -> "GeminiClient":
+        """Crea un cliente para otra API key que reutiliza el mismo pool HTTP."""
+        return GeminiClient(
+            api_key=api_key,
+            base_url=self._base_url,
+            http_client=self._client,
+            retry_policies=self._retry_policies,
+        )
 
     async def __aenter__(self) -> "GeminiClient":
-        """Inicia el context manager y crea el cliente HTTP."""
-        self._client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT)
-        self._owns_client = True
+        """Inicia el context manager y crea el cliente HTTP si no hay uno compartido."""
+        if self._client is None:
+            self._client = create_http_client()
+            self._owns_client = True
         return self
 
     async def __aexit__(
@@ -187,59 +1069,370 @@ class GeminiClient:
         if self._client and self._owns_client:
             await self._client.aclose()
             self._client = None
+            self._owns_client = False
+
+    def _get_client(
+        self, timeout: Optional[httpx.Timeout | float] = None
+    ) -> tuple[httpx.AsyncClient, bool]:
+        """
+        Obtiene el cliente HTTP a usar.
 
-    def _get_client(self, timeout: Optional[httpx.Timeout] = None) -> httpx.AsyncClient:
-        """Obtiene o crea un cliente HTTP."""
+        Returns:
+            Tupla (cliente, should_close). `should_close` es True solo para
+            clientes temporales creados para una llamada única.
+        """
         if self._client:
-            return self._client
-        # Cliente temporal para llamadas únicas
-        return httpx.AsyncClient(timeout=timeout or DEFAULT_TIMEOUT)
+            return self._client, False
+        # Cliente temporal para llamadas únicas (sin pool compartido)
+        return httpx.AsyncClient(timeout=timeout or DEFAULT_TIMEOUT), True
+
+    @staticmethod
+    def _trace_extensions() -> dict:
+        """Extensiones httpx para trazar la reutilización de conexiones."""
+        return {"trace": _ConnectionTracer()}
+
+    def _check_circuit(self, breaker: CircuitBreaker, model: str) -> CircuitPermit:
+        """Autoriza una llamada en el breaker o falla de inmediato."""
+        try:
+            return breaker.before_call()
+        except CircuitOpenError as e:
+            metrics.inc("gemini_circuit_rejected_total", model=model)
+            logger.warning(f"Circuito abierto para {breaker.name}, fail-fast")
+            raise GeminiUnavailableError(
+                "🔌 Gemini no está disponible temporalmente. Intenta de nuevo en unos segundos.",
+                retry_after=e.retry_after,
+            ) from e
+
+    async def _pace(
+        self, operation: str, model: str, requests: int, tokens: int
+    ) -> None:
+        """
+        Espera a que las cuotas RPM/TPM del modelo permitan enviar.
+
+        Raises:
+            GeminiUnavailableError: Si la espera necesaria supera GEMINI_PACING_MAX_WAIT
+        """
+        pacer = get_rate_pacer(operation, model, self._api_key)
+        metrics.inc("gemini_estimated_input_tokens_total", tokens, model=model, operation=operation)
+        try:
+            waited = await pacer.acquire(
+                requests=requests,
+                tokens=tokens,
+                max_wait=settings.GEMINI_PACING_MAX_WAIT,
+            )
+        except RateWaitExceededError as e:
+            metrics.inc("gemini_pacing_rejected_total", model=model)
+            logger.warning(f"Cuota de Gemini agotada localmente: {e}")
+            raise GeminiUnavailableError(
+                "⏳ Se alcanzó la cuota por minuto de Gemini. Intenta de nuevo en unos segundos.",
+                retry_after=e.wait,
+            ) from e
+        if waited > 0:
+            logger.info(f"Pacing {model}: esperados {waited:.2f}s por cuota RPM/TPM")
+        metrics.observe("gemini_pacing_wait_seconds", waited, model=model)
+
+    @asynccontextmanager
+    async def _concurrency_slot(self) -> AsyncIterator[None]:
+        """
+        Ocupa un slot en el limitador de la API key y en el global.
+
+        Registra tiempo en cola e in-flight por scope (global / system / user).
+
+        Raises:
+            GeminiUnavailableError: Si se agota GEMINI_QUEUE_TIMEOUT esperando turno
+        """
+        key_limiter, scope = get_key_limiter(self._api_key)
+        deadline = time.monotonic() + settings.GEMINI_QUEUE_TIMEOUT
+        acquired: list[tuple[FifoLimiter, str]] = []
+
+        try:
+            for limiter, label in ((key_limiter, scope), (_global_limiter, "global")):
+                remaining = max(0.0, deadline - time.monotonic())
+                try:
+                    waited = await limiter.acquire(timeout=remaining)
+                except LimiterTimeoutError as e:
+                    metrics.inc("gemini_queue_timeout_total", scope=label)
+                    logger.warning(f"Cola de Gemini saturada ({label}): {e}")
+                    raise GeminiUnavailableError(
+                        "⏳ Hay demasiados análisis en curso. Intenta de nuevo en unos segundos.",
+                        retry_after=settings.GEMINI_QUEUE_TIMEOUT,
+                    ) from e
+                acquired.append((limiter, label))
+                metrics.observe("gemini_queue_wait_seconds", waited, scope=label)
+                metrics.add_gauge("gemini_inflight", 1, scope=label)
+            yield
+        finally:
+            for limiter, label in reversed(acquired):
+                limiter.release()
+                metrics.add_gauge("gemini_inflight", -1, scope=label)
+
+    async def _post_with_retry(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        payload: dict,
+        timeout: httpx.Timeout | float,
+        operation: str,
+        model: str,
+        requests: int = 1,
+    ) -> httpx.Response:
+        """
+        POST con circuit breaker, pacing, límites de concurrencia y reintentos.
+
+        Cada intento pasa por el breaker de (modelo, API key): si está abierto
+        falla de inmediato con GeminiUnavailableError; luego espera la cuota
+        RPM/TPM (tokens estimados del payload) y turno en los limitadores de
+        concurrencia (global y de la key). Reintenta 429/5xx y errores
+        de transporte transitorios con backoff "decorrelated jitter", respetando
+        Retry-After y el presupuesto total.
+
+        Returns:
+            Respuesta exitosa (2xx)
+
+        Raises:
+            GeminiUnavailableError: Si el circuito está abierto, la cola está saturada
+                o la cuota no alcanza dentro de la espera máxima
+            httpx.HTTPStatusError: Si la respuesta final es un error HTTP
+            httpx.TimeoutException / httpx.TransportError: Si se agotan los reintentos
+        """
+        policy = self._retry_policies[operation]
+        breaker = get_circuit_breaker(model, self._api_key)
+        tokens = estimate_payload_tokens(payload)
+        body = json_codec.dumps(payload)
+        started = time.monotonic()
+        delay = policy.base_delay
+        attempt = 0
+
+        while True:
+            attempt += 1
+            retry_after: Optional[float] = None
+            permit = self._check_circuit(breaker, model)
+            try:
+                await self._pace(operation, model, requests, tokens)
+                async with self._concurrency_slot():
+                    resp = await client.post(
+                        url,
+                        content=body,
+                        headers=JSON_HEADERS,
+                        timeout=timeout,
+                        extensions=self._trace_extensions(),
+                    )
+            except httpx.ReadTimeout as e:
+                breaker.record_failure(permit)
+                if not policy.retry_on_read_timeout:
+                    raise
+                failure: httpx.Response | Exception = e
+                reason = type(e).__name__
+            except RETRYABLE_EXCEPTIONS as e:
+                breaker.record_failure(permit)
+                failure = e
+                reason = type(e).__name__
+            except BaseException as e:
+                # Cancelación u otros errores: no es señal de salud del servicio
+                if _is_breaker_failure(e):
+                    breaker.record_failure(permit)
+                else:
+                    breaker.release(permit)
+                raise
+            else:
+                if resp.status_code not in RETRYABLE_STATUS_CODES:
+                    breaker.record_success(permit)
+                    resp.raise_for_status()
+                    if attempt > 1:
+                        metrics.inc("gemini_retry_recovered_total", operation=operation)
+                    return resp
+                breaker.record_failure(permit)
+                failure = resp
+                reason = f"http_{resp.status_code}"
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+
+            delay = policy.next_delay(delay, retry_after)
+            if not policy.allows(attempt, time.monotonic() - started, delay):
+                metrics.inc("gemini_retry_exhausted_total", operation=operation, reason=reason)
+                if isinstance(failure, httpx.Response):
+                    failure.raise_for_status()
+                raise failure
+
+            metrics.inc("gemini_retries_total", operation=operation, reason=reason)
+            logger.warning(
+                f"Gemini {operation}: {reason} en intento {attempt}/{policy.max_attempts}, "
+                f"reintentando en {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
 
     async def analyze_code(
         self,
         code: str,
         model: str = DEFAULT_ANALYSIS_MODEL,
-    ) -> str:
+        role: Optional[str] = None,
+        output: str = OUTPUT_MARKDOWN,
+    ) -> GenerationResult:
         """
         Analiza código Python y retorna sugerencias de mejora.
+
+        Con `output=OUTPUT_JSON` la respuesta es un objeto JSON validado por
+        Gemini contra ANALYSIS_RESPONSE_SCHEMA (sin continuación: un JSON
+        cortado no se puede completar, el caller decide el fallback).
+        Con `output=OUTPUT_EDITS` el código va numerado y el JSON trae
+        `ediciones` por rango de líneas en lugar del código completo.
+
+        maxOutputTokens y thinkingBudget se calculan del tamaño del código con
+        los techos del rol; si la respuesta se corta por MAX_TOKENS se pide una
+        continuación sobre lo ya generado (hasta GEMINI_MAX_CONTINUATIONS).
+
+        Con GEMINI_HEDGING_ENABLED, si no hay respuesta tras el percentil
+        configurado de la latencia reciente se lanza una segunda request
+        idéntica y se usa la primera que responda.
         
         Args:
             code: Código Python a analizar
             model: Modelo de Gemini a usar
+            role: Rol del usuario (techos de tokens); None = anónimo
+            output: OUTPUT_MARKDOWN, OUTPUT_JSON, OUTPUT_EDITS, OUTPUT_FINDINGS u OUTPUT_REWRITE
             
         Returns:
-            Análisis en formato markdown
+            GenerationResult con el análisis (markdown o JSON), finishReason y tokens
             
         Raises:
             GeminiTimeoutError: Si la operación excede el timeout
             GeminiAPIError: Si la API retorna error
         """
+        budget = generation_budget(code, role)
+        delay = hedge_delay(model, "blocking")
+        if delay is None:
+            result = await self._analyze_once(code, model, budget, output=output)
+        else:
+            winner, losers = await _race_hedged(
+                lambda: self._analyze_once(code, model, budget, output=output),
+                delay,
+                model,
+                "blocking",
+            )
+            try:
+                result = winner.result()
+            finally:
+                await _discard_tasks(losers)
+
+        continuations = settings.GEMINI_MAX_CONTINUATIONS if output == OUTPUT_MARKDOWN else 0
+        for _ in range(continuations):
+            if result.finish_reason != "MAX_TOKENS" or result.text in ("", ANALYSIS_EMPTY_MESSAGE):
+                break
+            self._log_continuation(model, result)
+            extra = await self._analyze_once(code, model, budget, previous=result.text)
+            result = GenerationResult(
+                text=result.text + extra.text,
+                model=model,
+                finish_reason=extra.finish_reason,
+                usage=result.usage + extra.usage,
+            )
+        return result
+
+    async def analyze_code_parallel(
+        self,
+        code: str,
+        model: str = DEFAULT_ANALYSIS_MODEL,
+        role: Optional[str] = None,
+    ) -> tuple[GenerationResult, GenerationResult]:
+        """
+        Analiza en dos requests concurrentes: hallazgos y código mejorado.
+
+        El tiempo total es el de la más lenta (normalmente la reescritura) en
+        vez de la suma de secciones; a cambio se envía el código dos veces
+        (2 requests de la cuota RPM y el doble de tokens de entrada).
+        Si una falla se cancela la otra.
+
+        Returns:
+            (hallazgos, reescritura) como JSON de OUTPUT_FINDINGS y OUTPUT_REWRITE
+        """
+        tasks = [
+            asyncio.create_task(self.analyze_code(code, model, role, output=OUTPUT_FINDINGS)),
+            asyncio.create_task(self.analyze_code(code, model, role, output=OUTPUT_REWRITE)),
+        ]
+        try:
+            findings, rewrite = await asyncio.gather(*tasks)
+        except BaseException:
+            await _discard_tasks(tasks)
+            raise
+        return findings, rewrite
+
+    @staticmethod
+    def _log_continuation(model: str, result: GenerationResult) -> None:
+        metrics.inc("gemini_continuations_total", model=model)
+        logger.warning(
+            f"✂️ Respuesta truncada por MAX_TOKENS ({len(result.text)} chars), "
+            f"pidiendo continuación a {model}"
+        )
+
+    async def _analyze_once(
+        self,
+        code: str,
+        model: str,
+        budget: Optional[GenerationBudget] = None,
+        previous: Optional[str] = None,
+        output: str = OUTPUT_MARKDOWN,
+    ) -> GenerationResult:
+        """Un análisis con las instrucciones cacheadas (o inline si no hay caché)."""
+        cached_content = await self._analysis_cache(model, output)
+        try:
+            return await self._generate_analysis(
+                code, model, cached_content, budget, previous, output
+            )
+        except GeminiAPIError as e:
+            if not cached_content or not _is_cache_rejection(e):
+                raise
+            self._invalidate_analysis_cache(model, cached_content, output)
+            return await self._generate_analysis(code, model, None, budget, previous, output)
+
+    async def _generate_analysis(
+        self,
+        code: str,
+        model: str,
+        cached_content: Optional[str],
+        budget: Optional[GenerationBudget],
+        previous: Optional[str],
+        output: str = OUTPUT_MARKDOWN,
+    ) -> GenerationResult:
+        """Una request generateContent de análisis (con reintentos)."""
         url = f"{self._base_url}/models/{model}:generateContent?key={self._api_key}"
+        payload = self._build_analysis_payload(
+            code,
+            cached_content,
+            analysis_generation_config(model, budget, output),
+            previous,
+            output,
+        )
         
-        payload = {
-            "contents": [{"parts": [{"text": ANALYSIS_PROMPT_TEMPLATE.format(code=code)}]}],
-            "generationConfig": ANALYSIS_GENERATION_CONFIG,
-        }
-        
-        client = self._get_client(ANALYSIS_TIMEOUT)
-        should_close = not self._owns_client
+        client, should_close = self._get_client(ANALYSIS_TIMEOUT)
+        started = time.perf_counter()
         
         try:
             logger.info(f"Enviando código a Gemini ({len(code)} chars)")
-            resp = await client.post(url, json=payload, timeout=ANALYSIS_TIMEOUT)
-            resp.raise_for_status()
-            data = resp.json()
+            resp = await self._post_with_retry(
+                client, url, payload, ANALYSIS_TIMEOUT, OPERATION_ANALYZE, model
+            )
+            data = json_codec.loads(resp.content)
             
-            return self._extract_analysis_text(data)
+            metrics.observe(
+                "gemini_analysis_latency_seconds",
+                time.perf_counter() - started,
+                model=model,
+                mode="blocking",
+            )
+            candidates = data.get("candidates") or [{}]
+            result = GenerationResult(
+                text=self._extract_analysis_text(data),
+                model=model,
+                finish_reason=candidates[0].get("finishReason"),
+                usage=TokenUsage.from_metadata(data.get("usageMetadata")),
+            )
+            _record_usage(model, result.usage)
+            return result
             
+        except GeminiError:
+            raise
         except httpx.TimeoutException as e:
             logger.error(f"Timeout al analizar código: {e}")
-            raise GeminiTimeoutError(
-                "⏱️ **Timeout**: El análisis está tomando más tiempo del esperado.\n\n"
-                "**Sugerencias:**\n"
-                "- Intenta de nuevo (a veces Gemini tarda más)\n"
-                "- Divide el código en partes más pequeñas"
-            ) from e
+            raise GeminiTimeoutError(ANALYSIS_TIMEOUT_MESSAGE) from e
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error: {e.response.status_code} - {e.response.text[:200]}")
             raise GeminiAPIError(e.response.status_code, e.response.text[:200]) from e
@@ -254,8 +1447,8 @@ class GeminiClient:
         """Extrae el texto del análisis de la respuesta de Gemini."""
         candidates = data.get("candidates", [])
         if not candidates:
-            logger.warning(f"Sin candidates en respuesta: {data}")
-            return "⚠️ No se pudo generar el análisis"
+            logger.warning(f"Sin candidates en respuesta: {json_codec.preview(data)}")
+            return ANALYSIS_EMPTY_MESSAGE
         
         candidate = candidates[0]
         
@@ -273,8 +1466,386 @@ class GeminiClient:
             logger.info(f"Análisis recibido ({len(analysis)} chars)")
             return analysis
         
-        logger.warning(f"Formato inesperado: {data}")
-        return "⚠️ No se pudo generar el análisis"
+        logger.warning(f"Formato inesperado: {json_codec.preview(data)}")
+        return ANALYSIS_EMPTY_MESSAGE
+
+    @staticmethod
+    def _build_analysis_payload(
+        code: str,
+        cached_content: Optional[str] = None,
+        generation_config: Optional[dict] = None,
+        previous: Optional[str] = None,
+        output: str = OUTPUT_MARKDOWN,
+    ) -> dict:
+        """
+        Arma el payload de generateContent / streamGenerateContent para análisis.
+
+        Con `cached_content` solo se envía el código del usuario; sin él las
+        instrucciones van inline como systemInstruction (mismo prefijo fijo en
+        cada request, aprovechable por el caching implícito de Gemini).
+
+        Con `previous` (respuesta cortada por MAX_TOKENS) se agrega ese texto
+        como turno del modelo y se pide continuar, sin regenerar lo ya escrito.
+        """
+        if output == OUTPUT_EDITS:
+            code = number_lines(code)
+        contents = [
+            {"role": "user", "parts": [{"text": ANALYSIS_USER_TEMPLATE.format(code=code)}]}
+        ]
+        if previous:
+            contents.append({"role": "model", "parts": [{"text": previous}]})
+            contents.append({"role": "user", "parts": [{"text": ANALYSIS_CONTINUATION_PROMPT}]})
+        payload: dict[str, Any] = {
+            "contents": contents,
+            "generationConfig": generation_config or ANALYSIS_GENERATION_CONFIG,
+        }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        else:
+            payload["systemInstruction"] = {"parts": [{"text": ANALYSIS_SYSTEM_INSTRUCTIONS[output]}]}
+        return payload
+
+    async def _analysis_cache(self, model: str, output: str = OUTPUT_MARKDOWN) -> Optional[str]:
+        """
+        Nombre del cachedContent con las instrucciones de análisis para `model`
+        y el formato de salida `output`.
+
+        Lo crea la primera vez y extiende su TTL cuando falta menos de
+        GEMINI_CONTEXT_CACHE_REFRESH_MARGIN para que venza. Si la API no permite
+        crearlo (ej: prompt por debajo del mínimo de tokens del modelo) se usa
+        el prompt inline y no se reintenta hasta GEMINI_CONTEXT_CACHE_RETRY_AFTER.
+
+        Returns:
+            "cachedContents/..." o None para usar instrucciones inline
+        """
+        if not settings.GEMINI_CONTEXT_CACHE_ENABLED:
+            return None
+        # Por debajo del mínimo la API rechaza la creación: ni se intenta
+        if estimate_tokens(ANALYSIS_SYSTEM_INSTRUCTIONS[output]) < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            metrics.inc("gemini_context_cache_total", model=model, result="too_small")
+            return None
+
+        key = (model, key_fingerprint(self._api_key), output)
+        entry = _prompt_caches.get(key)
+        if entry is None:
+            entry = _prompt_caches[key] = _PromptCache()
+
+        margin = settings.GEMINI_CONTEXT_CACHE_REFRESH_MARGIN
+        if time.monotonic() < entry.disabled_until:
+            return None
+        if entry.name and entry.expires_at - time.monotonic() > margin:
+            metrics.inc("gemini_context_cache_total", model=model, result="hit")
+            return entry.name
+
+        # Un solo refresh por caché aunque lleguen varias requests a la vez
+        async with entry.lock:
+            now = time.monotonic()
+            if entry.name and entry.expires_at - now > margin:
+                return entry.name
+            if now < entry.disabled_until:
+                return None
+
+            client, should_close = self._get_client(DEFAULT_TIMEOUT)
+            try:
+                if entry.name and entry.expires_at > now:
+                    try:
+                        await self._extend_analysis_cache(client, entry)
+                        metrics.inc("gemini_context_cache_total", model=model, result="refreshed")
+                        return entry.name
+                    except httpx.HTTPError as e:
+                        logger.warning(f"No se pudo extender el caché {entry.name}: {e}")
+                await self._create_analysis_cache(client, entry, model, output)
+                metrics.inc("gemini_context_cache_total", model=model, result="created")
+                logger.info(f"🗃️ Caché de instrucciones creado para {model}: {entry.name}")
+                return entry.name
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                entry.name = None
+                entry.disabled_until = now + settings.GEMINI_CONTEXT_CACHE_RETRY_AFTER
+                metrics.inc("gemini_context_cache_total", model=model, result="unavailable")
+                detail = e.response.text[:200] if isinstance(e, httpx.HTTPStatusError) else e
+                logger.warning(f"⚠️ Context caching no disponible para {model}, usando prompt inline: {detail}")
+                return None
+            finally:
+                if should_close:
+                    await client.aclose()
+
+    async def _create_analysis_cache(
+        self, client: httpx.AsyncClient, entry: _PromptCache, model: str, output: str
+    ) -> None:
+        """Crea el cachedContent con las instrucciones fijas del análisis."""
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        resp = await client.post(
+            f"{self._base_url}/cachedContents?key={self._api_key}",
+            content=json_codec.dumps({
+                "model": f"models/{model}",
+                "displayName": f"analysis-{output}-{ANALYSIS_PROMPT_HASHES[output]}",
+                "systemInstruction": {"parts": [{"text": ANALYSIS_SYSTEM_INSTRUCTIONS[output]}]},
+                "ttl": _format_ttl(ttl),
+            }),
+            headers=JSON_HEADERS,
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        entry.name = json_codec.loads(resp.content)["name"]
+        entry.expires_at = time.monotonic() + ttl
+
+    async def _extend_analysis_cache(self, client: httpx.AsyncClient, entry: _PromptCache) -> None:
+        """Extiende el TTL de un cachedContent existente."""
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        resp = await client.patch(
+            f"{self._base_url}/{entry.name}?updateMask=ttl&key={self._api_key}",
+            content=json_codec.dumps({"ttl": _format_ttl(ttl)}),
+            headers=JSON_HEADERS,
+            timeout=DEFAULT_TIMEOUT,
+        )
+        resp.raise_for_status()
+        entry.expires_at = time.monotonic() + ttl
+
+    def _invalidate_analysis_cache(
+        self, model: str, name: str, output: str = OUTPUT_MARKDOWN
+    ) -> None:
+        """Descarta un cachedContent rechazado por la API (se recrea en la próxima llamada)."""
+        entry = _prompt_caches.get((model, key_fingerprint(self._api_key), output))
+        if entry and entry.name == name:
+            entry.name = None
+            entry.expires_at = 0.0
+        metrics.inc("gemini_context_cache_total", model=model, result="invalidated")
+        logger.warning(f"Caché {name} rechazado por Gemini, reintentando con prompt inline")
+
+    async def stream_analysis(
+        self,
+        code: str,
+        model: str = DEFAULT_ANALYSIS_MODEL,
+        summary: Optional[GenerationResult] = None,
+        role: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Analiza código Python emitiendo el markdown a medida que se genera.
+
+        Usa `streamGenerateContent?alt=sse`; registra por separado el tiempo
+        hasta el primer fragmento (TTFB) y la latencia total. Con hedging
+        habilitado, si el primer fragmento no llega a tiempo se abre un
+        segundo stream y se continúa con el que emita primero. Igual que
+        `analyze_code`, los límites de tokens dependen del tamaño y del rol, y
+        un corte por MAX_TOKENS continúa en un nuevo stream.
+
+        Args:
+            code: Código Python a analizar
+            model: Modelo de Gemini a usar
+            summary: Se completa con texto, finishReason y tokens del stream (opcional)
+            role: Rol del usuario (techos de tokens); None = anónimo
+
+        Yields:
+            Fragmentos de texto del análisis (markdown)
+
+        Raises:
+            GeminiTimeoutError: Si la operación excede el timeout
+            GeminiAPIError: Si la API retorna error
+        """
+        if summary is None:
+            summary = GenerationResult()
+        summary.model = model
+        budget = generation_budget(code, role)
+
+        async for text in self._stream_first(code, model, summary, budget):
+            yield text
+
+        for _ in range(settings.GEMINI_MAX_CONTINUATIONS):
+            if summary.finish_reason != "MAX_TOKENS" or not summary.text:
+                break
+            self._log_continuation(model, summary)
+            extra = GenerationResult(model=model)
+            async for text in self._stream_once(code, model, extra, budget, previous=summary.text):
+                yield text
+            summary.text += extra.text
+            summary.finish_reason = extra.finish_reason
+            summary.usage = summary.usage + extra.usage
+
+    async def _stream_first(
+        self,
+        code: str,
+        model: str,
+        summary: GenerationResult,
+        budget: GenerationBudget,
+    ) -> AsyncIterator[str]:
+        """Stream inicial del análisis (con hedging del primer fragmento si está habilitado)."""
+        delay = hedge_delay(model, "stream")
+        if delay is None:
+            async for text in self._stream_once(code, model, summary, budget):
+                yield text
+            return
+
+        winner, losers = await _race_hedged(
+            lambda: self._open_stream(code, model, budget), delay, model, "stream"
+        )
+        try:
+            stream, first, own = winner.result()
+        finally:
+            # Protegido: los perdedores se cierran aunque el consumidor se cancele
+            await asyncio.shield(_close_losing_streams(losers))
+
+        try:
+            if first is None:
+                return
+            yield first
+            async for text in stream:
+                yield text
+        finally:
+            await stream.aclose()
+            # Cada stream del hedge acumula en su propio resultado: copiar el ganador
+            summary.text, summary.finish_reason, summary.usage = own.text, own.finish_reason, own.usage
+
+    async def _open_stream(
+        self, code: str, model: str, budget: GenerationBudget
+    ) -> tuple[AsyncIterator[str], Optional[str], GenerationResult]:
+        """Abre un stream de análisis y espera su primer fragmento (None si vino vacío)."""
+        own = GenerationResult(model=model)
+        stream = self._stream_once(code, model, own, budget)
+        try:
+            return stream, await stream.__anext__(), own
+        except StopAsyncIteration:
+            return stream, None, own
+        except BaseException:
+            # Perdedor cancelado (o fallido) antes del primer fragmento
+            await stream.aclose()
+            raise
+
+    async def _stream_once(
+        self,
+        code: str,
+        model: str,
+        summary: GenerationResult,
+        budget: Optional[GenerationBudget] = None,
+        previous: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Un stream de análisis con las instrucciones cacheadas (o inline si no hay caché)."""
+        cached_content = await self._analysis_cache(model)
+        emitted = False
+        try:
+            async for text in self._stream_generate(
+                code, model, cached_content, summary, budget, previous
+            ):
+                emitted = True
+                yield text
+        except GeminiAPIError as e:
+            if emitted or not cached_content or not _is_cache_rejection(e):
+                raise
+            self._invalidate_analysis_cache(model, cached_content)
+            async for text in self._stream_generate(code, model, None, summary, budget, previous):
+                yield text
+
+    async def _stream_generate(
+        self,
+        code: str,
+        model: str,
+        cached_content: Optional[str],
+        summary: GenerationResult,
+        budget: Optional[GenerationBudget],
+        previous: Optional[str],
+    ) -> AsyncIterator[str]:
+        """Un stream streamGenerateContent de análisis (sin reintentos)."""
+        url = f"{self._base_url}/models/{model}:streamGenerateContent?alt=sse&key={self._api_key}"
+        payload = self._build_analysis_payload(
+            code, cached_content, analysis_generation_config(model, budget), previous
+        )
+
+        breaker = get_circuit_breaker(model, self._api_key)
+        permit = self._check_circuit(breaker, model)
+
+        client, should_close = self._get_client(ANALYSIS_TIMEOUT)
+        started = time.perf_counter()
+        first_chunk_at: Optional[float] = None
+        total_chars = 0
+        outcome_recorded = False
+
+        try:
+            logger.info(f"Enviando código a Gemini en streaming ({len(code)} chars)")
+            await self._pace(OPERATION_ANALYZE, model, 1, estimate_payload_tokens(payload))
+            async with self._concurrency_slot(), client.stream(
+                "POST",
+                url,
+                content=json_codec.dumps(payload),
+                headers=JSON_HEADERS,
+                timeout=ANALYSIS_TIMEOUT,
+                extensions=self._trace_extensions(),
+            ) as resp:
+                if resp.is_error:
+                    body = (await resp.aread()).decode("utf-8", errors="replace")
+                    logger.error(f"HTTP error (stream): {resp.status_code} - {body[:200]}")
+                    if resp.status_code in RETRYABLE_STATUS_CODES:
+                        breaker.record_failure(permit)
+                    else:
+                        breaker.record_success(permit)
+                    outcome_recorded = True
+                    raise GeminiAPIError(resp.status_code, body[:200])
+
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json_codec.loads(line[5:])
+                    self._update_summary(summary, data)
+                    text = self._extract_chunk_text(data)
+                    if not text:
+                        continue
+                    summary.text += text
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter() - started
+                        metrics.observe("gemini_analysis_ttfb_seconds", first_chunk_at, model=model)
+                    total_chars += len(text)
+                    yield text
+
+            breaker.record_success(permit)
+            outcome_recorded = True
+            elapsed = time.perf_counter() - started
+            metrics.observe("gemini_analysis_latency_seconds", elapsed, model=model, mode="stream")
+            _record_usage(model, summary.usage)
+            logger.info(
+                f"Análisis (stream) recibido ({total_chars} chars, "
+                f"ttfb={first_chunk_at or 0:.2f}s, total={elapsed:.2f}s)"
+            )
+
+        except GeminiError:
+            raise
+        except httpx.TimeoutException as e:
+            breaker.record_failure(permit)
+            outcome_recorded = True
+            logger.error(f"Timeout al analizar código (stream): {e}")
+            raise GeminiTimeoutError(ANALYSIS_TIMEOUT_MESSAGE) from e
+        except Exception as e:
+            if _is_breaker_failure(e):
+                breaker.record_failure(permit)
+                outcome_recorded = True
+            logger.error(f"Error inesperado (stream): {type(e).__name__}: {e}", exc_info=True)
+            raise GeminiError(f"Error inesperado: {e}") from e
+        finally:
+            if not outcome_recorded:
+                # Consumidor cancelado o error ajeno a Gemini: liberar probe
+                breaker.release(permit)
+            if should_close:
+                await client.aclose()
+
+    @staticmethod
+    def _update_summary(summary: GenerationResult, data: dict) -> None:
+        """Toma finishReason y usageMetadata de un fragmento SSE (el último trae el total)."""
+        if "usageMetadata" in data:
+            summary.usage = TokenUsage.from_metadata(data["usageMetadata"])
+        candidates = data.get("candidates") or [{}]
+        if candidates[0].get("finishReason"):
+            summary.finish_reason = candidates[0]["finishReason"]
+
+    @staticmethod
+    def _extract_chunk_text(data: dict) -> str:
+        """Extrae el texto de un fragmento SSE de streamGenerateContent."""
+        candidates = data.get("candidates", [])
+        if not candidates:
+            return ""
+
+        candidate = candidates[0]
+        if candidate.get("finishReason") == "MAX_TOKENS":
+            logger.warning("Respuesta (stream) truncada por MAX_TOKENS")
+
+        parts = candidate.get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts if not part.get("thought"))
 
     async def create_embedding(
         self,
@@ -302,20 +1873,22 @@ class GeminiClient:
             "content": {"parts": [{"text": text}]},
         }
         
-        client = self._get_client()
-        should_close = not self._owns_client
+        client, should_close = self._get_client()
         
         try:
-            resp = await client.post(url, json=payload, timeout=EMBEDDING_TIMEOUT)
-            resp.raise_for_status()
-            data = resp.json()
+            resp = await self._post_with_retry(
+                client, url, payload, EMBEDDING_TIMEOUT, OPERATION_EMBED, model
+            )
+            data = json_codec.loads(resp.content)
             
             # Extracción correcta: embedding.values
             embedding = data.get("embedding", {}).get("values", [])
             if not embedding:
-                logger.warning(f"No se recibió embedding: {data}")
+                logger.warning(f"No se recibió embedding: {json_codec.preview(data)}")
             return embedding
             
+        except GeminiError:
+            raise
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error embedding: {e.response.status_code}")
             raise GeminiAPIError(e.response.status_code, e.response.text[:200]) from e
@@ -330,27 +1903,188 @@ class GeminiClient:
         self,
         texts: list[str],
         model: str = DEFAULT_EMBEDDING_MODEL,
-    ) -> dict[str, list[float]]:
+    ) -> list[EmbeddingResult]:
         """
-        Genera embeddings para múltiples textos concurrentemente.
+        Genera embeddings para múltiples textos usando `batchEmbedContents`.
+
+        Los textos se agrupan en chunks limitados por cantidad de items y
+        bytes de payload, de modo que el caso típico es 1-2 round trips.
         
         Args:
             texts: Lista de textos
             model: Modelo de embeddings
             
         Returns:
-            Dict {texto: embedding}
+            Un EmbeddingResult por texto, en el mismo orden de entrada.
+            Los items fallidos tienen `error` con el motivo y `values` vacío.
         """
-        tasks = [self.create_embedding(text, model=model) for text in texts]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results: list[Optional[EmbeddingResult]] = [None] * len(texts)
         
-        embeddings: dict[str, list[float]] = {}
-        for text, result in zip(texts, results):
-            if isinstance(result, Exception):
-                logger.error(f"Error embedding para texto: {type(result).__name__}")
-                embeddings[text] = []
+        # Textos vacíos: error local, no se envían a la API
+        pending: list[int] = []
+        for index, text in enumerate(texts):
+            if text and text.strip():
+                pending.append(index)
             else:
-                embeddings[text] = result
+                results[index] = EmbeddingResult(index=index, text=text, error="Texto vacío")
+
+        chunks = _chunk_for_batch(texts, pending)
+        if chunks:
+            url = f"{self._base_url}/models/{model}:batchEmbedContents?key={self._api_key}"
+            client, should_close = self._get_client()
+            semaphore = asyncio.Semaphore(BATCH_EMBED_CONCURRENCY)
+
+            async def _run(chunk: list[int]) -> None:
+                async with semaphore:
+                    for result in await self._embed_chunk(client, url, model, texts, chunk):
+                        results[result.index] = result
+
+            try:
+                logger.info(f"Embeddings batch: {len(pending)} textos en {len(chunks)} requests")
+                await asyncio.gather(*(_run(chunk) for chunk in chunks))
+            finally:
+                if should_close:
+                    await client.aclose()
         
-        return embeddings
+        failed = sum(1 for r in results if r is not None and not r.ok)
+        if failed:
+            logger.warning(f"Embeddings batch: {failed}/{len(texts)} textos fallidos")
+        return [r for r in results if r is not None]
+
+    async def _embed_chunk(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        model: str,
+        texts: list[str],
+        chunk: list[int],
+    ) -> list[EmbeddingResult]:
+        """Envía un chunk a batchEmbedContents y mapea la respuesta a los índices originales."""
+        payload = {
+            "requests": [
+                {"model": f"models/{model}", "content": {"parts": [{"text": texts[i]}]}}
+                for i in chunk
+            ],
+        }
+
+        try:
+            resp = await self._post_with_retry(
+                client, url, payload, EMBEDDING_TIMEOUT, OPERATION_EMBED, model,
+                requests=len(chunk),
+            )
+            embeddings = json_codec.loads(resp.content).get("embeddings", [])
+        except GeminiUnavailableError as e:
+            return [EmbeddingResult(index=i, text=texts[i], error=str(e)) for i in chunk]
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error embeddings batch: {e.response.status_code}")
+            error = f"HTTP {e.response.status_code}: {e.response.text[:200]}"
+            return [EmbeddingResult(index=i, text=texts[i], error=error) for i in chunk]
+        except httpx.TimeoutException:
+            logger.error(f"Timeout en embeddings batch ({len(chunk)} textos)")
+            return [EmbeddingResult(index=i, text=texts[i], error="Timeout") for i in chunk]
+        except Exception as e:
+            logger.error(f"Error embeddings batch: {type(e).__name__}: {e}")
+            error = f"Error al generar embedding: {type(e).__name__}"
+            return [EmbeddingResult(index=i, text=texts[i], error=error) for i in chunk]
+
+        results: list[EmbeddingResult] = []
+        for position, index in enumerate(chunk):
+            values = embeddings[position].get("values", []) if position < len(embeddings) else []
+            if values:
+                results.append(EmbeddingResult(index=index, text=texts[index], values=values))
+            else:
+                results.append(
+                    EmbeddingResult(index=index, text=texts[index], error="Respuesta sin embedding")
+                )
+        return results
+
+
+# ----------------- REGISTRY -----------------
+
+
+class GeminiClientRegistry:
+    """
+    Registro LRU acotado de GeminiClient por API key.
+
+    - El cliente de la key del sistema se crea una vez y nunca se descarta.
+    - Los clientes de keys de usuario se indexan por hash de la key (nunca la
+      key en claro) y comparten el pool HTTP del proceso, así los usuarios con
+      key propia también reutilizan conexiones calientes.
+    - Cada key conserva su propio límite de concurrencia, breaker y cuota.
+    - Se descartan entradas sin uso por más de `idle_ttl` o al superar `max_size`
+      (menos usadas primero), liberando también el estado asociado a la key.
+
+    Uso:
+        registry = GeminiClientRegistry(http_client=app.state.gemini_http)
+        client = registry.get(user_api_key)  # None -> key del sistema
+    """
+
+    __slots__ = ("_http_client", "_base_url", "_max_size", "_idle_ttl", "_system", "_entries")
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        base_url: str = GEMINI_API_BASE_URL,
+        max_size: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+    ) -> None:
+        self._http_client = http_client
+        self._base_url = base_url
+        self._max_size = max_size or settings.GEMINI_CLIENT_REGISTRY_SIZE
+        self._idle_ttl = idle_ttl or settings.GEMINI_CLIENT_IDLE_TTL
+        self._system: Optional[GeminiClient] = None
+        # fingerprint -> (cliente, último uso)
+        self._entries: OrderedDict[str, tuple[GeminiClient, float]] = OrderedDict()
+
+    @property
+    def system_client(self) -> GeminiClient:
+        """Cliente con la API key del sistema."""
+        if self._system is None:
+            self._system = GeminiClient(base_url=self._base_url, http_client=self._http_client)
+        return self._system
+
+    def get(self, api_key: Optional[str] = None) -> GeminiClient:
+        """
+        Obtiene el cliente para una API key (creándolo si no existe).
+
+        Args:
+            api_key: API key del usuario, o None para la key del sistema
+        """
+        if not api_key or api_key == settings.GEMINI_API_KEY:
+            return self.system_client
+
+        now = time.monotonic()
+        fingerprint = key_fingerprint(api_key)
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            metrics.inc("gemini_client_registry_total", result="hit")
+            self._entries[fingerprint] = (entry[0], now)
+            self._entries.move_to_end(fingerprint)
+            client = entry[0]
+        else:
+            metrics.inc("gemini_client_registry_total", result="miss")
+            client = GeminiClient(
+                api_key=api_key,
+                base_url=self._base_url,
+                http_client=self._http_client,
+            )
+            self._entries[fingerprint] = (client, now)
+
+        self._evict(now)
+        return client
+
+    def _evict(self, now: float) -> None:
+        """Descarta entradas ociosas y las menos usadas si se supera max_size."""
+        while self._entries:
+            fingerprint, (_, last_used) = next(iter(self._entries.items()))
+            idle = now - last_used > self._idle_ttl
+            if not idle and len(self._entries) <= self._max_size:
+                break
+            del self._entries[fingerprint]
+            _forget_key_state(fingerprint)
+            metrics.inc("gemini_client_registry_evictions_total", reason="idle" if idle else "size")
+        metrics.set_gauge("gemini_client_registry_size", len(self._entries))
 
+    def snapshot(self) -> dict[str, Any]:
+        """Estado serializable para health checks."""
+        return {"size": len(self._entries), "max_size": self._max_size, "idle_ttl": self._idle_ttl}
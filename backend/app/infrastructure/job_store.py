@@ -0,0 +1,233 @@
+# backend/app/infrastructure/job_store.py
+"""
+Estado de los análisis asíncronos (jobs), compartido entre la API y los workers.
+
+Características:
+- Un registro JSON por job en Redis (`{namespace}:job:{id}`) con TTL
+- Cada cambio de estado se publica en `{namespace}:job:{id}:events`
+- Las actualizaciones son atómicas (WATCH/MULTI): dos escritores concurrentes
+  no se pisan los cambios
+- Los suscriptores leen el estado después de suscribirse: no se pierde una
+  transición publicada entre ambos pasos
+- Requiere Redis: sin él el modo asíncrono no está disponible
+"""
+
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+from redis.exceptions import RedisError, WatchError
+
+from app.core import json_codec
+from app.core.config import settings
+from app.infrastructure.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- CONSTANTS -----------------
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+TERMINAL_STATUSES = frozenset({JOB_SUCCEEDED, JOB_FAILED})
+
+# Relectura del estado aunque no llegue un mensaje (pub/sub no garantiza entrega)
+_WATCH_POLL_SECONDS = 5.0
+
+
+# ----------------- ERRORS -----------------
+
+
+class JobStoreError(Exception):
+    """Redis no disponible para guardar o leer el estado de un job."""
+    pass
+
+
+# ----------------- JOBS -----------------
+
+
+@dataclass(slots=True)
+class Job:
+    """Estado de un análisis asíncrono."""
+
+    id: str
+    status: str
+    user_id: int | None
+    created_at: str  # ISO 8601 (UTC)
+    updated_at: str
+    result: dict[str, Any] | None = None  # mismo payload que POST /api/analysis/
+    error: str | None = None
+    status_code: int | None = None  # status HTTP que habría devuelto el análisis síncrono
+    retry_after: int | None = None
+
+    @property
+    def finished(self) -> bool:
+        """True si el job terminó (con o sin éxito)."""
+        return self.status in TERMINAL_STATUSES
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+class JobStore:
+    """
+    Registro de jobs en Redis.
+
+    Uso:
+        store = JobStore()
+        job = await store.create(user_id)
+        await store.update(job.id, JOB_RUNNING)
+        async for job in store.watch(job.id, timeout=600): ...
+    """
+
+    def __init__(self, namespace: str = "analysis", ttl: int | None = None) -> None:
+        """
+        Args:
+            namespace: Prefijo de las claves en Redis
+            ttl: Retención del job y su resultado (default: ANALYSIS_JOB_TTL)
+        """
+        self.namespace = namespace
+        self._ttl = ttl or settings.ANALYSIS_JOB_TTL
+
+    def _redis(self) -> Any:
+        redis = get_redis()
+        if redis is None:
+            raise JobStoreError("Redis deshabilitado: el modo asíncrono no está disponible")
+        return redis
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.namespace}:job:{job_id}"
+
+    def _channel(self, job_id: str) -> str:
+        return f"{self.namespace}:job:{job_id}:events"
+
+    async def create(self, user_id: int | None) -> Job:
+        """
+        Registra un job nuevo en estado `queued`.
+
+        Raises:
+            JobStoreError: Si Redis no está disponible
+        """
+        now = _now()
+        job = Job(id=uuid.uuid4().hex, status=JOB_QUEUED, user_id=user_id, created_at=now, updated_at=now)
+        await self._save(job)
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        """
+        Estado actual de un job.
+
+        Returns:
+            Job o None si no existe o ya venció su TTL
+
+        Raises:
+            JobStoreError: Si Redis no está disponible
+        """
+        try:
+            data = await self._redis().get(self._key(job_id))
+        except RedisError as e:
+            raise JobStoreError(f"No se pudo leer el job {job_id}: {e}") from e
+        return Job(**json_codec.loads(data)) if data is not None else None
+
+    async def update(
+        self,
+        job_id: str,
+        status: str,
+        *,
+        result: dict[str, Any] | None = None,
+        error: str | None = None,
+        status_code: int | None = None,
+        retry_after: int | None = None,
+    ) -> Job | None:
+        """
+        Cambia el estado de un job y lo publica a los suscriptores.
+
+        Returns:
+            Job actualizado o None si ya no existe
+
+        Raises:
+            JobStoreError: Si Redis no está disponible
+        """
+        key = self._key(job_id)
+        try:
+            async with self._redis().pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        await pipe.watch(key)
+                        data = await pipe.get(key)
+                        if data is None:
+                            return None
+                        job = Job(**json_codec.loads(data))
+                        job.status = status
+                        job.updated_at = _now()
+                        job.result = result
+                        job.error = error
+                        job.status_code = status_code
+                        job.retry_after = retry_after
+                        pipe.multi()
+                        pipe.set(key, json_codec.dumps(asdict(job)), ex=self._ttl)
+                        pipe.publish(self._channel(job_id), job.status)
+                        await pipe.execute()
+                        return job
+                    except WatchError:
+                        # Otro escritor cambió el job entre la lectura y la escritura
+                        continue
+        except RedisError as e:
+            raise JobStoreError(f"No se pudo actualizar el job {job_id}: {e}") from e
+
+    async def _save(self, job: Job) -> None:
+        redis = self._redis()
+        try:
+            await redis.set(self._key(job.id), json_codec.dumps(asdict(job)), ex=self._ttl)
+            await redis.publish(self._channel(job.id), job.status)
+        except RedisError as e:
+            raise JobStoreError(f"No se pudo guardar el job {job.id}: {e}") from e
+
+    async def watch(self, job_id: str, timeout: float) -> AsyncIterator[Job]:
+        """
+        Emite el estado del job en cada cambio hasta que termina.
+
+        Termina sin emitir nada más si el job no existe (o vence) o si pasan
+        `timeout` segundos.
+
+        Raises:
+            JobStoreError: Si Redis no está disponible
+        """
+        redis = self._redis()
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(self._channel(job_id))
+            deadline = time.monotonic() + timeout
+            last_status: str | None = None
+            while True:
+                job = await self.get(job_id)
+                if job is None:
+                    return
+                if job.status != last_status:
+                    last_status = job.status
+                    yield job
+                if job.finished:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(remaining, _WATCH_POLL_SECONDS),
+                )
+        except RedisError as e:
+            raise JobStoreError(f"Suscripción al job {job_id} interrumpida: {e}") from e
+        finally:
+            with suppress(RedisError):
+                await pubsub.reset()
@@ -0,0 +1,53 @@
+# backend/app/infrastructure/redis_client.py
+"""
+Cliente Redis asíncrono compartido por proceso.
+
+Características:
+- Una sola conexión (pool) por proceso, creada a demanda desde settings.REDIS_URL
+- Timeouts cortos: Redis coordina, no debe frenar un análisis si está caído
+- Desactivable con REDIS_ENABLED (los llamadores caen a coordinación local)
+"""
+
+import logging
+
+import redis.asyncio as redis_asyncio
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- CLIENT -----------------
+
+
+_redis: redis_asyncio.Redis | None = None
+
+
+def get_redis() -> redis_asyncio.Redis | None:
+    """
+    Cliente Redis del proceso (lo crea la primera vez).
+
+    Returns:
+        Cliente o None si REDIS_ENABLED es False
+    """
+    global _redis
+    if not settings.REDIS_ENABLED:
+        return None
+    if _redis is None:
+        _redis = redis_asyncio.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+    return _redis
+
+
+async def close_redis() -> None:
+    """Cierra el pool de conexiones (shutdown de la app)."""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+        logger.info("🔌 Conexión a Redis cerrada")
@@ -0,0 +1,588 @@
+# backend/app/infrastructure/resilience.py
+"""
+Primitivas de resiliencia para llamadas a servicios externos.
+
+Proporciona:
+- RetryPolicy: reintentos con backoff exponencial "decorrelated jitter"
+- Parseo del header Retry-After (segundos o fecha HTTP)
+- CircuitBreaker: fail-fast cuando la tasa de errores supera un umbral
+- FifoLimiter: límite de concurrencia con cola FIFO y timeout de espera
+- RatePacer: ritmo de envío por cuotas por minuto (requests y tokens)
+- HedgeBudget: acota las requests duplicadas (hedging) a un % del tráfico
+
+Los componentes con tiempo aceptan `clock` (y `sleep`) inyectables para tests.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Any
+
+
+Clock = Callable[[], float]
+Sleep = Callable[[float], Awaitable[None]]
+
+
+# ----------------- EXCEPTIONS -----------------
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la llamada se rechaza sin contactar al servicio."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuito '{name}' abierto (reintentar en {retry_after:.0f}s)")
+
+
+class RateWaitExceededError(Exception):
+    """La espera necesaria para respetar la cuota supera el máximo permitido."""
+
+    def __init__(self, name: str, wait: float):
+        self.name = name
+        self.wait = wait
+        super().__init__(f"Cuota de '{name}' agotada (disponible en {wait:.0f}s)")
+
+
+class LimiterTimeoutError(Exception):
+    """Se agotó el tiempo de espera en la cola del limitador de concurrencia."""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        super().__init__(f"Timeout de {timeout:.0f}s esperando turno en '{name}'")
+
+
+# ----------------- RETRY -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """
+    Política de reintentos para una operación.
+
+    Attributes:
+        max_attempts: Intentos totales (1 = sin reintentos)
+        base_delay: Espera mínima entre intentos (segundos)
+        max_delay: Espera máxima calculada por backoff (segundos)
+        max_elapsed: Presupuesto total de la operación, incluyendo intentos y esperas
+        retry_on_read_timeout: Reintentar si la respuesta excede el timeout de lectura
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    max_elapsed: float = 60.0
+    retry_on_read_timeout: bool = False
+
+    def next_delay(self, previous: float, retry_after: float | None = None) -> float:
+        """
+        Calcula la próxima espera con "decorrelated jitter".
+
+        sleep = min(max_delay, uniform(base_delay, previous * 3)). Si el servidor
+        envió Retry-After, se respeta como mínimo (aunque supere max_delay).
+        """
+        upper = max(self.base_delay, previous * 3)
+        delay = min(self.max_delay, random.uniform(self.base_delay, upper))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def allows(self, attempt: int, elapsed: float, delay: float) -> bool:
+        """Indica si se puede hacer otro intento tras `attempt` intentos y `elapsed` segundos."""
+        return attempt < self.max_attempts and elapsed + delay <= self.max_elapsed
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parsea el header Retry-After.
+
+    Args:
+        value: Segundos ("30") o fecha HTTP ("Wed, 21 Oct 2015 07:28:00 GMT")
+
+    Returns:
+        Segundos a esperar (>= 0) o None si el header falta o es inválido
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max(0.0, (retry_at - datetime.now(UTC)).total_seconds())
+
+
+# ----------------- CIRCUIT BREAKER -----------------
+
+
+class CircuitState(str, Enum):
+    """Estados del circuit breaker."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True, slots=True)
+class CircuitPermit:
+    """
+    Autorización de una llamada: con qué estado del breaker fue admitida.
+
+    El resultado de la llamada solo cuenta si el breaker no cambió de estado
+    desde entonces (misma `epoch`): una llamada admitida en CLOSED que termina
+    durante HALF_OPEN no cuenta como probe.
+    """
+
+    probe: bool
+    epoch: int
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por tasa de errores en ventana deslizante de tiempo.
+
+    - CLOSED: las llamadas pasan; se registran éxitos y fallos.
+    - OPEN: si en la ventana hay >= min_calls y la tasa de fallos >= umbral,
+      las llamadas fallan de inmediato durante `open_seconds`.
+    - HALF_OPEN: se permiten hasta `half_open_max_probes` llamadas de prueba
+      simultáneas; si todas las necesarias tienen éxito se cierra, un fallo lo reabre.
+
+    Cada llamada registra su resultado con el permiso que recibió: los
+    resultados de llamadas admitidas en un estado anterior se ignoran.
+
+    Uso (no thread-safe, pensado para un único event loop):
+        permit = breaker.before_call()  # lanza CircuitOpenError si está abierto
+        try:
+            ...
+        except Exception:
+            breaker.record_failure(permit)
+        else:
+            breaker.record_success(permit)
+    """
+
+    __slots__ = (
+        "name",
+        "failure_rate_threshold",
+        "min_calls",
+        "window_seconds",
+        "open_seconds",
+        "half_open_max_probes",
+        "_clock",
+        "_state",
+        "_epoch",
+        "_outcomes",
+        "_opened_at",
+        "_probes_inflight",
+        "_probe_successes",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_max_probes: int = 1,
+        clock: Clock = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_probes = half_open_max_probes
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._epoch = 0  # cambia en cada transición de estado
+        self._outcomes: deque[tuple[float, bool]] = deque()  # (timestamp, failed)
+        self._opened_at = 0.0
+        self._probes_inflight = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """Estado actual (pasa a HALF_OPEN si venció el tiempo de apertura)."""
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.open_seconds
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._epoch += 1
+            self._probes_inflight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def before_call(self) -> CircuitPermit:
+        """
+        Autoriza una llamada.
+
+        Returns:
+            Permiso con el que registrar el resultado de la llamada
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o no quedan probes disponibles
+        """
+        state = self.state
+        if state == CircuitState.OPEN:
+            raise CircuitOpenError(self.name, self._retry_after())
+        if state == CircuitState.HALF_OPEN:
+            if self._probes_inflight >= self.half_open_max_probes:
+                raise CircuitOpenError(self.name, 1.0)
+            self._probes_inflight += 1
+            return CircuitPermit(probe=True, epoch=self._epoch)
+        return CircuitPermit(probe=False, epoch=self._epoch)
+
+    def _current(self, permit: CircuitPermit) -> bool:
+        """True si el breaker sigue en el estado en que admitió la llamada."""
+        return permit.epoch == self._epoch
+
+    def record_success(self, permit: CircuitPermit) -> None:
+        """Registra una llamada exitosa."""
+        if not self._current(permit):
+            return
+        if permit.probe:
+            self._probes_inflight = max(0, self._probes_inflight - 1)
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_max_probes:
+                self._state = CircuitState.CLOSED
+                self._epoch += 1
+                self._outcomes.clear()
+            return
+        self._record(failed=False)
+
+    def record_failure(self, permit: CircuitPermit) -> None:
+        """Registra una llamada fallida (error de servidor, timeout, etc.)."""
+        if not self._current(permit):
+            return
+        if permit.probe:
+            self._open()
+            return
+        self._record(failed=True)
+        if self._should_open():
+            self._open()
+
+    def release(self, permit: CircuitPermit) -> None:
+        """Libera una llamada sin resultado (ej: cancelada por el cliente)."""
+        if permit.probe and self._current(permit):
+            self._probes_inflight = max(0, self._probes_inflight - 1)
+
+    def _record(self, failed: bool) -> None:
+        now = self._clock()
+        self._outcomes.append((now, failed))
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, failed in self._outcomes if failed) / len(self._outcomes)
+
+    def _should_open(self) -> bool:
+        return (
+            len(self._outcomes) >= self.min_calls
+            and self._failure_rate() >= self.failure_rate_threshold
+        )
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._epoch += 1
+        self._opened_at = self._clock()
+        self._probes_inflight = 0
+        self._probe_successes = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        """Estado serializable para health checks."""
+        self._prune(self._clock())
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state.value,
+            "calls_in_window": len(self._outcomes),
+            "failure_rate": round(self._failure_rate(), 3),
+            "retry_after": round(self._retry_after(), 1) if state == CircuitState.OPEN else 0.0,
+        }
+
+
+# ----------------- CONCURRENCY LIMITER -----------------
+
+
+class FifoLimiter:
+    """
+    Limitador de concurrencia asíncrono con orden FIFO estricto.
+
+    A diferencia de asyncio.Semaphore, al liberar un slot se transfiere
+    directamente al primer waiter de la cola (nadie "se cuela").
+
+    Uso:
+        waited = await limiter.acquire(timeout=30)
+        try:
+            ...
+        finally:
+            limiter.release()
+    """
+
+    __slots__ = ("name", "limit", "_inflight", "_waiters")
+
+    def __init__(self, name: str, limit: int) -> None:
+        if limit < 1:
+            raise ValueError("El límite de concurrencia debe ser >= 1")
+        self.name = name
+        self.limit = limit
+        self._inflight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def inflight(self) -> int:
+        """Slots ocupados actualmente."""
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        """Cantidad de waiters en cola."""
+        return sum(1 for fut in self._waiters if not fut.done())
+
+    async def acquire(self, timeout: float | None = None) -> float:
+        """
+        Espera un slot libre respetando el orden de llegada.
+
+        Args:
+            timeout: Máximo de segundos en cola (None = sin límite)
+
+        Returns:
+            Segundos esperados en cola
+
+        Raises:
+            LimiterTimeoutError: Si se agota el timeout antes de obtener slot
+        """
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            return 0.0
+
+        started = time.monotonic()
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # El slot llegó a asignarse justo antes del timeout: devolverlo
+                self.release()
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove(fut)
+            if isinstance(e, asyncio.TimeoutError):
+                raise LimiterTimeoutError(self.name, timeout or 0.0) from e
+            raise
+        return time.monotonic() - started
+
+    def release(self) -> None:
+        """Libera un slot (o lo transfiere al siguiente waiter de la cola)."""
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # El slot pasa al waiter: inflight no cambia
+                return
+        self._inflight = max(0, self._inflight - 1)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Estado serializable para health checks."""
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "inflight": self._inflight,
+            "queued": self.queued,
+        }
+
+
+# ----------------- RATE PACING -----------------
+
+
+class TokenBucket:
+    """
+    Token bucket clásico: capacidad `capacity` que se repone a `refill_per_second`.
+
+    Para cuotas por minuto: capacity = límite/min, refill = límite / 60.
+    """
+
+    __slots__ = ("capacity", "refill_per_second", "_clock", "_tokens", "_updated_at")
+
+    def __init__(self, capacity: float, refill_per_second: float, clock: Clock = time.monotonic) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    @classmethod
+    def per_minute(
+        cls, limit: float, burst_seconds: float = 60.0, clock: Clock = time.monotonic
+    ) -> "TokenBucket":
+        """
+        Bucket para una cuota de `limit` unidades por minuto.
+
+        `burst_seconds` acota la ráfaga inicial: capacity = limit * burst_seconds / 60.
+        Con ráfagas chicas, cualquier ventana de 60s recibe como máximo
+        limit * (1 + burst_seconds / 60) unidades.
+        """
+        capacity = max(1.0, limit * burst_seconds / 60.0)
+        return cls(capacity=capacity, refill_per_second=limit / 60.0, clock=clock)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` unidades disponibles (0 si ya las hay)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        """Descuenta unidades (llamar solo tras wait_time(amount) == 0)."""
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+    @property
+    def available(self) -> float:
+        """Unidades disponibles ahora."""
+        self._refill()
+        return self._tokens
+
+
+class RatePacer:
+    """
+    Ritmo de envío que respeta a la vez una cuota de requests/min (RPM)
+    y de tokens/min (TPM). Un límite <= 0 desactiva ese bucket.
+
+    Las llamadas esperan en orden de llegada (asyncio.Lock es FIFO) hasta que
+    ambos buckets alcanzan; así la carga se reparte en el minuto en lugar de
+    agotar la cuota en ráfagas y recibir 429.
+    """
+
+    __slots__ = ("name", "_requests", "_tokens", "_lock", "_clock", "_sleep")
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float,
+        tpm: float,
+        burst_seconds: float = 60.0,
+        clock: Clock = time.monotonic,
+        sleep: Sleep = asyncio.sleep,
+    ) -> None:
+        self.name = name
+        self._requests = TokenBucket.per_minute(rpm, burst_seconds, clock) if rpm > 0 else None
+        self._tokens = TokenBucket.per_minute(tpm, burst_seconds, clock) if tpm > 0 else None
+        self._lock = asyncio.Lock()
+        self._clock = clock
+        self._sleep = sleep
+
+    def _wait_time(self, requests: int, tokens: int) -> float:
+        wait = 0.0
+        if self._requests:
+            wait = max(wait, self._requests.wait_time(requests))
+        if self._tokens and tokens:
+            wait = max(wait, self._tokens.wait_time(tokens))
+        return wait
+
+    async def acquire(self, requests: int = 1, tokens: int = 0, max_wait: float = 60.0) -> float:
+        """
+        Espera hasta que la cuota permita enviar y la consume.
+
+        Args:
+            requests: Requests que consume la llamada
+            tokens: Tokens de entrada estimados
+            max_wait: Espera máxima aceptable (segundos)
+
+        Returns:
+            Segundos esperados
+
+        Raises:
+            RateWaitExceededError: Si la espera necesaria supera max_wait
+        """
+        started = self._clock()
+        async with self._lock:
+            while True:
+                wait = self._wait_time(requests, tokens)
+                if wait <= 0:
+                    break
+                if self._clock() - started + wait > max_wait:
+                    raise RateWaitExceededError(self.name, wait)
+                await self._sleep(wait)
+
+            if self._requests:
+                self._requests.consume(requests)
+            if self._tokens and tokens:
+                self._tokens.consume(tokens)
+        return self._clock() - started
+
+    def snapshot(self) -> dict[str, Any]:
+        """Estado serializable para health checks."""
+        return {
+            "name": self.name,
+            "requests_available": round(self._requests.available, 1) if self._requests else None,
+            "tokens_available": round(self._tokens.available) if self._tokens else None,
+        }
+
+
+# ----------------- HEDGING -----------------
+
+
+class HedgeBudget:
+    """
+    Presupuesto de requests "hedged" (duplicadas para recortar la cola de latencia).
+
+    Cada request original deposita `percent / 100` créditos y cada hedge gasta
+    uno, así los hedges nunca superan `percent`% del tráfico a largo plazo.
+    El saldo se acota a `max_balance` para no acumular ráfagas tras horas sin hedges.
+    """
+
+    __slots__ = ("ratio", "max_balance", "_balance")
+
+    def __init__(self, percent: float, max_balance: float = 10.0) -> None:
+        self.ratio = max(0.0, percent) / 100.0
+        self.max_balance = max_balance
+        self._balance = 0.0
+
+    def deposit(self) -> None:
+        """Registra una request original."""
+        self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Consume un crédito si hay saldo; False si el hedge no entra en el presupuesto."""
+        # Tolerancia de redondeo: 10 depósitos de 0.1 suman 0.999...
+        if self._balance < 1.0 - 1e-9:
+            return False
+        self._balance -= 1.0
+        return True
+
+    @property
+    def balance(self) -> float:
+        return self._balance
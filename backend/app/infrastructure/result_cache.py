@@ -0,0 +1,201 @@
+# backend/app/infrastructure/result_cache.py
+"""
+Caché de resultados direccionada por contenido, en dos niveles.
+
+Características:
+- Nivel 1: LRU en memoria del proceso, acotada en bytes (valores serializados)
+- Nivel 2: Redis con TTL, compartido entre workers (un hit de Redis llena el nivel 1)
+- Sin Redis, o con Redis caído, funciona solo con el nivel en memoria
+- Métricas: lookups por resultado, hit ratio, bytes y entradas en memoria
+
+La protección contra estampidas no es de esta clase: los llamadores combinan
+la caché con SingleFlight (un solo cálculo por clave mientras está en curso).
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from app.core import json_codec
+from app.core.metrics import metrics
+from app.infrastructure.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- CONSTANTS -----------------
+
+
+TIER_MEMORY = "memory"
+TIER_REDIS = "redis"
+
+
+# ----------------- RESULTS -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class CacheHit:
+    """Resultado de `ResultCache.get`."""
+
+    value: dict[str, Any]
+    tier: str  # TIER_MEMORY o TIER_REDIS
+
+
+# ----------------- RESULT CACHE -----------------
+
+
+class ResultCache:
+    """
+    Caché clave → dict (serializable a JSON) con LRU local y Redis.
+
+    Uso:
+        cache = ResultCache("analysis", max_bytes=64 * 1024 * 1024, ttl=86400)
+        hit = await cache.get(clave)
+        await cache.set(clave, valor)
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_bytes: int,
+        ttl: float,
+        redis_retry_after: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            namespace: Prefijo de las claves en Redis y etiqueta de las métricas
+            max_bytes: Tamaño máximo del nivel en memoria (valores serializados)
+            ttl: Vida de una entrada en ambos niveles
+            redis_retry_after: Pausa antes de volver a usar Redis tras un error
+        """
+        self.namespace = namespace
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._redis_retry_after = redis_retry_after
+        self._redis_disabled_until = 0.0
+        # clave → (valor serializado, vencimiento monotónico)
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._lookups = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Bytes ocupados por el nivel en memoria."""
+        return self._bytes
+
+    async def get(self, key: str) -> CacheHit | None:
+        """Busca la clave en memoria y después en Redis."""
+        value = self._get_local(key)
+        if value is not None:
+            return self._record(CacheHit(value, TIER_MEMORY))
+
+        redis = self._redis()
+        if redis is not None:
+            try:
+                stored = await redis.get(self._redis_key(key))
+            except RedisError as e:
+                self._disable_redis(e)
+            else:
+                if stored is not None:
+                    self._set_local(key, stored)
+                    return self._record(CacheHit(json_codec.loads(stored), TIER_REDIS))
+        return self._record(None)
+
+    async def set(self, key: str, value: dict[str, Any]) -> None:
+        """Guarda el valor en ambos niveles."""
+        payload = json_codec.dumps(value)
+        self._set_local(key, payload)
+
+        redis = self._redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(self._redis_key(key), payload, px=int(self._ttl * 1000))
+        except RedisError as e:
+            self._disable_redis(e)
+            return
+        metrics.inc(
+            "result_cache_bytes_written_total", len(payload), namespace=self.namespace, tier=TIER_REDIS
+        )
+
+    def clear(self) -> None:
+        """Vacía el nivel en memoria (Redis vence por TTL)."""
+        self._entries.clear()
+        self._bytes = 0
+        self._hits = 0
+        self._lookups = 0
+        self._update_gauges()
+
+    # --- Nivel en memoria ---
+
+    def _get_local(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._evict(key)
+            self._update_gauges()
+            return None
+        self._entries.move_to_end(key)
+        return json_codec.loads(payload)
+
+    def _set_local(self, key: str, payload: bytes) -> None:
+        if len(payload) > self._max_bytes:
+            # Más grande que toda la caché: no desalojar todo por una entrada
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (payload, time.monotonic() + self._ttl)
+        self._bytes += len(payload)
+        while self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+            metrics.inc("result_cache_evictions_total", namespace=self.namespace)
+        self._update_gauges()
+
+    def _evict(self, key: str) -> None:
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    # --- Redis ---
+
+    def _redis(self) -> Any:
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        return get_redis()
+
+    def _disable_redis(self, error: Exception) -> None:
+        self._redis_disabled_until = time.monotonic() + self._redis_retry_after
+        metrics.inc("result_cache_redis_errors_total", namespace=self.namespace)
+        logger.warning(
+            f"⚠️ Redis no disponible para la caché de resultados ({type(error).__name__}: {error}); "
+            f"solo caché en memoria por {self._redis_retry_after:.0f}s"
+        )
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:rc:{key}"
+
+    # --- Métricas ---
+
+    def _record(self, hit: CacheHit | None) -> CacheHit | None:
+        self._lookups += 1
+        if hit is not None:
+            self._hits += 1
+        metrics.inc(
+            "result_cache_lookups_total",
+            namespace=self.namespace,
+            result=hit.tier if hit is not None else "miss",
+        )
+        metrics.set_gauge("result_cache_hit_ratio", self._hits / self._lookups, namespace=self.namespace)
+        return hit
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("result_cache_bytes", self._bytes, namespace=self.namespace, tier=TIER_MEMORY)
+        metrics.set_gauge("result_cache_entries", len(self._entries), namespace=self.namespace)
@@ -0,0 +1,251 @@
+# backend/app/infrastructure/single_flight.py
+"""
+Coalescing "single-flight": llamadas idénticas concurrentes comparten un resultado.
+
+Características:
+- Local: las llamadas del mismo proceso con la misma clave esperan el mismo Future
+- Entre workers: lock en Redis elige un líder; los seguidores esperan su
+  resultado por pub/sub (y lo leen de una clave con TTL corto si llegan tarde)
+- Heartbeat del lock: si el líder muere, el lock vence y los seguidores calculan
+- Si el líder falla o se cancela, los seguidores calculan por su cuenta
+  (el error de una llamada no se propaga a las demás)
+- Sin Redis, o con Redis caído, degrada a coalescing local
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Any
+
+from redis.exceptions import LockError, RedisError
+
+from app.core import json_codec
+from app.core.metrics import metrics
+from app.infrastructure.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- CONSTANTS -----------------
+
+
+# Mensaje publicado cuando el líder no produjo resultado
+_LEADER_FAILED = b""
+
+# Intervalo máximo entre chequeos de que el líder siga vivo
+_FOLLOW_POLL_SECONDS = 1.0
+
+
+# ----------------- RESULTS -----------------
+
+
+@dataclass(frozen=True, slots=True)
+class FlightResult:
+    """Resultado de `SingleFlight.do`."""
+
+    value: dict[str, Any]
+    shared: bool  # True si lo calculó otra llamada (de este u otro worker)
+
+
+class _LeaderAbortedError(Exception):
+    """El líder local terminó sin resultado: el seguidor lo intenta por su cuenta."""
+
+
+# ----------------- SINGLE FLIGHT -----------------
+
+
+class SingleFlight:
+    """
+    Ejecuta una sola vez por clave las llamadas concurrentes idénticas.
+
+    Los valores deben ser serializables a JSON (viajan por Redis entre workers).
+
+    Uso:
+        flight = SingleFlight("analysis", wait_timeout=240, lock_ttl=15)
+        result = await flight.do(clave, lambda: calcular())
+        result.value, result.shared
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        wait_timeout: float,
+        lock_ttl: float,
+        result_ttl: float = 30.0,
+        redis_retry_after: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            namespace: Prefijo de las claves en Redis
+            wait_timeout: Espera máxima de un seguidor al líder de otro worker
+            lock_ttl: TTL del lock del líder (se renueva cada lock_ttl / 3)
+            result_ttl: Retención del resultado para seguidores que llegan tarde
+            redis_retry_after: Pausa antes de volver a usar Redis tras un error
+        """
+        self.namespace = namespace
+        self._wait_timeout = wait_timeout
+        self._lock_ttl = lock_ttl
+        self._result_ttl = result_ttl
+        self._redis_retry_after = redis_retry_after
+        self._redis_disabled_until = 0.0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> FlightResult:
+        """Ejecuta `fn` o espera el resultado de la llamada idéntica en curso."""
+        while (future := self._inflight.get(key)) is not None:
+            try:
+                value = await asyncio.shield(future)
+            except _LeaderAbortedError:
+                continue
+            self._record("local")
+            return FlightResult(value, shared=True)
+
+        future = asyncio.get_running_loop().create_future()
+        # Evita "exception was never retrieved" si no hay seguidores
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await self._do_distributed(key, fn)
+        except BaseException:
+            future.set_exception(_LeaderAbortedError())
+            raise
+        else:
+            future.set_result(result.value)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # --- Redis ---
+
+    def _redis(self) -> Any:
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        return get_redis()
+
+    def _disable_redis(self, error: Exception) -> None:
+        self._redis_disabled_until = time.monotonic() + self._redis_retry_after
+        metrics.inc("single_flight_redis_errors_total", namespace=self.namespace)
+        logger.warning(
+            f"⚠️ Redis no disponible para single-flight ({type(error).__name__}: {error}); "
+            f"coalescing solo local por {self._redis_retry_after:.0f}s"
+        )
+
+    def _record(self, role: str) -> None:
+        metrics.inc("single_flight_calls_total", namespace=self.namespace, role=role)
+
+    def _keys(self, key: str) -> tuple[str, str, str]:
+        prefix = f"{self.namespace}:sf:{key}"
+        return f"{prefix}:lock", f"{prefix}:result", f"{prefix}:done"
+
+    async def _do_distributed(
+        self, key: str, fn: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> FlightResult:
+        redis = self._redis()
+        if redis is None:
+            self._record("leader")
+            return FlightResult(await fn(), shared=False)
+
+        lock_key, _, _ = self._keys(key)
+        lock = redis.lock(lock_key, timeout=self._lock_ttl, thread_local=False)
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except RedisError as e:
+            self._disable_redis(e)
+            self._record("leader")
+            return FlightResult(await fn(), shared=False)
+
+        if acquired:
+            self._record("leader")
+            return FlightResult(await self._lead(redis, lock, key, fn), shared=False)
+
+        value = await self._follow(redis, key)
+        if value is not None:
+            self._record("redis")
+            return FlightResult(value, shared=True)
+        # Líder caído, fallido o demasiado lento: calcular sin coordinar
+        self._record("fallback")
+        return FlightResult(await fn(), shared=False)
+
+    async def _lead(
+        self,
+        redis: Any,
+        lock: Any,
+        key: str,
+        fn: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        """Calcula, publica el resultado a los seguidores y libera el lock."""
+        heartbeat = asyncio.create_task(self._heartbeat(lock))
+        try:
+            value = await fn()
+        except BaseException:
+            await self._publish(redis, key, _LEADER_FAILED)
+            raise
+        else:
+            await self._publish(redis, key, json_codec.dumps(value))
+            return value
+        finally:
+            heartbeat.cancel()
+            with suppress(LockError, RedisError):
+                await lock.release()
+
+    async def _heartbeat(self, lock: Any) -> None:
+        """Renueva el TTL del lock mientras el líder sigue calculando."""
+        while True:
+            await asyncio.sleep(self._lock_ttl / 3)
+            try:
+                await lock.reacquire()
+            except (LockError, RedisError):
+                return
+
+    async def _publish(self, redis: Any, key: str, payload: bytes) -> None:
+        _, result_key, channel = self._keys(key)
+        try:
+            if payload:
+                await redis.set(result_key, payload, px=int(self._result_ttl * 1000))
+            await redis.publish(channel, payload)
+        except RedisError as e:
+            logger.warning(f"⚠️ No se pudo publicar el resultado single-flight: {e}")
+
+    async def _follow(self, redis: Any, key: str) -> dict[str, Any] | None:
+        """
+        Espera el resultado del líder de otro worker.
+
+        Returns:
+            Resultado publicado, o None si el líder falló, murió (lock vencido)
+            o no terminó dentro de wait_timeout
+        """
+        lock_key, result_key, channel = self._keys(key)
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            # Suscripto antes de leer: no se pierde un resultado publicado en el medio
+            stored = await redis.get(result_key)
+            if stored is not None:
+                return json_codec.loads(stored)
+
+            deadline = time.monotonic() + self._wait_timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(remaining, _FOLLOW_POLL_SECONDS),
+                )
+                if message is not None:
+                    data = message["data"]
+                    return json_codec.loads(data) if data else None
+                if not await redis.exists(lock_key):
+                    stored = await redis.get(result_key)
+                    return json_codec.loads(stored) if stored is not None else None
+            return None
+        except RedisError as e:
+            self._disable_redis(e)
+            return None
+        finally:
+            with suppress(RedisError):
+                await pubsub.reset()
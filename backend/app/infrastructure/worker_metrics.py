@@ -0,0 +1,77 @@
+# backend/app/infrastructure/worker_metrics.py
+"""
+Métricas de los procesos del worker Celery, publicadas en Redis.
+
+Características:
+- Las métricas son en proceso: /health/metrics de la API no ve las del worker
+- Cada proceso del worker publica su snapshot tras cada tarea (clave con TTL:
+  un proceso muerto o inactivo desaparece solo)
+- La API los lee en GET /health/metrics/workers
+- Best effort: un error de Redis no afecta la tarea ni el health check
+"""
+
+import logging
+import os
+import socket
+from datetime import UTC, datetime
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from app.core import json_codec
+from app.core.metrics import metrics
+from app.infrastructure.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- CONSTANTS -----------------
+
+
+_KEY_PREFIX = "metrics:worker:"
+
+# Retención del último snapshot de un proceso sin tareas nuevas
+SNAPSHOT_TTL_SECONDS = 3600
+
+
+# ----------------- SNAPSHOTS -----------------
+
+
+def _worker_key() -> str:
+    return f"{_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_worker_metrics() -> None:
+    """Guarda el snapshot de métricas de este proceso (no-op sin Redis)."""
+    redis = get_redis()
+    if redis is None:
+        return
+    snapshot = {"published_at": datetime.now(UTC).isoformat(), **metrics.snapshot()}
+    try:
+        await redis.set(_worker_key(), json_codec.dumps(snapshot), ex=SNAPSHOT_TTL_SECONDS)
+    except RedisError as e:
+        logger.warning(f"⚠️ No se pudieron publicar las métricas del worker: {e}")
+
+
+async def worker_metrics_snapshots() -> dict[str, Any]:
+    """
+    Último snapshot publicado por cada proceso del worker.
+
+    Returns:
+        "host:pid" → snapshot ({} sin Redis o si Redis falla)
+    """
+    redis = get_redis()
+    if redis is None:
+        return {}
+    try:
+        keys = [key async for key in redis.scan_iter(match=f"{_KEY_PREFIX}*")]
+        values = await redis.mget(keys) if keys else []
+    except RedisError as e:
+        logger.warning(f"⚠️ No se pudieron leer las métricas de los workers: {e}")
+        return {}
+    return {
+        key.decode("utf-8").removeprefix(_KEY_PREFIX): json_codec.loads(value)
+        for key, value in zip(keys, values, strict=True)
+        if value is not None
+    }
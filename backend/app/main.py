@@ -12,12 +12,17 @@ from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 
-from app.core.config import settings, Environment
+from app.core.config import Environment, settings
+from app.core.json_codec import ORJSON_AVAILABLE
 from app.core.logger import setup_logging
 from app.infrastructure.database import AsyncSessionLocal, create_default_roles, init_db
+from app.infrastructure.gemini_client import GeminiClientRegistry, create_http_client
+from app.infrastructure.redis_client import close_redis
 from app.web.routers import analysis_router, auth_router, embeddings_router, health_router
 
+
 # Inicializar logging
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -56,6 +61,8 @@ async def lifespan(app: FastAPI):
     # --- STARTUP ---
     logger.info(f"🚀 Iniciando {settings.PROJECT_NAME} v{settings.PROJECT_VERSION}...")
     logger.info(f"   Entorno: {settings.ENVIRONMENT.value}")
+    if not ORJSON_AVAILABLE:
+        logger.warning("⚠️ orjson no instalado: JSON con la librería estándar (más lento)")
     
     try:
         await init_db()
@@ -73,11 +80,19 @@ async def lifespan(app: FastAPI):
         else:
             logger.warning("⚠️ Continuando sin DB - las rutas que requieren DB fallarán")
     
+    # Pool HTTP compartido hacia Gemini (una sola instancia por proceso)
+    app.state.gemini_http = create_http_client()
+    # Clientes por API key (sistema + usuarios) sobre ese mismo pool
+    app.state.gemini_registry = GeminiClientRegistry(http_client=app.state.gemini_http)
+
     logger.info(f"✅ {settings.PROJECT_NAME} iniciado correctamente")
     
     yield  # La aplicación corre aquí
     
     # --- SHUTDOWN ---
+    await app.state.gemini_http.aclose()
+    logger.info("🔌 Pool HTTP de Gemini cerrado")
+    await close_redis()
     logger.info(f"🛑 {settings.PROJECT_NAME} detenido")
 
 
@@ -91,6 +106,8 @@ app = FastAPI(
     docs_url=None if _is_production else "/docs",
     redoc_url=None if _is_production else "/redoc",
     lifespan=lifespan,
+    # orjson para serializar respuestas grandes (embeddings, historial)
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse,
 )
 
 # Configurar CORS
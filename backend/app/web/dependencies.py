@@ -0,0 +1,34 @@
+# backend/app/web/dependencies.py
+"""
+Dependencies de FastAPI compartidas entre routers.
+"""
+
+
+from fastapi import Request
+
+from app.infrastructure.gemini_client import GeminiClient, GeminiClientRegistry
+
+
+# Registro de respaldo si la app corre sin lifespan (ej: tests)
+_fallback_registry: GeminiClientRegistry | None = None
+
+
+def get_gemini_registry(request: Request) -> GeminiClientRegistry:
+    """
+    Dependency para obtener el registro de clientes de Gemini por API key.
+
+    El registro (y su pool HTTP) se crea en `main.lifespan`; si no existe
+    se usa uno de respaldo con conexiones temporales.
+    """
+    global _fallback_registry
+    registry = getattr(request.app.state, "gemini_registry", None)
+    if registry is None:
+        if _fallback_registry is None:
+            _fallback_registry = GeminiClientRegistry()
+        registry = _fallback_registry
+    return registry
+
+
+def get_gemini_client(request: Request) -> GeminiClient:
+    """Dependency para obtener el GeminiClient de la API key del sistema."""
+    return get_gemini_registry(request).system_client
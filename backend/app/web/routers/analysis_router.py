@@ -4,23 +4,40 @@ Router para análisis de código Python con IA.
 
 Endpoints:
 - POST /api/analysis/ - Analizar código
+- POST /api/analysis/stream - Analizar código con streaming (Server-Sent Events)
+- POST /api/analysis/jobs - Encolar un análisis asíncrono (devuelve el job id)
+- GET /api/analysis/jobs/{job_id} - Estado y resultado de un job
+- GET /api/analysis/jobs/{job_id}/events - Estado de un job por Server-Sent Events
 - GET /api/analysis/stats - Estadísticas del usuario
 - GET /api/analysis/history - Historial de análisis
+- GET /api/analysis/usage - Tokens consumidos por día y modelo
 """
 
+import asyncio
 import logging
-from datetime import datetime
-from typing import Optional, List
-
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from pydantic import BaseModel, Field
+from contextlib import suppress
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Awaitable, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.application.analysis_service import AnalysisService
+from app.application.auth_service import get_user_api_key, get_user_role
+from app.core import json_codec
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.domain.models import User
-from app.infrastructure.database import get_db
-from app.infrastructure.encryption import get_encryption_service
+from app.infrastructure.database import AsyncSessionLocal, get_db
+from app.infrastructure.gemini_client import GeminiClientRegistry
+from app.infrastructure.job_store import JOB_FAILED, Job, JobStore, JobStoreError
+from app.web.dependencies import get_gemini_registry
 from app.web.routers.auth_router import get_current_user
+from app.worker.celery_app import ANALYZE_CODE_TASK, celery_app
+
 
 logger = logging.getLogger(__name__)
 
@@ -30,29 +47,84 @@ router = APIRouter(prefix="/api/analysis", tags=["Análisis de Código"])
 # ----------------- HELPERS -----------------
 
 
-def _get_user_api_key(user: Optional[User]) -> Optional[str]:
+def _format_sse(event: str, data: Any) -> str:
+    """Serializa un evento en formato Server-Sent Events."""
+    payload = json_codec.dumps(jsonable_encoder(data)).decode("utf-8")
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+# Headers para que proxies (nginx, Cloudflare) no acumulen el stream
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Status no estándar (convención de nginx) para requests que el cliente abandonó
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+
+async def _run_until_disconnect(http_request: Request, coro: Awaitable[Any]) -> tuple[bool, Any]:
     """
-    Obtiene y desencripta la API key del usuario si existe.
-    
-    Args:
-        user: Usuario autenticado o None
-        
+    Ejecuta `coro` cancelándolo si el cliente HTTP se desconecta antes de que termine.
+
+    Cancelar la tarea corta la llamada a Gemini en curso y libera su cupo de
+    concurrencia (salvo ANALYSIS_FINISH_ON_DISCONNECT, ver AnalysisService).
+
     Returns:
-        API key desencriptada o None (usará key del sistema)
+        (True, resultado) si terminó, (False, None) si el cliente se fue
     """
-    if not user or not user.gemini_api_key_encrypted:
-        return None
-    
+    tarea = asyncio.ensure_future(coro)
     try:
-        encryption = get_encryption_service()
-        api_key = encryption.decrypt(user.gemini_api_key_encrypted)
-        # Log sin PII - solo user_id, no email
-        logger.info(f"🔓 API key desencriptada para user_id: {user.id}")
-        return api_key
-    except Exception as e:
-        logger.error(f"Error al desencriptar API key para user_id {user.id}: {e}")
-        # Fallback a key del sistema (manejado por AnalysisService)
-        return None
+        while True:
+            done, _ = await asyncio.wait({tarea}, timeout=settings.ANALYSIS_DISCONNECT_POLL_INTERVAL)
+            if done:
+                return True, tarea.result()
+            if await http_request.is_disconnected():
+                tarea.cancel()
+                with suppress(asyncio.CancelledError):
+                    await tarea
+                return False, None
+    finally:
+        # Cancelación externa (shutdown) o error: no dejar la tarea huérfana
+        if not tarea.done():
+            tarea.cancel()
+
+
+def _job_store() -> JobStore:
+    """JobStore de los análisis asíncronos (503 si el modo está deshabilitado)."""
+    if not settings.ANALYSIS_JOBS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El modo asíncrono de análisis no está habilitado",
+        )
+    return JobStore()
+
+
+async def _get_owned_job(store: JobStore, job_id: str, user: Optional[User]) -> Job:
+    """
+    Job del usuario (o anónimo); 404 si no existe, venció o es de otro usuario.
+    """
+    try:
+        job = await store.get(job_id)
+    except JobStoreError as e:
+        logger.error(f"❌ {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Estado de jobs no disponible"
+        ) from e
+    if job is None or (job.user_id is not None and (user is None or user.id != job.user_id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job no encontrado")
+    return job
+
+
+def _job_response(job: Job) -> "JobResponse":
+    """Job del JobStore como response de la API."""
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        result=job.result,
+        error=job.error,
+        status_code=job.status_code,
+        retry_after=job.retry_after,
+    )
 
 
 # ----------------- SCHEMAS -----------------
@@ -67,22 +139,89 @@ class AnalysisRequest(BaseModel):
         json_schema_extra = {"example": {"codigo": "def suma(a, b):\n    return a + b"}}
 
 
+class CambioResponse(BaseModel):
+    """Cambio aplicado en el código mejorado."""
+
+    tipo: str
+    descripcion: str
+
+
+class EdicionResponse(BaseModel):
+    """Reemplazo de un rango de líneas del código original (1-based, inclusivo)."""
+
+    linea_inicio: int
+    linea_fin: int
+    reemplazo: str
+
+
+class ReportResponse(BaseModel):
+    """Reporte estructurado del análisis (modo JSON)."""
+
+    bugs: List[str]
+    code_smells: List[str]
+    mejoras_rendimiento: List[str]
+    score: int
+    justificacion: str
+    codigo_mejorado: str
+    cambios: List[CambioResponse]
+    ediciones: List[EdicionResponse] = Field(
+        default_factory=list, description="Vacío si el modelo devolvió el código completo"
+    )
+
+
+class NearDuplicateResponse(BaseModel):
+    """Análisis previo reutilizado por similitud de embeddings."""
+
+    analysis_id: int
+    similarity: float = Field(description="Similitud con el código analizado (0-1)")
+    method: str = Field(description="embedding (coseno) o minhash (Jaccard estimada)")
+
+
 class AnalysisResponse(BaseModel):
     """Response del análisis de código."""
 
     success: bool
     analisis: Optional[str] = None
+    score: Optional[int] = Field(default=None, description="Score de calidad 0-100")
+    codigo_mejorado: Optional[str] = None
+    reporte: Optional[ReportResponse] = Field(
+        default=None, description="Reporte estructurado (null si el análisis fue en markdown)"
+    )
     error: Optional[str] = None
     codigo: str
     usuario_id: Optional[int] = None
     timestamp: datetime  # Cambiado de str a datetime para mejor serialización
     modelo_usado: Optional[str] = None
+    tokens_usados: Optional[int] = None
     analysis_id: Optional[int] = None
+    cache_hit: bool = Field(default=False, description="True si el resultado salió de la caché")
+    near_duplicate: Optional[NearDuplicateResponse] = Field(
+        default=None, description="Análisis previo casi idéntico reutilizado (null si se analizó)"
+    )
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 
+class JobResponse(BaseModel):
+    """Estado de un análisis asíncrono."""
+
+    job_id: str
+    status: str = Field(description="queued, running, succeeded o failed")
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[AnalysisResponse] = Field(
+        default=None, description="Mismo payload que POST /api/analysis/ (solo si succeeded)"
+    )
+    error: Optional[str] = None
+    status_code: Optional[int] = Field(
+        default=None, description="Status HTTP que habría devuelto el análisis síncrono (si failed)"
+    )
+    retry_after: Optional[int] = None
+
+    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
+
+
 class StatsResponse(BaseModel):
     """Response de estadísticas del usuario."""
 
@@ -115,14 +254,36 @@ class HistoryResponse(BaseModel):
     offset: int
 
 
+class UsageItem(BaseModel):
+    """Tokens consumidos en un día con un modelo."""
+
+    fecha: date
+    modelo: str
+    analisis: int
+    prompt_tokens: int
+    output_tokens: int
+    thinking_tokens: int
+    total_tokens: int
+
+
+class UsageResponse(BaseModel):
+    """Response del consumo de tokens del usuario."""
+
+    items: List[UsageItem]
+    total_tokens: int
+    dias: int
+
+
 # ----------------- ENDPOINTS -----------------
 
 
 @router.post("/", response_model=AnalysisResponse, status_code=status.HTTP_200_OK)
 async def analizar_codigo(
     request: AnalysisRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user),
+    gemini_registry: GeminiClientRegistry = Depends(get_gemini_registry),
 ) -> AnalysisResponse:
     """
     Analiza código Python y retorna sugerencias de mejora.
@@ -136,28 +297,177 @@ async def analizar_codigo(
     - Mejoras de rendimiento
     - Score de calidad (0-100)
     - Código mejorado
+
+    Si el cliente se desconecta antes de terminar, se cancela la llamada a
+    Gemini y no se guarda nada (status 499).
     """
-    service = AnalysisService(db=db)
+    service = AnalysisService(db=db, gemini_registry=gemini_registry)
     user_id = current_user.id if current_user else None
 
     # Obtener API key del usuario (desencriptar si existe)
-    user_api_key = _get_user_api_key(current_user)
-
-    resultado = await service.analizar_codigo(
-        codigo=request.codigo,
-        usuario_id=user_id,
-        user_api_key=user_api_key,
+    user_api_key = get_user_api_key(current_user)
+
+    completed, resultado = await _run_until_disconnect(
+        http_request,
+        service.analizar_codigo(
+            codigo=request.codigo,
+            usuario_id=user_id,
+            user_api_key=user_api_key,
+            rol=get_user_role(current_user),
+        ),
     )
+    if not completed:
+        metrics.inc("analysis_cancelled_total", endpoint="analyze", reason="client_disconnect")
+        logger.info("🔌 Cliente desconectado: análisis cancelado")
+        # Descarta una persistencia a medio hacer (get_db haría commit)
+        await db.rollback()
+        return Response(status_code=HTTP_499_CLIENT_CLOSED_REQUEST)
 
     if not resultado["success"]:
+        # 503 + Retry-After si Gemini no está disponible (circuito abierto)
+        retry_after = resultado.get("retry_after")
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=resultado.get("status_code", status.HTTP_400_BAD_REQUEST),
             detail=resultado.get("error", "Error desconocido"),
+            headers={"Retry-After": str(retry_after)} if retry_after else None,
         )
 
     return AnalysisResponse(**resultado)
 
 
+@router.post("/stream", status_code=status.HTTP_200_OK)
+async def analizar_codigo_stream(
+    request: AnalysisRequest,
+    current_user: Optional[User] = Depends(get_current_user),
+    gemini_registry: GeminiClientRegistry = Depends(get_gemini_registry),
+) -> StreamingResponse:
+    """
+    Analiza código Python emitiendo el resultado como Server-Sent Events.
+
+    Eventos:
+    - **chunk**: `{"text": "..."}` fragmento de markdown a medida que Gemini lo genera
+    - **done**: mismo payload que `POST /api/analysis/` (score y persistencia sobre el texto completo)
+    - **error**: `{"success": false, "error": "..."}`
+    """
+    user_id = current_user.id if current_user else None
+    user_api_key = get_user_api_key(current_user)
+    user_role = get_user_role(current_user)
+
+    async def event_stream() -> AsyncIterator[str]:
+        # Sesión propia: las dependencias con yield se cierran antes de que
+        # termine el StreamingResponse
+        async with AsyncSessionLocal() as db:
+            service = AnalysisService(db=db, gemini_registry=gemini_registry)
+            try:
+                async for event in service.analizar_codigo_stream(
+                    codigo=request.codigo,
+                    usuario_id=user_id,
+                    user_api_key=user_api_key,
+                    rol=user_role,
+                ):
+                    if event["event"] == "done":
+                        # Confirmar persistencia antes de informar el analysis_id
+                        await db.commit()
+                    yield _format_sse(event["event"], event["data"])
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cliente desconectado: la cancelación atraviesa el generador del
+                # servicio y cierra el stream de Gemini; la sesión se descarta sin commit
+                metrics.inc("analysis_cancelled_total", endpoint="stream", reason="client_disconnect")
+                logger.info("🔌 Cliente desconectado: stream de análisis cancelado")
+                raise
+            except Exception as e:
+                logger.error(f"Error en stream de análisis: {type(e).__name__}: {e}")
+                await db.rollback()
+                yield _format_sse("error", {"success": False, "error": "Error al guardar el análisis"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def crear_job_analisis(
+    request: AnalysisRequest,
+    response: Response,
+    current_user: Optional[User] = Depends(get_current_user),
+) -> JobResponse:
+    """
+    Encola un análisis y devuelve el job al instante (sin esperar a Gemini).
+
+    Un worker Celery ejecuta el mismo análisis que `POST /api/analysis/`; el
+    resultado se consulta en `GET /api/analysis/jobs/{job_id}` o se espera
+    por SSE en `GET /api/analysis/jobs/{job_id}/events`. Un job en curso
+    sobrevive a reinicios de la API y vuelve a la cola si su worker muere.
+    """
+    store = _job_store()
+    user_id = current_user.id if current_user else None
+    try:
+        job = await store.create(user_id)
+    except JobStoreError as e:
+        logger.error(f"❌ {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Estado de jobs no disponible"
+        ) from e
+
+    try:
+        # send_task es bloqueante (conexión al broker): fuera del event loop
+        await asyncio.to_thread(
+            celery_app.send_task, ANALYZE_CODE_TASK, args=(job.id, request.codigo, user_id), task_id=job.id
+        )
+    except Exception as e:
+        logger.error(f"❌ No se pudo encolar el job {job.id}: {type(e).__name__}: {e}")
+        with suppress(JobStoreError):
+            await store.update(job.id, JOB_FAILED, error="No se pudo encolar el análisis", status_code=503)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cola de análisis no disponible"
+        ) from e
+
+    metrics.inc("analysis_jobs_submitted_total")
+    logger.info(f"📥 Job {job.id} encolado para usuario_id={user_id}")
+    response.headers["Location"] = f"{router.prefix}/jobs/{job.id}"
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, status_code=status.HTTP_200_OK)
+async def obtener_job_analisis(
+    job_id: str,
+    current_user: Optional[User] = Depends(get_current_user),
+) -> JobResponse:
+    """
+    Estado de un análisis asíncrono y, si terminó, su resultado o error.
+    """
+    job = await _get_owned_job(_job_store(), job_id, current_user)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}/events", status_code=status.HTTP_200_OK)
+async def seguir_job_analisis(
+    job_id: str,
+    current_user: Optional[User] = Depends(get_current_user),
+) -> StreamingResponse:
+    """
+    Estado de un análisis asíncrono como Server-Sent Events.
+
+    Eventos:
+    - **status**: job en `queued` o `running` (se emite en cada cambio)
+    - **done**: job terminado (`succeeded` o `failed`), mismo payload que `GET /jobs/{job_id}`
+    - **error**: `{"success": false, "error": "..."}` si se agota la espera o el job vence
+    """
+    store = _job_store()
+    await _get_owned_job(store, job_id, current_user)
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for job in store.watch(job_id, timeout=settings.ANALYSIS_JOB_EVENTS_TIMEOUT):
+                yield _format_sse("done" if job.finished else "status", _job_response(job))
+                if job.finished:
+                    return
+            yield _format_sse("error", {"success": False, "error": "El job no terminó a tiempo o venció"})
+        except JobStoreError as e:
+            logger.error(f"❌ {e}")
+            yield _format_sse("error", {"success": False, "error": "Estado de jobs no disponible"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
 @router.get("/stats", response_model=StatsResponse, status_code=status.HTTP_200_OK)
 async def obtener_estadisticas(
     db: AsyncSession = Depends(get_db),
@@ -197,6 +507,23 @@ async def obtener_historial(
     return HistoryResponse(**history)
 
 
+@router.get("/usage", response_model=UsageResponse, status_code=status.HTTP_200_OK)
+async def obtener_uso_tokens(
+    days: int = Query(default=30, ge=1, le=365, description="Días hacia atrás"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> UsageResponse:
+    """
+    Obtiene los tokens de Gemini consumidos por el usuario autenticado,
+    agrupados por día y modelo.
+
+    - **days**: Ventana en días (1-365, default: 30)
+    """
+    service = AnalysisService(db=db)
+    usage = await service.obtener_uso_tokens(current_user.id, days)
+    return UsageResponse(**usage)
+
+
 @router.get("/health", status_code=status.HTTP_200_OK)
 async def health_check() -> dict[str, str]:
     """Health check del servicio de análisis."""
@@ -12,30 +12,21 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 
-from app.application.embeddings_service import EmbeddingsService, EmbeddingsError
-from app.core.config import Settings, get_settings
+from app.infrastructure.gemini_client import GeminiClient
+from app.web.dependencies import get_gemini_client
+
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/embeddings", tags=["Embeddings"])
 
 
-# ----------------- DEPENDENCIES -----------------
-
-
-def get_embeddings_service(
-    settings: Annotated[Settings, Depends(get_settings)],
-) -> EmbeddingsService:
-    """Dependency para obtener EmbeddingsService (inyección de dependencias)."""
-    return EmbeddingsService(api_key=settings.GEMINI_API_KEY)
-
-
 # ----------------- SCHEMAS -----------------
 
 
 class EmbeddingRequest(BaseModel):
     """Request para generar embeddings."""
-    
+
     texts: list[str] = Field(
         ...,
         min_length=1,
@@ -49,11 +40,21 @@ class EmbeddingRequest(BaseModel):
         }
 
 
+class EmbeddingFailure(BaseModel):
+    """Texto cuyo embedding no pudo generarse."""
+
+    index: int = Field(description="Posición del texto en el request")
+    error: str
+
+
 class EmbeddingResponse(BaseModel):
     """Response con embeddings generados."""
-    
-    embeddings: list[list[float]]
+
+    embeddings: list[list[float]] = Field(
+        description="Un vector por texto, en el mismo orden (vacío si falló)"
+    )
     count: int = Field(description="Cantidad de embeddings generados")
+    failed: list[EmbeddingFailure] = Field(default_factory=list)
 
 
 # ----------------- ENDPOINTS -----------------
@@ -62,32 +63,37 @@ class EmbeddingResponse(BaseModel):
 @router.post("/", response_model=EmbeddingResponse)
 async def generate_embeddings(
     request: EmbeddingRequest,
-    service: Annotated[EmbeddingsService, Depends(get_embeddings_service)],
+    client: Annotated[GeminiClient, Depends(get_gemini_client)],
 ) -> EmbeddingResponse:
     """
-    Genera embeddings para una lista de textos usando Gemini.
-    
+    Genera embeddings para una lista de textos usando Gemini (batchEmbedContents).
+
     - **texts**: Lista de textos (1-100 elementos)
-    
-    Retorna vectores de embeddings para cada texto.
+
+    Retorna un vector por texto en el mismo orden; los textos que fallaron
+    se listan en `failed` con su motivo. Si todos los textos están vacíos
+    responde 400 sin llamar a Gemini.
     """
-    try:
-        embeddings = service.batch_generate_embeddings_list(request.texts)
-        return EmbeddingResponse(
-            embeddings=embeddings,
-            count=len(embeddings),
+    if not any(text.strip() for text in request.texts):
+        # Error del cliente, no del servicio de embeddings
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El texto no puede estar vacío",
         )
-    except EmbeddingsError as e:
-        # Error específico del servicio - log interno, mensaje genérico al cliente
-        logger.error(f"Error en embeddings: {e}")
+
+    results = await client.create_embeddings_batch(request.texts)
+    failed = [EmbeddingFailure(index=r.index, error=r.error or "Sin embedding") for r in results if not r.ok]
+
+    if len(failed) == len(results):
+        # Ningún embedding generado - log interno, mensaje genérico al cliente
+        logger.error(f"Error en embeddings: {failed[0].error}")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Error al comunicarse con el servicio de embeddings",
         )
-    except ValueError as e:
-        # Error de validación (textos vacíos, etc.)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e),
-        )
 
+    return EmbeddingResponse(
+        embeddings=[r.values for r in results],
+        count=len(results) - len(failed),
+        failed=failed,
+    )
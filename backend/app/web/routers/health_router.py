@@ -4,11 +4,27 @@ Router de health checks para monitoreo.
 
 Endpoints:
 - GET /health/ - Estado básico de la API
+- GET /health/gemini - Estado del pool HTTP, circuit breakers, colas y cuotas de Gemini
+- GET /health/metrics - Snapshot de métricas del proceso
+- GET /health/metrics/workers - Último snapshot de métricas de cada proceso del worker
 """
 
+from typing import Any, Optional
+
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
 
-from fastapi import APIRouter
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.infrastructure.gemini_client import (
+    circuit_breakers_snapshot,
+    concurrency_snapshot,
+    connection_stats,
+    prompt_caches_snapshot,
+    rate_pacers_snapshot,
+)
+from app.infrastructure.worker_metrics import worker_metrics_snapshots
+
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -18,11 +34,78 @@ router = APIRouter(prefix="/health", tags=["Health"])
 
 class HealthResponse(BaseModel):
     """Response del health check."""
-    
+
     status: str
     service: str = "neural-saas-api"
 
 
+class GeminiPoolStats(BaseModel):
+    """Estado del pool HTTP compartido hacia Gemini."""
+
+    active: bool
+    http2: bool
+    max_connections: int
+    max_keepalive_connections: int
+    requests: int
+    new_connections: int
+    reused_connections: int
+
+
+class CircuitBreakerStatus(BaseModel):
+    """Estado de un circuit breaker (modelo:api_key)."""
+
+    name: str
+    state: str
+    calls_in_window: int
+    failure_rate: float
+    retry_after: float
+
+
+class ConcurrencyLimiterStatus(BaseModel):
+    """Estado de un limitador de concurrencia (global o por API key)."""
+
+    name: str
+    limit: int
+    inflight: int
+    queued: int
+
+
+class RatePacerStatus(BaseModel):
+    """Cuota RPM/TPM disponible localmente (modelo:api_key)."""
+
+    name: str
+    requests_available: Optional[float] = None
+    tokens_available: Optional[int] = None
+
+
+class PromptCacheStatus(BaseModel):
+    """cachedContent con las instrucciones de análisis (modelo:api_key)."""
+
+    name: str
+    active: bool
+    expires_in: float
+
+
+class ClientRegistryStatus(BaseModel):
+    """Ocupación del registro de clientes por API key de usuario."""
+
+    size: int
+    max_size: int
+    idle_ttl: float
+
+
+class GeminiHealthResponse(BaseModel):
+    """Response del estado de la integración con Gemini."""
+
+    status: str
+    pool: GeminiPoolStats
+    breakers: list[CircuitBreakerStatus]
+    limiters: list[ConcurrencyLimiterStatus]
+    pacers: list[RatePacerStatus]
+    prompt_caches: list[PromptCacheStatus] = []
+    clients: Optional[ClientRegistryStatus] = None
+
+
 # ----------------- ENDPOINTS -----------------
 
 
@@ -30,7 +113,7 @@ class HealthResponse(BaseModel):
 async def health_check() -> HealthResponse:
     """
     Endpoint de salud de la API.
-    
+
     Usado por:
     - Docker healthcheck
     - Load balancers
@@ -38,3 +121,49 @@ async def health_check() -> HealthResponse:
     """
     return HealthResponse(status="ok")
 
+
+@router.get("/gemini", response_model=GeminiHealthResponse, summary="Gemini client health")
+async def gemini_health(request: Request) -> GeminiHealthResponse:
+    """
+    Estado del cliente de Gemini.
+
+    - **pool**: peticiones que reutilizaron una conexión vs. las que abrieron
+      una nueva (DNS + TCP + TLS)
+    - **breakers**: estado de cada circuit breaker (closed / open / half_open);
+      `status` es "degraded" si alguno no está cerrado
+    - **limiters**: llamadas en curso y en cola por limitador (global / key)
+    - **pacers**: requests y tokens disponibles en las cuotas por minuto
+    - **prompt_caches**: cachés de instrucciones (cachedContents) por modelo y key
+    - **clients**: clientes de API keys de usuario retenidos en el registro
+    """
+    http_client = getattr(request.app.state, "gemini_http", None)
+    registry = getattr(request.app.state, "gemini_registry", None)
+    breakers = [CircuitBreakerStatus(**b) for b in circuit_breakers_snapshot()]
+    degraded = any(b.state != "closed" for b in breakers)
+    return GeminiHealthResponse(
+        status="degraded" if degraded else "ok",
+        breakers=breakers,
+        limiters=[ConcurrencyLimiterStatus(**c) for c in concurrency_snapshot()],
+        pacers=[RatePacerStatus(**p) for p in rate_pacers_snapshot()],
+        prompt_caches=[PromptCacheStatus(**c) for c in prompt_caches_snapshot()],
+        clients=ClientRegistryStatus(**registry.snapshot()) if registry else None,
+        pool=GeminiPoolStats(
+            active=http_client is not None and not http_client.is_closed,
+            http2=settings.GEMINI_HTTP2,
+            max_connections=settings.GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+            **connection_stats(),
+        ),
+    )
+
+
+@router.get("/metrics", summary="Process metrics snapshot")
+async def metrics_snapshot() -> dict[str, Any]:
+    """Snapshot JSON de contadores, gauges y latencias del proceso."""
+    return metrics.snapshot()
+
+
+@router.get("/metrics/workers", summary="Celery worker metrics snapshots")
+async def worker_metrics() -> dict[str, Any]:
+    """Snapshot de métricas publicado por cada proceso del worker ("host:pid" → snapshot)."""
+    return await worker_metrics_snapshots()
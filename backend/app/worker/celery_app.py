@@ -0,0 +1,65 @@
+# backend/app/worker/celery_app.py
+"""
+Aplicación Celery para los análisis asíncronos.
+
+Características:
+- Broker y backend en Redis (settings.CELERY_BROKER_URL / CELERY_RESULT_BACKEND)
+- Ack al terminar la tarea: si un worker se reinicia o muere, el análisis
+  en curso vuelve a la cola en lugar de perderse
+- Prefetch de 1: un worker ocupado no retiene jobs que otro podría tomar
+- Soft time limit antes del límite duro: la tarea alcanza a marcar el job
+  como fallido (504) antes de que el proceso sea terminado
+- El estado y el resultado viven en el JobStore (ver app.infrastructure.job_store)
+
+Uso:
+    cd backend && celery -A app.worker.celery_app worker --loglevel=info --concurrency=2
+"""
+
+from celery import Celery
+from celery.signals import setup_logging as celery_setup_logging
+
+from app.core.config import settings
+from app.core.logger import setup_logging
+
+
+# ----------------- CONSTANTS -----------------
+
+ANALYSIS_QUEUE = "analysis"
+# La API encola por nombre: no importa el código del worker
+ANALYZE_CODE_TASK = "analysis.analyze_code"
+
+
+# ----------------- APP -----------------
+
+
+celery_app = Celery(
+    "neural_saas",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.worker.tasks"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    task_default_queue=ANALYSIS_QUEUE,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_soft_time_limit=settings.ANALYSIS_JOB_SOFT_TIME_LIMIT,
+    task_time_limit=settings.ANALYSIS_JOB_TIME_LIMIT,
+    # El resultado se publica en el JobStore; el backend solo guarda fallos
+    task_ignore_result=True,
+    task_store_errors_even_if_ignored=True,
+    result_expires=settings.ANALYSIS_JOB_TTL,
+    # Un mensaje sin ack se reentrega tras este plazo: debe superar el time limit
+    broker_transport_options={"visibility_timeout": settings.ANALYSIS_JOB_TIME_LIMIT * 2},
+    broker_connection_retry_on_startup=True,
+)
+
+
+@celery_setup_logging.connect
+def _setup_logging(**kwargs) -> None:
+    """Mismo formato de logs que la API (Celery no reconfigura el root logger)."""
+    setup_logging()
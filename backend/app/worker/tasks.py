@@ -0,0 +1,187 @@
+# backend/app/worker/tasks.py
+"""
+Tareas Celery: análisis de código fuera del request HTTP.
+
+Características:
+- Cada proceso del worker mantiene su event loop, pool HTTP hacia Gemini y
+  pool de DB entre tareas (la tarea es síncrona; el servicio es async)
+- La tarea recibe el user_id, no la API key: la key se desencripta en el
+  worker y nunca viaja por el broker
+- Una reentrega (worker reiniciado) de un job ya terminado no lo repite
+- Al superar el soft time limit el job queda fallido con status 504
+- Las métricas del proceso se publican en Redis tras cada tarea (GET /health/metrics/workers)
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime
+from typing import Any
+
+import httpx
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown
+
+from app.application.analysis_service import AnalysisService
+from app.application.auth_service import AuthService, get_user_api_key, get_user_role
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.infrastructure.database import AsyncSessionLocal
+from app.infrastructure.gemini_client import GeminiClientRegistry, create_http_client
+from app.infrastructure.job_store import (
+    JOB_FAILED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JobStore,
+    JobStoreError,
+)
+from app.infrastructure.redis_client import close_redis
+from app.infrastructure.worker_metrics import publish_worker_metrics
+from app.worker.celery_app import ANALYZE_CODE_TASK, celery_app
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------- EVENT LOOP -----------------
+
+
+# Uno por proceso (se crea tras el fork): los clientes async quedan ligados a él
+_loop: asyncio.AbstractEventLoop | None = None
+_http_client: httpx.AsyncClient | None = None
+_registry: GeminiClientRegistry | None = None
+
+
+def _run(coro: Any) -> Any:
+    """Ejecuta una corrutina en el event loop del proceso."""
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    task = _loop.create_task(coro)
+    try:
+        return _loop.run_until_complete(task)
+    except BaseException:
+        # Interrumpida fuera de la corrutina (p. ej. soft time limit): no queda pendiente
+        if not task.done():
+            task.cancel()
+            with suppress(Exception, asyncio.CancelledError):
+                _loop.run_until_complete(task)
+        raise
+
+
+def _get_registry() -> GeminiClientRegistry:
+    """Registro de clientes de Gemini del proceso (pool HTTP compartido entre tareas)."""
+    global _http_client, _registry
+    if _registry is None:
+        _http_client = create_http_client()
+        _registry = GeminiClientRegistry(http_client=_http_client)
+    return _registry
+
+
+async def _close_clients() -> None:
+    if _http_client is not None:
+        await _http_client.aclose()
+    await close_redis()
+
+
+@worker_process_shutdown.connect
+def _shutdown_process(**kwargs) -> None:
+    """Cierra el pool HTTP y Redis del proceso."""
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(_close_clients())
+        _loop.close()
+
+
+# ----------------- TASKS -----------------
+
+
+def _to_job_result(resultado: dict[str, Any]) -> dict[str, Any]:
+    """Resultado del servicio serializable a JSON (mismo payload que POST /api/analysis/)."""
+    return {
+        clave: valor.isoformat() if isinstance(valor, datetime) else valor
+        for clave, valor in resultado.items()
+    }
+
+
+async def _analyze(job_id: str, codigo: str, usuario_id: int | None) -> None:
+    store = JobStore()
+    job = await store.get(job_id)
+    if job is None:
+        logger.warning(f"⚠️ Job {job_id} inexistente o vencido: se descarta")
+        return
+    if job.finished:
+        logger.info(f"♻️ Job {job_id} ya terminado ({job.status}): reentrega ignorada")
+        return
+
+    queued = datetime.fromisoformat(job.created_at).timestamp()
+    metrics.observe("analysis_job_queue_seconds", max(0.0, time.time() - queued))
+    try:
+        await store.update(job_id, JOB_RUNNING)
+    except JobStoreError as e:
+        # Sin este manejo el job quedaría "queued" para siempre
+        logger.error(f"❌ Job {job_id} no pudo pasar a {JOB_RUNNING}: {e}")
+        metrics.inc("analysis_jobs_total", status=JOB_FAILED)
+        try:
+            await store.update(job_id, JOB_FAILED, error="No se pudo iniciar el análisis", status_code=503)
+        except JobStoreError as e:
+            logger.error(f"❌ Job {job_id} tampoco se pudo marcar como fallido: {e}")
+        return
+    started = time.perf_counter()
+
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await AuthService(db).get_user_by_id(usuario_id) if usuario_id is not None else None
+            service = AnalysisService(db=db, gemini_registry=_get_registry())
+            resultado = await service.analizar_codigo(
+                codigo=codigo,
+                usuario_id=usuario_id,
+                user_api_key=get_user_api_key(user),
+                rol=get_user_role(user),
+            )
+            await db.commit()
+    except SoftTimeLimitExceeded:
+        # Lo registra analyze_code (la señal también puede llegar fuera de esta corrutina)
+        raise
+    except Exception as e:
+        logger.error(f"❌ Job {job_id} falló: {type(e).__name__}: {e}", exc_info=True)
+        metrics.inc("analysis_jobs_total", status=JOB_FAILED)
+        await store.update(job_id, JOB_FAILED, error="Error interno al ejecutar el análisis", status_code=500)
+        return
+    finally:
+        metrics.observe("analysis_job_seconds", time.perf_counter() - started)
+
+    if resultado["success"]:
+        metrics.inc("analysis_jobs_total", status=JOB_SUCCEEDED)
+        await store.update(job_id, JOB_SUCCEEDED, result=_to_job_result(resultado))
+        logger.info(f"✅ Job {job_id} terminado (analysis_id={resultado.get('analysis_id')})")
+    else:
+        metrics.inc("analysis_jobs_total", status=JOB_FAILED)
+        await store.update(
+            job_id,
+            JOB_FAILED,
+            error=resultado.get("error", "Error desconocido"),
+            status_code=resultado.get("status_code", 400),
+            retry_after=resultado.get("retry_after"),
+        )
+
+
+@celery_app.task(name=ANALYZE_CODE_TASK)
+def analyze_code(job_id: str, codigo: str, usuario_id: int | None = None) -> None:
+    """
+    Ejecuta `AnalysisService.analizar_codigo` y publica el resultado en el JobStore.
+
+    Args:
+        job_id: ID del job creado por la API (también es el task_id)
+        codigo: Código Python a analizar
+        usuario_id: ID del usuario (None = anónimo)
+    """
+    try:
+        _run(_analyze(job_id, codigo, usuario_id))
+    except SoftTimeLimitExceeded:
+        logger.error(f"⏱️ Job {job_id} superó {settings.ANALYSIS_JOB_SOFT_TIME_LIMIT}s: se marca como fallido")
+        metrics.inc("analysis_jobs_total", status=JOB_FAILED)
+        _run(JobStore().update(job_id, JOB_FAILED, error="El análisis superó el tiempo máximo", status_code=504))
+    finally:
+        _run(publish_worker_metrics())
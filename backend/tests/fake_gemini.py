@@ -0,0 +1,403 @@
+# backend/tests/fake_gemini.py
+"""
+Servidor falso de la API de Gemini para tests y pruebas de carga offline.
+
+Rutas (mismas que usa GeminiClient bajo `/v1beta`):
+- POST /models/{model}:generateContent
+- POST /models/{model}:streamGenerateContent?alt=sse
+- POST /models/{model}:embedContent
+- POST /models/{model}:batchEmbedContents
+- POST /cachedContents, PATCH /cachedContents/{id}
+
+Características:
+- Distribuciones de latencia configurables (fija, uniforme, lognormal) con semilla
+- Inyección de 429/5xx/timeouts por tasa o por cola determinística (`enqueue`)
+- Truncamiento por MAX_TOKENS (y continuación coherente del texto cortado)
+- Respuestas de tamaño realista en markdown o JSON según el responseSchema pedido
+- usageMetadata estimado (~4 chars por token) y registro de requests recibidas
+
+Uso en tests (sin red, vía ASGITransport):
+    fake = FakeGemini(FakeGeminiConfig(seed=1))
+    client = GeminiClient(api_key="test", base_url=fake.base_url, http_client=fake.http_client())
+
+Uso en pruebas de carga (proceso aparte):
+    python -m tests.fake_gemini --port 8090 --latency lognormal:2.0:0.5 --error-rate 0.05
+    # y apuntar el cliente a base_url="http://localhost:8090/v1beta"
+
+Con ASGITransport los timeouts de httpx no aplican: la inyección de timeouts
+solo es observable contra el servidor levantado con uvicorn.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# ----------------- CONSTANTS -----------------
+
+
+API_PREFIX = "/v1beta"
+FAKE_HOST = "http://fake-gemini"
+
+# Marcador de fallo en la cola: la request "cuelga" timeout_seconds
+TIMEOUT = "timeout"
+
+Latency = Callable[[random.Random], float]
+
+
+# ----------------- LATENCY -----------------
+
+
+def fixed(seconds: float) -> Latency:
+    """Latencia constante."""
+    return lambda rng: seconds
+
+
+def uniform(low: float, high: float) -> Latency:
+    """Latencia uniforme en [low, high]."""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float) -> Latency:
+    """Latencia lognormal (cola larga típica de LLMs) con la mediana dada."""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def parse_latency(spec: str) -> Latency:
+    """`fixed:0.5`, `uniform:0.2:1.5` o `lognormal:2.0:0.5`."""
+    kind, *params = spec.split(":")
+    factories = {"fixed": fixed, "uniform": uniform, "lognormal": lognormal}
+    return factories[kind](*(float(p) for p in params))
+
+
+# ----------------- CONFIG -----------------
+
+
+@dataclass
+class FakeGeminiConfig:
+    """Comportamiento del servidor falso (se puede modificar entre requests)."""
+
+    seed: int = 0
+    # Latencia total de generateContent / hasta el primer fragmento en streaming
+    latency: Latency = field(default_factory=lambda: fixed(0.0))
+    embedding_latency: Latency = field(default_factory=lambda: fixed(0.0))
+    # Pausa entre fragmentos SSE
+    chunk_delay: Latency = field(default_factory=lambda: fixed(0.0))
+    chunk_chars: int = 400
+    # Tasas de fallo aleatorio (0-1) y códigos a elegir
+    error_rate: float = 0.0
+    error_statuses: tuple[int, ...] = (429, 500, 503)
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 300.0
+    retry_after: int | None = None
+    # Fracción de análisis cortados por MAX_TOKENS (a la mitad del texto)
+    max_tokens_rate: float = 0.0
+    # Tamaño aproximado (chars) del análisis en markdown
+    response_chars: int = 6000
+    embedding_dims: int = 768
+
+
+@dataclass
+class ReceivedRequest:
+    """Request registrada por el servidor falso."""
+
+    method: str
+    model: str | None
+    action: str
+    body: dict
+
+
+# ----------------- CONTENT -----------------
+
+
+def _extract_code(body: dict) -> str:
+    """Código del usuario del primer turno (bloque ```python del template)."""
+    try:
+        text = body["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError):
+        return ""
+    start = text.find("```python\n")
+    end = text.rfind("\n```")
+    return text[start + 10:end] if start != -1 and end > start else text
+
+
+def _strip_line_numbers(code: str) -> str:
+    """Quita el prefijo `N| ` del modo ediciones."""
+    lines = []
+    for line in code.split("\n"):
+        number, sep, rest = line.partition("| ")
+        lines.append(rest if sep and number.isdigit() else line)
+    return "\n".join(lines)
+
+
+def _filler(rng: random.Random, chars: int) -> list[str]:
+    """Ítems de hallazgos hasta sumar ~chars caracteres."""
+    items: list[str] = []
+    total = 0
+    while total < chars:
+        item = (
+            f"Hallazgo {len(items) + 1}: la función en la línea {rng.randint(1, 200)} "
+            f"puede simplificarse y evitar trabajo repetido en cada iteración del bucle."
+        )
+        items.append(item)
+        total += len(item)
+    return items
+
+
+def _markdown_analysis(code: str, rng: random.Random, chars: int) -> str:
+    """Análisis con el formato markdown de ANALYSIS_SYSTEM_INSTRUCTION."""
+    items = _filler(rng, max(0, chars - len(code) - 400))
+    third = max(1, len(items) // 3)
+
+    def bullets(chunk: list[str]) -> str:
+        return "\n".join(f"- {item}" for item in chunk) or "- ✅ Código limpio"
+
+    return (
+        f"## 🐛 Bugs Potenciales\n{bullets(items[:third])}\n\n"
+        f"## 👃 Code Smells\n{bullets(items[third:2 * third])}\n\n"
+        f"## ⚡ Mejoras de Rendimiento\n{bullets(items[2 * third:])}\n\n"
+        f"## 📊 Score de Calidad: {rng.randint(40, 95)}/100\n\n"
+        f"**Justificación:** Código funcional con margen de mejora.\n\n"
+        f"## ✨ Código Mejorado\n\n```python\n{code}\n```\n\n"
+        f"## 📝 Cambios Realizados\n1. **Legibilidad**: Nombres y estructura más claros"
+    )
+
+
+def _json_value(schema: dict, key: str, code: str, rng: random.Random, chars: int) -> Any:
+    """Valor de ejemplo que cumple `schema` (claves conocidas con contenido coherente)."""
+    if key == "codigo_mejorado":
+        return code
+    if key == "ediciones":
+        return []
+    if key == "score":
+        return rng.randint(40, 95)
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        return {
+            k: _json_value(v, k, code, rng, chars)
+            for k, v in schema.get("properties", {}).items()
+        }
+    if kind == "ARRAY":
+        items = schema.get("items", {})
+        if items.get("type") == "STRING":
+            return _filler(rng, chars)
+        return [_json_value(items, "", code, rng, chars) for _ in range(2)]
+    if kind == "INTEGER":
+        return rng.randint(0, 100)
+    return "Texto de ejemplo generado por el servidor falso."
+
+
+def _usage(prompt_chars: int, output_chars: int) -> dict:
+    prompt, output = max(1, prompt_chars // 4), max(1, output_chars // 4)
+    return {"promptTokenCount": prompt, "candidatesTokenCount": output, "totalTokenCount": prompt + output}
+
+
+def _embedding(text: str, dims: int) -> list[float]:
+    """Vector determinístico por texto (mismo texto → mismo vector)."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    return [rng.uniform(-1.0, 1.0) for _ in range(dims)]
+
+
+# ----------------- SERVER -----------------
+
+
+class FakeGemini:
+    """Servidor ASGI que imita la API de Gemini con fallos y latencias controladas."""
+
+    def __init__(self, config: FakeGeminiConfig | None = None) -> None:
+        self.config = config or FakeGeminiConfig()
+        self.requests: list[ReceivedRequest] = []
+        self._rng = random.Random(self.config.seed)
+        self._faults: deque[int | str] = deque()
+        self._caches = 0
+        self.app = self._build_app()
+
+    # --- Control desde los tests ---
+
+    @property
+    def base_url(self) -> str:
+        return f"{FAKE_HOST}{API_PREFIX}"
+
+    def http_client(self, **kwargs: Any) -> httpx.AsyncClient:
+        """Cliente httpx conectado en proceso (sin red) a este servidor."""
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), **kwargs)
+
+    def enqueue(self, *faults: int | str) -> None:
+        """Próximas requests fallan en este orden (status HTTP o TIMEOUT)."""
+        self._faults.extend(faults)
+
+    def count(self, action: str) -> int:
+        """Requests recibidas para una acción (ej: "generateContent")."""
+        return sum(1 for r in self.requests if r.action == action)
+
+    # --- Internals ---
+
+    async def _sleep(self, latency: Latency) -> None:
+        seconds = latency(self._rng)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def _inject_fault(self) -> JSONResponse | None:
+        """Error HTTP a devolver (o cuelgue) según la cola o las tasas configuradas."""
+        if self._faults:
+            fault = self._faults.popleft()
+        elif self._rng.random() < self.config.timeout_rate:
+            fault = TIMEOUT
+        elif self._rng.random() < self.config.error_rate:
+            fault = self._rng.choice(self.config.error_statuses)
+        else:
+            return None
+        if fault == TIMEOUT:
+            await asyncio.sleep(self.config.timeout_seconds)
+            fault = 504
+        headers = {"Retry-After": str(self.config.retry_after)} if self.config.retry_after else None
+        return JSONResponse(
+            {"error": {"code": fault, "message": "Fallo inyectado por FakeGemini", "status": "INJECTED"}},
+            status_code=int(fault),
+            headers=headers,
+        )
+
+    def _generation(self, body: dict) -> tuple[str, str]:
+        """(texto, finishReason) para un request de generateContent."""
+        config = body.get("generationConfig", {})
+        code = _strip_line_numbers(_extract_code(body))
+        rng = random.Random(hashlib.sha256(code.encode("utf-8")).digest())
+        if config.get("responseMimeType") == "application/json":
+            schema = config.get("responseSchema", {"type": "OBJECT"})
+            data = _json_value(schema, "", code, rng, self.config.response_chars // 6)
+            full = json.dumps(data, ensure_ascii=False)
+        else:
+            full = _markdown_analysis(code, rng, self.config.response_chars)
+
+        contents = body.get("contents", [])
+        if len(contents) > 1:
+            # Continuación: lo que faltaba después del texto ya entregado
+            previous = contents[1]["parts"][0].get("text", "")
+            return full[len(previous):], "STOP"
+        if self._rng.random() < self.config.max_tokens_rate:
+            return full[: len(full) // 2], "MAX_TOKENS"
+        return full, "STOP"
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Gemini")
+
+        @app.post(API_PREFIX + "/models/{target}")
+        async def models(target: str, request: Request) -> Any:
+            model, _, action = target.partition(":")
+            body = await request.json()
+            self.requests.append(ReceivedRequest("POST", model, action, body))
+            fault = await self._inject_fault()
+            if fault is not None:
+                return fault
+
+            if action == "embedContent":
+                await self._sleep(self.config.embedding_latency)
+                text = body["content"]["parts"][0]["text"]
+                return {"embedding": {"values": _embedding(text, self.config.embedding_dims)}}
+            if action == "batchEmbedContents":
+                await self._sleep(self.config.embedding_latency)
+                return {
+                    "embeddings": [
+                        {"values": _embedding(r["content"]["parts"][0]["text"], self.config.embedding_dims)}
+                        for r in body.get("requests", [])
+                    ]
+                }
+
+            text, finish_reason = self._generation(body)
+            usage = _usage(len(json.dumps(body)), len(text))
+            if action == "streamGenerateContent":
+                return StreamingResponse(
+                    self._stream(text, finish_reason, usage), media_type="text/event-stream"
+                )
+            if action == "generateContent":
+                await self._sleep(self.config.latency)
+                return {
+                    "candidates": [
+                        {
+                            "content": {"role": "model", "parts": [{"text": text}]},
+                            "finishReason": finish_reason,
+                        }
+                    ],
+                    "usageMetadata": usage,
+                    "modelVersion": model,
+                }
+            return JSONResponse({"error": {"code": 404, "message": f"Acción {action}"}}, status_code=404)
+
+        @app.post(API_PREFIX + "/cachedContents")
+        async def create_cache(request: Request) -> dict:
+            body = await request.json()
+            self.requests.append(ReceivedRequest("POST", body.get("model"), "cachedContents", body))
+            self._caches += 1
+            return {"name": f"cachedContents/fake-{self._caches}", **body}
+
+        @app.patch(API_PREFIX + "/cachedContents/{cache_id}")
+        async def extend_cache(cache_id: str, request: Request) -> dict:
+            body = await request.json()
+            self.requests.append(ReceivedRequest("PATCH", None, "cachedContents", body))
+            return {"name": f"cachedContents/{cache_id}", **body}
+
+        return app
+
+    async def _stream(self, text: str, finish_reason: str, usage: dict) -> AsyncIterator[bytes]:
+        """Fragmentos SSE; el último trae finishReason y usageMetadata."""
+        await self._sleep(self.config.latency)
+        size = max(1, self.config.chunk_chars)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for index, chunk in enumerate(chunks):
+            if index:
+                await self._sleep(self.config.chunk_delay)
+            candidate: dict[str, Any] = {"content": {"role": "model", "parts": [{"text": chunk}]}}
+            data: dict[str, Any] = {"candidates": [candidate]}
+            if index == len(chunks) - 1:
+                candidate["finishReason"] = finish_reason
+                data["usageMetadata"] = usage
+            yield f"data: {json.dumps(data, ensure_ascii=False)}\r\n\r\n".encode()
+
+
+# ----------------- CLI -----------------
+
+
+def main() -> None:
+    """Levanta el servidor falso con uvicorn para pruebas de carga."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor falso de la API de Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:A:B | lognormal:MEDIANA:SIGMA")
+    parser.add_argument("--chunk-delay", default="fixed:0")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--max-tokens-rate", type=float, default=0.0)
+    parser.add_argument("--response-chars", type=int, default=6000)
+    args = parser.parse_args()
+
+    fake = FakeGemini(
+        FakeGeminiConfig(
+            seed=args.seed,
+            latency=parse_latency(args.latency),
+            chunk_delay=parse_latency(args.chunk_delay),
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+            max_tokens_rate=args.max_tokens_rate,
+            response_chars=args.response_chars,
+        )
+    )
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# backend/tests/test_analysis_jobs.py
+
+from datetime import datetime
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+
+from app.core.metrics import metrics
+from app.infrastructure import worker_metrics
+from app.infrastructure.job_store import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    Job,
+    JobStore,
+    JobStoreError,
+)
+from app.worker import tasks
+
+
+# --- Fixtures ---
+
+class JobStoreFalso:
+    """JobStore en memoria: registra las actualizaciones."""
+
+    def __init__(self, job: Job) -> None:
+        self.job = job
+        self.updates: list[str] = []
+        self.status_code: int | None = None
+
+    async def get(self, job_id: str) -> Job:
+        return self.job
+
+    async def update(self, job_id: str, status: str, **kwargs) -> Job:
+        self.updates.append(status)
+        self.status_code = kwargs.get("status_code")
+        return self.job
+
+class JobStoreSinRunning(JobStoreFalso):
+    """Falla al pasar a running (ej: Redis caído un instante)."""
+
+    async def update(self, job_id: str, status: str, **kwargs) -> Job:
+        if status == JOB_RUNNING:
+            raise JobStoreError("Redis no disponible")
+        return await super().update(job_id, status, **kwargs)
+
+class RedisMetricasFalso:
+    """Subconjunto de redis.asyncio usado por worker_metrics."""
+
+    def __init__(self) -> None:
+        self.datos: dict[bytes, bytes] = {}
+
+    async def set(self, clave: str, valor: bytes, ex: int) -> None:
+        self.datos[clave.encode("utf-8")] = valor
+
+    async def scan_iter(self, match: str):
+        for clave in list(self.datos):
+            if clave.decode("utf-8").startswith(match.rstrip("*")):
+                yield clave
+
+    async def mget(self, claves: list[bytes]) -> list[bytes | None]:
+        return [self.datos.get(clave) for clave in claves]
+
+def _job(status: str) -> Job:
+    now = datetime.now().isoformat()
+    return Job(id="abc", status=status, user_id=1, created_at=now, updated_at=now)
+
+# --- JobStore ---
+
+@pytest.mark.asyncio
+async def test_sin_redis_no_hay_modo_asincrono():
+    """
+    Con Redis desactivado el JobStore falla con JobStoreError
+    """
+    with pytest.raises(JobStoreError):
+        await JobStore().create(user_id=1)
+
+def test_job_terminado():
+    """
+    Solo succeeded y failed son estados finales
+    """
+    assert not _job(JOB_QUEUED).finished
+    assert _job(JOB_SUCCEEDED).finished
+
+# --- Worker ---
+
+def test_resultado_serializable():
+    """
+    Los datetime del resultado del servicio viajan como ISO 8601
+    """
+    ahora = datetime(2024, 1, 2, 3, 4, 5)
+    resultado = tasks._to_job_result({"success": True, "timestamp": ahora, "score": 80})
+    assert resultado == {"success": True, "timestamp": ahora.isoformat(), "score": 80}
+
+@pytest.mark.asyncio
+async def test_reentrega_de_job_terminado_no_lo_repite(monkeypatch):
+    """
+    Si el broker reentrega un job ya terminado, el worker no vuelve a analizar
+    """
+    store = JobStoreFalso(_job(JOB_SUCCEEDED))
+    monkeypatch.setattr(tasks, "JobStore", lambda: store)
+    await tasks._analyze("abc", "x = 1", usuario_id=1)
+    assert store.updates == []
+
+def test_soft_time_limit_marca_el_job_como_fallido(monkeypatch):
+    """
+    Al superar el soft time limit el job queda fallido con status 504
+    """
+    store = JobStoreFalso(_job(JOB_QUEUED))
+    monkeypatch.setattr(tasks, "JobStore", lambda: store)
+
+    def sesion_lenta():
+        raise SoftTimeLimitExceeded()
+
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", sesion_lenta)
+    tasks.analyze_code("abc", "x = 1", usuario_id=1)
+    assert store.updates == [JOB_RUNNING, JOB_FAILED]
+    assert store.status_code == 504
+
+@pytest.mark.asyncio
+async def test_error_al_pasar_a_running_marca_el_job_como_fallido(monkeypatch):
+    """
+    Si no se puede registrar el inicio, el job no queda "queued": se marca fallido sin analizar
+    """
+    store = JobStoreSinRunning(_job(JOB_QUEUED))
+    monkeypatch.setattr(tasks, "JobStore", lambda: store)
+
+    def sin_sesion():
+        raise AssertionError("no debe analizar")
+
+    monkeypatch.setattr(tasks, "AsyncSessionLocal", sin_sesion)
+    await tasks._analyze("abc", "x = 1", usuario_id=1)
+    assert store.updates == [JOB_FAILED]
+    assert store.status_code == 503
+
+@pytest.mark.asyncio
+async def test_metricas_del_worker_se_publican_en_redis(monkeypatch):
+    """
+    El snapshot de un proceso del worker queda disponible para GET /health/metrics/workers
+    """
+    redis = RedisMetricasFalso()
+    monkeypatch.setattr(worker_metrics, "get_redis", lambda: redis)
+    metrics.inc("analysis_jobs_total", status=JOB_SUCCEEDED)
+
+    await worker_metrics.publish_worker_metrics()
+    snapshots = await worker_metrics.worker_metrics_snapshots()
+    assert len(snapshots) == 1
+    (snapshot,) = snapshots.values()
+    assert snapshot["counters"] == metrics.snapshot()["counters"]
+    assert "published_at" in snapshot
@@ -0,0 +1,62 @@
+# backend/tests/test_analysis_report.py
+
+import pytest
+
+from app.application.analysis_report import (
+    AnalysisReport,
+    EdicionItem,
+    EditApplyError,
+    apply_edits,
+    resolve_edits,
+)
+
+
+CODIGO = "import os\n\ndef f(x):\n    y = x\n    return y\n"
+
+
+def _edicion(inicio: int, fin: int, reemplazo: str = "") -> EdicionItem:
+    return EdicionItem(linea_inicio=inicio, linea_fin=fin, reemplazo=reemplazo)
+
+# --- Aplicación ---
+
+def test_aplica_reemplazo_insercion_y_borrado():
+    """
+    Las ediciones usan los números de línea del original aunque cambien las líneas anteriores
+    """
+    ediciones = [
+        _edicion(1, 1),  # borra el import
+        _edicion(4, 5, "    return x"),
+        _edicion(3, 2, "# doc"),  # inserta antes de la línea 3
+    ]
+    assert apply_edits(CODIGO, ediciones) == "\n# doc\ndef f(x):\n    return x\n"
+
+def test_resolve_edits_completa_el_codigo_mejorado():
+    """
+    resolve_edits deja el resultado en codigo_mejorado
+    """
+    reporte = AnalysisReport(score=80, ediciones=[_edicion(4, 5, "    return x")])
+    assert resolve_edits(CODIGO, reporte).codigo_mejorado == "import os\n\ndef f(x):\n    return x\n"
+
+# --- Rechazos ---
+
+def test_rechaza_rangos_superpuestos():
+    """
+    Dos ediciones que comparten una línea no se aplican
+    """
+    with pytest.raises(EditApplyError, match="superpone"):
+        apply_edits(CODIGO, [_edicion(2, 4, "pass"), _edicion(4, 5, "    return x")])
+
+@pytest.mark.parametrize(("inicio", "fin"), [(5, 9), (8, 7), (4, 2)])
+def test_rechaza_rangos_fuera_del_archivo(inicio, fin):
+    """
+    Rangos que terminan después del archivo, empiezan más allá del final o están invertidos
+    """
+    with pytest.raises(EditApplyError, match="Rango inválido"):
+        apply_edits(CODIGO, [_edicion(inicio, fin, "pass")])
+
+def test_rechaza_resultado_que_no_parsea():
+    """
+    Una edición que deja Python inválido falla en la validación con ast.parse
+    """
+    with pytest.raises(EditApplyError, match="no es Python válido"):
+        apply_edits(CODIGO, [_edicion(5, 5, "    return (")])
@@ -0,0 +1,59 @@
+# backend/tests/test_analysis_router.py
+
+import asyncio
+
+import pytest
+
+from app.web.routers.analysis_router import _run_until_disconnect
+
+
+# --- Fixtures ---
+
+class RequestFalso:
+    """Request mínimo: se desconecta después de `checks` consultas."""
+
+    def __init__(self, checks: int) -> None:
+        self.checks = checks
+
+    async def is_disconnected(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+@pytest.fixture(autouse=True)
+def _poll_rapido(monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "ANALYSIS_DISCONNECT_POLL_INTERVAL", 0.01)
+
+# --- Desconexión del cliente ---
+
+@pytest.mark.asyncio
+async def test_termina_si_el_cliente_sigue_conectado():
+    """
+    Con el cliente conectado se devuelve el resultado de la tarea
+    """
+    async def analisis():
+        await asyncio.sleep(0.05)
+        return {"success": True}
+
+    completed, resultado = await _run_until_disconnect(RequestFalso(checks=100), analisis())
+    assert completed
+    assert resultado == {"success": True}
+
+@pytest.mark.asyncio
+async def test_cancela_si_el_cliente_se_desconecta():
+    """
+    Si el cliente se va, la tarea en curso se cancela y no hay resultado
+    """
+    cancelada = asyncio.Event()
+
+    async def analisis():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelada.set()
+            raise
+
+    completed, resultado = await _run_until_disconnect(RequestFalso(checks=2), analisis())
+    assert not completed
+    assert resultado is None
+    assert cancelada.is_set()
@@ -0,0 +1,48 @@
+# backend/tests/test_code_normalizer.py
+
+from app.application.code_normalizer import KIND_AST, KIND_RAW, code_fingerprint
+
+
+CODIGO = '''def suma(a, b):
+    """Suma dos números."""
+    return a + b
+'''
+
+# --- Misma clave ante cambios de formato ---
+
+def test_ignora_comentarios_espacios_y_comillas():
+    """
+    Comentarios, espacios, comillas y saltos de línea finales no cambian la clave
+    """
+    variante = "# utilidades\ndef suma(a,b):\n  '''Suma dos números.'''\n  return (a+b)  # total\n\n\n"
+    assert code_fingerprint(variante) == code_fingerprint(CODIGO)
+    assert code_fingerprint(CODIGO).kind == KIND_AST
+
+def test_docstrings_canonicos_opcionales():
+    """
+    El formato de un docstring solo se ignora con canonical_docstrings
+    """
+    variante = CODIGO.replace('"""Suma dos números."""', '"""Suma dos\n    números."""')
+    assert code_fingerprint(variante) == code_fingerprint(CODIGO)
+    assert code_fingerprint(variante, canonical_docstrings=False) != code_fingerprint(
+        CODIGO, canonical_docstrings=False
+    )
+
+def test_cambio_de_codigo_cambia_la_clave():
+    """
+    Un cambio real (operador, nombre o texto de un string) produce otra clave
+    """
+    assert code_fingerprint(CODIGO.replace("a + b", "a - b")) != code_fingerprint(CODIGO)
+    assert code_fingerprint(CODIGO.replace("Suma dos", "Resta dos")) != code_fingerprint(CODIGO)
+
+# --- Fallback ---
+
+def test_codigo_invalido_usa_hash_del_texto():
+    """
+    El código que no parsea cae al hash del texto (solo normaliza finales de línea)
+    """
+    invalido = "def suma(a, b:\n    return a + b"
+    huella = code_fingerprint(invalido)
+    assert huella.kind == KIND_RAW
+    assert code_fingerprint(invalido.replace("\n", "\r\n") + "   \n") == huella
+    assert code_fingerprint(invalido + "  # otro") != huella
@@ -1,21 +1,22 @@
 # backend/tests/test_embeddings.py
 
+import httpx
 import pytest
-import asyncio
-from httpx import AsyncClient
-from uuid import uuid4
 from fastapi import status
-from backend.app.main import app
-from backend.app.application.embeddings_service import EmbeddingsService
-from backend.app.infrastructure.gemini_client import GeminiClient
-from backend.app.application.indices_vectoriales import embedding_index
+
+from app.main import app
+from app.web.dependencies import get_gemini_client
+
 
 # --- Fixtures ---
 
 @pytest.fixture
-async def async_client():
-    async with AsyncClient(app=app, base_url="http://testserver") as client:
+async def async_client(gemini_client):
+    app.dependency_overrides[get_gemini_client] = lambda: gemini_client
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
         yield client
+    app.dependency_overrides.clear()
 
 @pytest.fixture
 def test_texts():
@@ -25,69 +26,76 @@ def test_texts():
         "FastAPI y embeddings con Gemini"
     ]
 
-# Fixture para servicio de embeddings real o mock
-@pytest.fixture
-def embeddings_service():
-    client = GeminiClient(api_key="TEST_API_KEY")  # Reemplazar por ENV real si se desea
-    return EmbeddingsService(client=client, index=embedding_index)
-
 # --- Tests Unitarios ---
 
 @pytest.mark.asyncio
-async def test_generar_embedding(embeddings_service, test_texts):
+async def test_generar_embedding(gemini_client, test_texts):
     """
-    Verifica que el servicio genere vectores de embedding con la longitud correcta
+    Verifica que el cliente genere vectores de embedding con la longitud correcta
     """
     for texto in test_texts:
-        vector = await embeddings_service.generar_embedding(texto)
+        vector = await gemini_client.create_embedding(texto)
         assert isinstance(vector, list)
         assert all(isinstance(x, float) for x in vector)
-        assert len(vector) > 0
+        assert len(vector) == 768
 
 @pytest.mark.asyncio
-async def test_agregar_y_buscar_en_index(embeddings_service):
+async def test_embeddings_batch_en_orden(gemini_client, fake_gemini, test_texts):
     """
-    Agrega vectores al índice local y verifica búsqueda de similitud
+    batchEmbedContents devuelve un vector por texto, en el mismo orden, en un solo request
     """
-    texto = "Prueba de embeddings"
-    vector = await embeddings_service.generar_embedding(texto)
-    vector_id = str(uuid4())
-    embedding_index.add_vector(vector_id, vector, {"texto": texto})
-
-    resultados = embedding_index.search_similar(vector, top_k=1)
-    assert resultados
-    assert resultados[0][0] == vector_id
-    assert resultados[0][1] > 0.9  # Esperamos alta similitud exacta
+    resultados = await gemini_client.create_embeddings_batch(test_texts)
+    assert [r.index for r in resultados] == [0, 1, 2]
+    assert all(r.ok for r in resultados)
+    assert resultados[0].values == await gemini_client.create_embedding(test_texts[0])
+    assert fake_gemini.count("batchEmbedContents") == 1
 
 @pytest.mark.asyncio
-async def test_endpoint_embeddings(async_client):
+async def test_embeddings_batch_texto_vacio(gemini_client, fake_gemini):
     """
-    Testea el endpoint /embeddings que reciba un texto y devuelva vector
+    Los textos vacíos fallan localmente sin enviarse a la API
     """
-    payload = {"texto": "Test endpoint embeddings"}
-    response = await async_client.post("/embeddings", json=payload)
-    assert response.status_code == status.HTTP_200_OK
-    data = response.json()
-    assert "vector" in data
-    assert isinstance(data["vector"], list)
-    assert all(isinstance(x, float) for x in data["vector"])
+    resultados = await gemini_client.create_embeddings_batch(["hola", "   "])
+    assert resultados[0].ok
+    assert not resultados[1].ok
+    assert len(fake_gemini.requests[0].body["requests"]) == 1
 
 @pytest.mark.asyncio
-async def test_busqueda_similar_endpoint(async_client):
+async def test_embeddings_batch_reintenta_429(gemini_client, fake_gemini, test_texts):
     """
-    Agrega un vector al index y luego prueba búsqueda desde endpoint
+    Un 429 transitorio se reintenta y el batch termina bien
     """
-    texto = "Texto para buscar similar"
-    vector_id = str(uuid4())
-    vector = [0.1, 0.2, 0.3, 0.4]  # Mock simple para test
-    embedding_index.add_vector(vector_id, vector, {"texto": texto})
+    fake_gemini.enqueue(429)
+    resultados = await gemini_client.create_embeddings_batch(test_texts)
+    assert all(r.ok for r in resultados)
+    assert fake_gemini.count("batchEmbedContents") == 2
 
-    payload = {"vector": vector, "top_k": 1}
-    response = await async_client.post("/embeddings/search", json=payload)
+@pytest.mark.asyncio
+async def test_endpoint_embeddings(async_client, test_texts):
+    """
+    Testea el endpoint /embeddings/ que recibe textos y devuelve un vector por texto
+    """
+    response = await async_client.post("/embeddings/", json={"texts": test_texts})
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
-    assert len(data) == 1
-    assert data[0]["id"] == vector_id
-    assert data[0]["similarity"] > 0
+    assert data["count"] == len(test_texts)
+    assert data["failed"] == []
+    assert all(len(vector) == 768 for vector in data["embeddings"])
 
+@pytest.mark.asyncio
+async def test_endpoint_embeddings_error_gemini(async_client, fake_gemini):
+    """
+    Si Gemini rechaza el batch (400) el endpoint responde 502 sin filtrar detalles
+    """
+    fake_gemini.enqueue(400)
+    response = await async_client.post("/embeddings/", json={"texts": ["Hola"]})
+    assert response.status_code == status.HTTP_502_BAD_GATEWAY
 
+@pytest.mark.asyncio
+async def test_endpoint_embeddings_textos_vacios(async_client, fake_gemini):
+    """
+    Si todos los textos están vacíos el endpoint responde 400 sin llamar a Gemini
+    """
+    response = await async_client.post("/embeddings/", json={"texts": ["", "   "]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert fake_gemini.requests == []
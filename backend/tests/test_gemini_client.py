@@ -0,0 +1,172 @@
+# backend/tests/test_gemini_client.py
+
+import asyncio
+import math
+
+import pytest
+
+from app.application.analysis_report import parse_report
+from app.core.config import settings
+from app.infrastructure import gemini_client as gemini_module
+from app.infrastructure.gemini_client import (
+    OUTPUT_JSON,
+    GeminiAPIError,
+    GenerationResult,
+    estimate_tokens,
+    generation_budget,
+)
+
+
+CODIGO = "def suma(a, b):\n    return a + b\n"
+
+# --- Análisis bloqueante ---
+
+@pytest.mark.asyncio
+async def test_analisis_markdown(gemini_client, fake_gemini):
+    """
+    generateContent devuelve el markdown con score, código y tokens consumidos
+    """
+    resultado = await gemini_client.analyze_code(CODIGO)
+    assert "Score de Calidad:" in resultado.text
+    assert CODIGO.strip() in resultado.text
+    assert resultado.finish_reason == "STOP"
+    assert resultado.usage.total_tokens > 0
+    assert fake_gemini.count("generateContent") == 1
+
+@pytest.mark.asyncio
+async def test_analisis_json_cumple_esquema(gemini_client, fake_gemini):
+    """
+    En modo JSON se envía el responseSchema y la respuesta valida contra AnalysisReport
+    """
+    resultado = await gemini_client.analyze_code(CODIGO, output=OUTPUT_JSON)
+    reporte = parse_report(resultado.text)
+    assert reporte.codigo_mejorado.strip() == CODIGO.strip()
+    config = fake_gemini.requests[-1].body["generationConfig"]
+    assert config["responseMimeType"] == "application/json"
+
+@pytest.mark.asyncio
+async def test_continuacion_tras_max_tokens(gemini_client, fake_gemini):
+    """
+    Un corte por MAX_TOKENS se completa con una continuación sin repetir texto
+    """
+    fake_gemini.config.max_tokens_rate = 1.0
+    resultado = await gemini_client.analyze_code(CODIGO)
+    assert resultado.finish_reason == "STOP"
+    assert resultado.text.count("## 🐛 Bugs Potenciales") == 1
+    assert "## 📝 Cambios Realizados" in resultado.text
+    assert fake_gemini.count("generateContent") == 2
+
+@pytest.mark.asyncio
+async def test_reintenta_5xx(gemini_client, fake_gemini):
+    """
+    Un 503 transitorio se reintenta con backoff
+    """
+    fake_gemini.enqueue(503)
+    resultado = await gemini_client.analyze_code(CODIGO)
+    assert resultado.finish_reason == "STOP"
+    assert fake_gemini.count("generateContent") == 2
+
+@pytest.mark.asyncio
+async def test_error_400_no_se_reintenta(gemini_client, fake_gemini):
+    """
+    Un 400 no es transitorio: falla de inmediato con GeminiAPIError
+    """
+    fake_gemini.enqueue(400)
+    with pytest.raises(GeminiAPIError) as exc_info:
+        await gemini_client.analyze_code(CODIGO)
+    assert exc_info.value.status_code == 400
+    assert fake_gemini.count("generateContent") == 1
+
+@pytest.mark.asyncio
+async def test_cache_de_instrucciones_se_reutiliza(gemini_client, fake_gemini, monkeypatch):
+    """
+    Las instrucciones fijas se cachean una vez y los análisis siguientes las referencian
+    """
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 0)
+    await gemini_client.analyze_code(CODIGO)
+    await gemini_client.analyze_code(CODIGO)
+    assert fake_gemini.count("cachedContents") == 1
+    body = fake_gemini.requests[-1].body
+    assert body["cachedContent"].startswith("cachedContents/")
+    assert "systemInstruction" not in body
+
+@pytest.mark.asyncio
+async def test_cache_de_instrucciones_bajo_el_minimo(gemini_client, fake_gemini, monkeypatch):
+    """
+    Instrucciones por debajo del mínimo cacheable van inline sin intentar crear el caché
+    """
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_ENABLED", True)
+    await gemini_client.analyze_code(CODIGO)
+    assert fake_gemini.count("cachedContents") == 0
+    assert "systemInstruction" in fake_gemini.requests[-1].body
+
+# --- Presupuesto de salida ---
+
+@pytest.mark.asyncio
+async def test_codigo_maximo_cabe_en_el_techo_del_rol_anonimo(gemini_client, fake_gemini):
+    """
+    El código más largo que acepta la API (40000 chars) no queda acotado por el techo anónimo
+    """
+    codigo = ("x = 1\n" * 8000)[:40000]
+    budget = generation_budget(codigo)
+    visible = settings.GEMINI_OUTPUT_TOKENS_BASE + math.ceil(
+        estimate_tokens(codigo) * settings.GEMINI_OUTPUT_TOKENS_PER_INPUT_TOKEN
+    )
+    assert budget.max_output_tokens == visible + budget.thinking_budget
+
+    resultado = await gemini_client.analyze_code(codigo)
+    assert resultado.finish_reason == "STOP"
+    assert fake_gemini.count("generateContent") == 1
+    config = fake_gemini.requests[-1].body["generationConfig"]
+    assert config["maxOutputTokens"] == budget.max_output_tokens
+
+# --- Streaming ---
+
+@pytest.mark.asyncio
+async def test_stream_emite_fragmentos(gemini_client, fake_gemini):
+    """
+    streamGenerateContent emite varios fragmentos y el resumen trae finishReason y tokens
+    """
+    fake_gemini.config.chunk_chars = 200
+    resumen = GenerationResult()
+    fragmentos = [f async for f in gemini_client.stream_analysis(CODIGO, summary=resumen)]
+    assert len(fragmentos) > 1
+    assert "".join(fragmentos) == resumen.text
+    assert resumen.finish_reason == "STOP"
+    assert resumen.usage.total_tokens > 0
+
+# --- Hedging ---
+
+@pytest.mark.asyncio
+async def test_hedge_cierra_el_stream_perdedor(gemini_client, monkeypatch):
+    """
+    El stream perdedor de un hedge se cierra aunque ya hubiera emitido su primer fragmento
+    """
+    cerrados: list[str] = []
+
+    async def stream_falso(nombre: str):
+        try:
+            yield f"{nombre}-1"
+            yield f"{nombre}-2"
+        finally:
+            cerrados.append(nombre)
+
+    async def abrir(nombre: str):
+        stream = stream_falso(nombre)
+        return stream, await stream.__anext__(), GenerationResult(text=nombre)
+
+    ganador = asyncio.ensure_future(abrir("primario"))
+    perdedor = asyncio.ensure_future(abrir("hedge"))
+    await asyncio.gather(ganador, perdedor)
+
+    async def carrera(*args):
+        return ganador, [perdedor]
+
+    monkeypatch.setattr(gemini_module, "hedge_delay", lambda model, mode: 0.1)
+    monkeypatch.setattr(gemini_module, "_race_hedged", carrera)
+    summary = GenerationResult()
+    stream = gemini_client._stream_first(CODIGO, "gemini-2.5-flash", summary, generation_budget(CODIGO))
+    assert [texto async for texto in stream] == ["primario-1", "primario-2"]
+    assert sorted(cerrados) == ["hedge", "primario"]
+    assert summary.text == "primario"
@@ -0,0 +1,146 @@
+# backend/tests/test_minhash.py
+
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.application.analysis_service import AnalysisService
+from app.application.minhash import (
+    LSHIndex,
+    band_hashes,
+    estimate_jaccard,
+    minhash_signature,
+    pack_signature,
+    unpack_signature,
+)
+from app.infrastructure.analysis_minhash import find_lsh_candidates
+from app.infrastructure.gemini_client import GenerationResult
+
+
+CODIGO = "\n".join(
+    f"def funcion_{i}(valor, limite={i}):\n"
+    f"    if valor > limite:\n"
+    f"        return valor * {i} + len(str(limite))\n"
+    f"    return [x for x in range(valor) if x % {i + 2}]\n"
+    for i in range(30)
+)
+
+# --- Firmas ---
+
+def test_firma_estable_y_compacta():
+    """
+    La misma entrada da la misma firma, y empaquetada ocupa 4 bytes por posición
+    """
+    firma = minhash_signature(CODIGO)
+    assert firma == minhash_signature(CODIGO)
+    assert len(firma) == 128
+    assert len(pack_signature(firma)) == 512
+    assert unpack_signature(pack_signature(firma)) == firma
+    assert minhash_signature("   \n# solo un comentario\n") is None
+
+def test_formato_y_cambios_menores_son_casi_duplicados():
+    """
+    Comentarios y espacios no cuentan; un cambio pequeño mantiene alta similitud
+    """
+    firma = minhash_signature(CODIGO)
+    reformateado = "# cabecera\n" + CODIGO.replace("    ", "  ").replace(" * ", "*")
+    assert estimate_jaccard(firma, minhash_signature(reformateado)) == 1.0
+
+    editado = CODIGO.replace("return valor * 7 +", "return valor * 8 +")
+    assert estimate_jaccard(firma, minhash_signature(editado)) >= 0.9
+
+    otro = "class Pila:\n    def __init__(self):\n        self.items = []\n"
+    assert estimate_jaccard(firma, minhash_signature(otro)) < 0.2
+
+# --- Índice LSH ---
+
+def test_indice_encuentra_el_casi_duplicado():
+    """
+    El índice devuelve el casi duplicado y acota los candidatos verificados
+    """
+    index = LSHIndex(bands=16)
+    index.add(1, minhash_signature(CODIGO))
+    index.add(2, minhash_signature("x = 1\ny = 2\nprint(x + y)\n"))
+    assert len(index) == 2
+
+    editado = CODIGO.replace("return valor * 7 +", "return valor * 8 +")
+    resultado = index.query(minhash_signature(editado), threshold=0.9)
+    assert resultado.match is not None and resultado.match.item_id == 1
+    assert resultado.candidates <= 2
+
+    resultado = index.query(minhash_signature(CODIGO), threshold=0.9, max_candidates=0)
+    assert resultado.match is None and resultado.candidates == 0
+
+def test_bandas_deben_dividir_la_firma():
+    """
+    bands debe dividir num_perm; los buckets caben en BIGINT
+    """
+    firma = minhash_signature(CODIGO)
+    buckets = band_hashes(firma, 16)
+    assert len(buckets) == 16
+    assert all(-(2 ** 63) <= b < 2 ** 63 for b in buckets)
+    with pytest.raises(ValueError):
+        band_hashes(firma, 10)
+
+# --- Persistencia ---
+
+class SesionFalsa:
+    """Sesión de DB mínima: guarda los registros agregados y las consultas ejecutadas."""
+
+    def __init__(self) -> None:
+        self.added: list = []
+        self.statements: list = []
+
+    def add(self, registro) -> None:
+        registro.id = len(self.added) + 1
+        self.added.append(registro)
+
+    async def flush(self) -> None:
+        pass
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return ResultadoVacio()
+
+class ResultadoVacio:
+    def all(self) -> list:
+        return []
+
+@pytest.mark.asyncio
+async def test_casi_duplicado_guarda_contenido_y_referencia(monkeypatch):
+    """
+    Un análisis reutilizado guarda su propia copia del resultado y la referencia al original
+    """
+    db = SesionFalsa()
+    service = AnalysisService(db=db)
+
+    async def sin_contadores(usuario_id):
+        return None
+
+    monkeypatch.setattr(service, "_update_user_counters", sin_contadores)
+    generacion = GenerationResult(text="## Análisis", model="gemini-2.5-flash")
+    await service._persist_analysis(1, CODIGO, "x = 1", "## Análisis", 80, generacion)
+    await service._persist_analysis(1, CODIGO, "x = 1", "## Análisis", 80, generacion, duplicate_of=1)
+
+    original, duplicado = db.added
+    assert original.analysis_result == "## Análisis" and original.duplicate_of_id is None
+    assert duplicado.duplicate_of_id == 1
+    assert duplicado.analysis_result == "## Análisis" and duplicado.code_improved == "x = 1"
+    assert duplicado.quality_score == 80
+
+@pytest.mark.asyncio
+async def test_candidatos_lsh_ordenados_antes_del_limite():
+    """
+    El límite de candidatos se aplica sobre los que comparten más bandas (y luego los más recientes)
+    """
+    db = SesionFalsa()
+    await find_lsh_candidates(db, band_hashes(minhash_signature(CODIGO), 16), max_candidates=5, user_id=1)
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    assert "GROUP BY analysis_lsh_bands.analysis_id" in sql
+    assert "ORDER BY count(*) DESC, analysis_lsh_bands.analysis_id DESC" in sql
+    assert sql.index("ORDER BY") < sql.index("LIMIT")
@@ -0,0 +1,163 @@
+# backend/tests/test_model_router.py
+
+import asyncio
+
+import pytest
+
+from app.application.analysis_service import AnalysisService
+from app.application.model_router import (
+    TIER_LITE,
+    TIER_STANDARD,
+    ModelRouter,
+    is_fallback_error,
+    profile_code,
+)
+from app.core.config import settings
+from app.infrastructure.gemini_client import (
+    GeminiAPIError,
+    GeminiConfigError,
+    GeminiTimeoutError,
+    GeminiUnavailableError,
+    GenerationResult,
+)
+
+
+CODIGO = """def f(x):
+    if x and x > 1:
+        for i in range(x):
+            print(i)
+
+    return x
+"""
+
+ANIDADO = """def a():
+    def b():
+        def c():
+            return 1
+        return c
+    return b
+"""
+
+
+def _router(**kwargs) -> ModelRouter:
+    opciones = {"standard_model": "std", "lite_model": "lite", "fallback_models": ["lite", "fb"], "enabled": True}
+    return ModelRouter(**{**opciones, **kwargs})
+
+# --- Perfil ---
+
+def test_perfil_cuenta_ramas_y_anidamiento():
+    """
+    if, and y for suman puntos de decisión; las líneas vacías no cuentan
+    """
+    perfil = profile_code(CODIGO)
+    assert perfil.parsed
+    assert perfil.lines == 5
+    assert perfil.branches == 3
+    assert perfil.complexity == 4
+    assert perfil.max_depth == 1
+    assert profile_code(ANIDADO).max_depth == 3
+
+def test_perfil_codigo_que_no_parsea():
+    """
+    Un snippet roto se marca parsed=False y conserva el conteo de líneas
+    """
+    perfil = profile_code("def f(:\n    return\n")
+    assert not perfil.parsed
+    assert perfil.lines == 2
+    assert perfil.nodes == 0
+
+# --- Enrutado ---
+
+def test_snippet_trivial_va_al_tier_lite():
+    """
+    Código corto y simple usa el modelo lite; la cadena no repite modelos
+    """
+    route = _router().route(CODIGO)
+    assert route.tier == TIER_LITE
+    assert route.models == ("lite", "fb")
+    assert route.primary == "lite"
+
+@pytest.mark.parametrize("codigo", [ANIDADO, "def f(:\n", "x = 1\n" * 31])
+def test_codigo_no_trivial_va_al_tier_standard(codigo):
+    """
+    Anidamiento profundo, código que no parsea o demasiadas líneas usan el modelo standard
+    """
+    route = _router().route(codigo)
+    assert route.tier == TIER_STANDARD
+    assert route.models == ("std", "lite", "fb")
+
+def test_routing_deshabilitado():
+    """
+    Con el routing deshabilitado hasta un snippet trivial va al standard
+    """
+    route = _router(enabled=False, fallback_models=[]).route(CODIGO)
+    assert route.tier == TIER_STANDARD
+    assert route.models == ("std",)
+
+# --- Errores con fallback ---
+
+@pytest.mark.parametrize(
+    ("error", "esperado"),
+    [
+        (GeminiTimeoutError("timeout"), True),
+        (GeminiUnavailableError("circuito abierto", retry_after=30), True),
+        (GeminiAPIError(429, "cuota"), True),
+        (GeminiAPIError(503, "no disponible"), True),
+        (GeminiAPIError(400, "request inválido"), False),
+        (GeminiConfigError("API key inválida"), False),
+        (ValueError("otro"), False),
+    ],
+)
+def test_errores_que_justifican_fallback(error, esperado):
+    """
+    Timeouts, circuito abierto y 429/5xx pasan al siguiente modelo; errores del request no
+    """
+    assert is_fallback_error(error) is esperado
+
+# --- Deadline de la cadena ---
+
+class ClienteLento:
+    """Cliente falso: cada modelo tarda lo indicado en `demoras` (o falla con el error)."""
+
+    def __init__(self, demoras: dict) -> None:
+        self.demoras = demoras
+        self.llamadas: list[str] = []
+
+    async def analyze_code(self, code, model, role=None, output=None):
+        self.llamadas.append(model)
+        demora = self.demoras[model]
+        if isinstance(demora, Exception):
+            raise demora
+        await asyncio.sleep(demora)
+        return GenerationResult(text="ok", model=model, finish_reason="STOP")
+
+@pytest.fixture
+def deadline_corto(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_FALLBACK_DEADLINE", 0.2)
+    monkeypatch.setattr(settings, "GEMINI_FALLBACK_MIN_REMAINING", 0.1)
+
+@pytest.mark.asyncio
+async def test_timeout_del_principal_no_reinicia_el_reloj(deadline_corto):
+    """
+    Si el principal agota el deadline, el fallback no se intenta y se propaga el timeout
+    """
+    cliente = ClienteLento({"std": 60, "lite": 0, "fb": 0})
+    route = _router().route(ANIDADO)
+    with pytest.raises(GeminiTimeoutError):
+        await asyncio.wait_for(AnalysisService()._analyze_with_fallback(cliente, ANIDADO, route, None), 5)
+    assert cliente.llamadas == ["std"]
+
+@pytest.mark.asyncio
+async def test_fallback_usa_el_tiempo_restante(deadline_corto):
+    """
+    Un fallo rápido deja tiempo al siguiente modelo, que también queda acotado por el deadline
+    """
+    cliente = ClienteLento({"std": GeminiAPIError(503, "no disponible"), "lite": 60, "fb": 0})
+    route = _router().route(ANIDADO)
+    with pytest.raises(GeminiTimeoutError):
+        await asyncio.wait_for(AnalysisService()._analyze_with_fallback(cliente, ANIDADO, route, None), 5)
+    assert cliente.llamadas == ["std", "lite"]
+
+    cliente = ClienteLento({"std": GeminiAPIError(503, "no disponible"), "lite": 0, "fb": 0})
+    generacion = await AnalysisService()._analyze_with_fallback(cliente, ANIDADO, route, None)
+    assert generacion.model == "lite"
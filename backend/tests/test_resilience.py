@@ -0,0 +1,177 @@
+# backend/tests/test_resilience.py
+
+import asyncio
+
+import pytest
+
+from app.infrastructure import resilience
+from app.infrastructure.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    FifoLimiter,
+    HedgeBudget,
+    RatePacer,
+    RetryPolicy,
+)
+
+
+# --- Fixtures ---
+
+class RelojFalso:
+    """Reloj monotónico controlado por el test; `sleep` lo adelanta sin esperar."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def reloj():
+    return RelojFalso()
+
+def _breaker(reloj: RelojFalso) -> CircuitBreaker:
+    return CircuitBreaker("test", failure_rate_threshold=0.5, min_calls=2, open_seconds=30, clock=reloj)
+
+def _abrir(breaker: CircuitBreaker) -> None:
+    for _ in range(2):
+        breaker.record_failure(breaker.before_call())
+
+# --- Retry ---
+
+def test_retry_after_prevalece_sobre_el_jitter(monkeypatch):
+    """
+    Retry-After se respeta aunque supere max_delay o el jitter calculado
+    """
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    monkeypatch.setattr(resilience.random, "uniform", lambda a, b: b)
+
+    assert policy.next_delay(1.0) == 3.0
+    assert policy.next_delay(1.0, retry_after=45.0) == 45.0
+    assert policy.next_delay(1.0, retry_after=2.0) == 3.0
+    assert not policy.allows(attempt=1, elapsed=20.0, delay=45.0)
+
+# --- Circuit breaker ---
+
+def test_breaker_abierto_semiabierto_cerrado(reloj):
+    """
+    El breaker se abre por tasa de fallos, pasa a half-open al vencer y un probe exitoso lo cierra
+    """
+    breaker = _breaker(reloj)
+    _abrir(breaker)
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    reloj.now += 30
+    assert breaker.state == CircuitState.HALF_OPEN
+    probe = breaker.before_call()
+    assert probe.probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # un solo probe simultáneo
+
+    breaker.record_success(probe)
+    assert breaker.state == CircuitState.CLOSED
+
+def test_breaker_probe_fallido_reabre(reloj):
+    """
+    Un probe fallido vuelve a abrir el circuito por otro período completo
+    """
+    breaker = _breaker(reloj)
+    _abrir(breaker)
+    reloj.now += 30
+    breaker.record_failure(breaker.before_call())
+    assert breaker.state == CircuitState.OPEN
+    reloj.now += 29
+    assert breaker.state == CircuitState.OPEN
+
+def test_breaker_llamada_admitida_en_cerrado_no_cuenta_como_probe(reloj):
+    """
+    Una llamada que empezó en CLOSED y termina en HALF_OPEN no cierra el circuito
+    """
+    breaker = _breaker(reloj)
+    lenta = breaker.before_call()
+    _abrir(breaker)
+    reloj.now += 30
+    assert breaker.state == CircuitState.HALF_OPEN
+    probe = breaker.before_call()
+
+    breaker.record_success(lenta)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    breaker.release(probe)
+    breaker.record_success(breaker.before_call())
+    assert breaker.state == CircuitState.CLOSED
+
+# --- Limitador FIFO ---
+
+@pytest.mark.asyncio
+async def test_limitador_respeta_orden_de_llegada():
+    """
+    Con el límite ocupado, los slots se entregan en orden de llegada
+    """
+    limiter = FifoLimiter("test", limit=1)
+    await limiter.acquire()
+    orden: list[int] = []
+
+    async def esperar(i: int) -> None:
+        await limiter.acquire(timeout=5)
+        orden.append(i)
+        await asyncio.sleep(0)
+        limiter.release()
+
+    tareas = [asyncio.create_task(esperar(i)) for i in range(5)]
+    await asyncio.sleep(0)
+    assert limiter.queued == 5
+
+    limiter.release()
+    await asyncio.gather(*tareas)
+    assert orden == [0, 1, 2, 3, 4]
+    assert limiter.inflight == 0
+
+# --- Pacing ---
+
+@pytest.mark.asyncio
+async def test_pacer_espacia_las_llamadas(reloj):
+    """
+    Sin ráfaga (1 request de capacidad a 60 RPM) las llamadas salen cada 1s
+    """
+    pacer = RatePacer("test", rpm=60, tpm=0, burst_seconds=1, clock=reloj, sleep=reloj.sleep)
+    esperas = [await pacer.acquire() for _ in range(3)]
+    assert esperas == [0.0, pytest.approx(1.0), pytest.approx(1.0)]
+
+@pytest.mark.asyncio
+async def test_pacer_rechaza_esperas_largas(reloj):
+    """
+    Si la cuota de tokens no alcanza dentro de max_wait se rechaza sin esperar
+    """
+    pacer = RatePacer("test", rpm=0, tpm=600, burst_seconds=1, clock=reloj, sleep=reloj.sleep)
+    await pacer.acquire(tokens=10)
+    with pytest.raises(resilience.RateWaitExceededError):
+        await pacer.acquire(tokens=10, max_wait=0.5)
+    assert reloj.sleeps == []
+
+# --- Hedging ---
+
+def test_presupuesto_de_hedges_se_agota():
+    """
+    Con 10% cada 10 requests originales se habilita un hedge; sin saldo se rechaza
+    """
+    budget = HedgeBudget(percent=10, max_balance=2)
+    assert not budget.try_spend()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    for _ in range(100):
+        budget.deposit()
+    assert budget.balance == pytest.approx(2.0)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
@@ -0,0 +1,61 @@
+# backend/tests/test_result_cache.py
+
+import pytest
+
+from app.core import json_codec
+from app.core.metrics import metrics
+from app.infrastructure.result_cache import TIER_MEMORY, ResultCache
+
+
+VALOR = {"text": "x" * 100, "model": "gemini-2.5-flash"}
+TAMANO = len(json_codec.dumps(VALOR))
+
+# --- Caché en memoria (Redis desactivado en los tests) ---
+
+@pytest.mark.asyncio
+async def test_hit_en_memoria():
+    """
+    Un valor guardado se recupera del nivel en memoria
+    """
+    cache = ResultCache("test", max_bytes=10 * TAMANO, ttl=60)
+    assert await cache.get("a") is None
+    await cache.set("a", VALOR)
+    hit = await cache.get("a")
+    assert hit.value == VALOR
+    assert hit.tier == TIER_MEMORY
+
+@pytest.mark.asyncio
+async def test_desaloja_lru_por_bytes():
+    """
+    Al superar max_bytes se desaloja la entrada usada hace más tiempo
+    """
+    cache = ResultCache("test", max_bytes=2 * TAMANO, ttl=60)
+    await cache.set("a", VALOR)
+    await cache.set("b", VALOR)
+    await cache.get("a")  # "b" pasa a ser la menos reciente
+    await cache.set("c", VALOR)
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert cache.size_bytes == 2 * TAMANO
+
+@pytest.mark.asyncio
+async def test_vence_por_ttl():
+    """
+    Una entrada vencida cuenta como miss y libera sus bytes
+    """
+    cache = ResultCache("test", max_bytes=10 * TAMANO, ttl=0)
+    await cache.set("a", VALOR)
+    assert await cache.get("a") is None
+    assert cache.size_bytes == 0
+
+@pytest.mark.asyncio
+async def test_exporta_hit_ratio():
+    """
+    El gauge result_cache_hit_ratio refleja hits sobre lookups
+    """
+    cache = ResultCache("test", max_bytes=10 * TAMANO, ttl=60)
+    await cache.get("a")
+    await cache.set("a", VALOR)
+    await cache.get("a")
+    gauges = metrics.snapshot()["gauges"]
+    assert gauges["result_cache_hit_ratio"][0]["value"] == 0.5
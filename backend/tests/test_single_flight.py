@@ -0,0 +1,204 @@
+# backend/tests/test_single_flight.py
+
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import LockError
+
+from app.core.metrics import metrics
+from app.infrastructure import single_flight
+from app.infrastructure.single_flight import SingleFlight
+
+
+VALOR = {"text": "resultado"}
+
+
+# --- Fixtures ---
+
+class LockFalso:
+    """Lock no bloqueante sobre RedisFalso con TTL (mismo contrato que redis.asyncio.lock.Lock)."""
+
+    def __init__(self, redis: "RedisFalso", name: str, timeout: float) -> None:
+        self.redis = redis
+        self.name = name
+        self.timeout = timeout
+        self.token = object()
+
+    async def acquire(self, blocking: bool = False) -> bool:
+        if self.redis._vigente(self.name) is not None:
+            return False
+        self.redis._guardar(self.name, self.token, self.timeout)
+        return True
+
+    async def reacquire(self) -> None:
+        if self.redis._vigente(self.name) is not self.token:
+            raise LockError("lock perdido")
+        self.redis._guardar(self.name, self.token, self.timeout)
+
+    async def release(self) -> None:
+        if self.redis._vigente(self.name) is not self.token:
+            raise LockError("lock perdido")
+        del self.redis.datos[self.name]
+
+
+class PubSubFalso:
+    def __init__(self, redis: "RedisFalso") -> None:
+        self.redis = redis
+        self.mensajes: asyncio.Queue = asyncio.Queue()
+        self.canales: set[str] = set()
+
+    async def subscribe(self, canal: str) -> None:
+        self.canales.add(canal)
+        self.redis.suscriptores.append(self)
+
+    async def get_message(self, ignore_subscribe_messages: bool, timeout: float):
+        try:
+            return await asyncio.wait_for(self.mensajes.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def reset(self) -> None:
+        self.redis.suscriptores.remove(self)
+
+
+class RedisFalso:
+    """Subconjunto de redis.asyncio usado por SingleFlight, en memoria y con TTL real."""
+
+    def __init__(self) -> None:
+        self.datos: dict[str, tuple[object, float]] = {}
+        self.suscriptores: list[PubSubFalso] = []
+
+    def _guardar(self, clave: str, valor: object, ttl: float) -> None:
+        self.datos[clave] = (valor, time.monotonic() + ttl)
+
+    def _vigente(self, clave: str) -> object | None:
+        valor, vence = self.datos.get(clave, (None, 0.0))
+        return valor if time.monotonic() < vence else None
+
+    def lock(self, name: str, timeout: float, thread_local: bool = True) -> LockFalso:
+        return LockFalso(self, name, timeout)
+
+    def pubsub(self) -> PubSubFalso:
+        return PubSubFalso(self)
+
+    async def set(self, clave: str, valor: bytes, px: int) -> None:
+        self._guardar(clave, valor, px / 1000)
+
+    async def get(self, clave: str):
+        return self._vigente(clave)
+
+    async def exists(self, clave: str) -> int:
+        return int(self._vigente(clave) is not None)
+
+    async def publish(self, canal: str, payload: bytes) -> None:
+        for pubsub in list(self.suscriptores):
+            if canal in pubsub.canales:
+                pubsub.mensajes.put_nowait({"type": "message", "data": payload})
+
+@pytest.fixture
+def redis(monkeypatch):
+    falso = RedisFalso()
+    monkeypatch.setattr(single_flight, "get_redis", lambda: falso)
+    monkeypatch.setattr(single_flight, "_FOLLOW_POLL_SECONDS", 0.02)
+    return falso
+
+def _flight(lock_ttl: float = 1.0) -> SingleFlight:
+    return SingleFlight("test", wait_timeout=2, lock_ttl=lock_ttl)
+
+def _llamadas(rol: str) -> float:
+    return metrics.counter_value("single_flight_calls_total", namespace="test", role=rol)
+
+async def _esperar_suscripcion(redis: RedisFalso) -> None:
+    while not redis.suscriptores:
+        await asyncio.sleep(0.005)
+
+# --- Líder ---
+
+@pytest.mark.asyncio
+async def test_lider_calcula_publica_y_libera(redis):
+    """
+    Sin otra llamada en curso se calcula, se deja el resultado para los rezagados y se libera el lock
+    """
+    flight = _flight()
+
+    async def calcular():
+        return VALOR
+
+    resultado = await flight.do("k", calcular)
+    assert resultado.value == VALOR
+    assert not resultado.shared
+    lock_key, result_key, _ = flight._keys("k")
+    assert await redis.exists(lock_key) == 0
+    assert await redis.get(result_key) is not None
+    assert _llamadas("leader") == 1
+
+# --- Seguidores entre workers ---
+
+@pytest.mark.asyncio
+async def test_seguidor_recibe_el_resultado_publicado(redis):
+    """
+    Otro worker con la misma clave espera al líder y recibe su resultado sin calcular
+    """
+    lider, seguidor = _flight(lock_ttl=0.1), _flight()
+    liberar = asyncio.Event()
+    calculos: list[str] = []
+
+    async def calcular(quien: str):
+        calculos.append(quien)
+        await liberar.wait()
+        return VALOR
+
+    tarea_lider = asyncio.create_task(lider.do("k", lambda: calcular("lider")))
+    await asyncio.sleep(0)
+    tarea_seguidor = asyncio.create_task(seguidor.do("k", lambda: calcular("seguidor")))
+    await _esperar_suscripcion(redis)
+    await asyncio.sleep(0.2)  # más que el TTL del lock: lo sostiene el heartbeat
+    liberar.set()
+
+    assert (await tarea_lider).shared is False
+    resultado = await tarea_seguidor
+    assert resultado.value == VALOR
+    assert resultado.shared
+    assert calculos == ["lider"]
+    assert _llamadas("redis") == 1
+
+@pytest.mark.asyncio
+async def test_seguidor_calcula_si_vence_el_lock_del_lider(redis):
+    """
+    Si el líder muere (sin heartbeat el lock vence) el seguidor calcula por su cuenta
+    """
+    lock_key, _, _ = _flight()._keys("k")
+    redis._guardar(lock_key, object(), 0.1)  # líder de otro worker que ya no renueva
+
+    async def calcular():
+        return VALOR
+
+    resultado = await _flight().do("k", calcular)
+    assert resultado.value == VALOR
+    assert not resultado.shared
+    assert _llamadas("fallback") == 1
+
+# --- Sin Redis ---
+
+@pytest.mark.asyncio
+async def test_sin_redis_coalescing_local(monkeypatch):
+    """
+    Con get_redis() en None las llamadas concurrentes del proceso comparten un solo cálculo
+    """
+    monkeypatch.setattr(single_flight, "get_redis", lambda: None)
+    flight = _flight()
+    calculos = 0
+
+    async def calcular():
+        nonlocal calculos
+        calculos += 1
+        await asyncio.sleep(0.01)
+        return VALOR
+
+    resultados = await asyncio.gather(*(flight.do("k", calcular) for _ in range(3)))
+    assert calculos == 1
+    assert [r.value for r in resultados] == [VALOR] * 3
+    assert sorted(r.shared for r in resultados) == [False, True, True]
+    assert _llamadas("leader") == 1
+    assert _llamadas("local") == 2
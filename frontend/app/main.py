@@ -1,11 +1,13 @@
 # frontend/app/main.py
 
+import json
 import os
 from datetime import datetime
 
 import requests
 import streamlit as st
 
+
 # Configuración de la página
 st.set_page_config(
     page_title="Neural Code Analyzer",
@@ -21,6 +23,16 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 # ----------------- HELPERS -----------------
 
 
+def quitar_codigo_mejorado(analisis: str) -> str:
+    """Quitar la sección "Código Mejorado" del markdown (se muestra aparte en un bloque copiable)."""
+    inicio = analisis.find("## ✨ Código Mejorado")
+    if inicio == -1:
+        return analisis
+    fin = analisis.find("## 📝", inicio)
+    resto = analisis[fin:] if fin != -1 else ""
+    return (analisis[:inicio].rstrip() + "\n\n" + resto).strip()
+
+
 def get_auth_headers() -> dict:
     """Obtener headers con token JWT si está logueado."""
     if "token" in st.session_state and st.session_state.token:
@@ -50,6 +62,46 @@ def get_user_stats() -> dict:
     return {"analisis_hoy": 0, "score_promedio": 0, "limite_diario": 5}
 
 
+class AnalisisStreamError(Exception):
+    """Error informado por el backend dentro del stream de análisis."""
+
+
+def consumir_stream_analisis(response: requests.Response, placeholder) -> dict:
+    """
+    Consume el stream SSE de /api/analysis/stream mostrando el avance.
+
+    Args:
+        response: Respuesta de requests abierta con stream=True
+        placeholder: Contenedor st.empty() donde se va renderizando el markdown
+
+    Returns:
+        Payload del evento "done" (mismo formato que POST /api/analysis/)
+
+    Raises:
+        AnalisisStreamError: Si el backend emite un evento "error"
+    """
+    evento = None
+    texto_parcial = ""
+    for linea in response.iter_lines(decode_unicode=True):
+        if not linea:
+            continue
+        if linea.startswith("event:"):
+            evento = linea[6:].strip()
+        elif linea.startswith("data:"):
+            data = json.loads(linea[5:])
+            if evento == "chunk":
+                texto_parcial += data.get("text", "")
+                placeholder.markdown(texto_parcial + " ▌")
+            elif evento == "done":
+                placeholder.empty()
+                return data
+            elif evento == "error":
+                placeholder.empty()
+                raise AnalisisStreamError(data.get("error", "Error desconocido"))
+    placeholder.empty()
+    raise AnalisisStreamError("El stream de análisis terminó sin resultado")
+
+
 # ----------------- SIDEBAR -----------------
 
 with st.sidebar:
@@ -274,58 +326,9 @@ if 'ultimo_analisis' in st.session_state and not analizar_button:
         # Análisis en markdown
         analisis_text = data.get("analisis", "No se recibió análisis")
         
-        # Extraer código mejorado del análisis
-        codigo_mejorado = None
-        import re
-        
-        # Intentar múltiples patrones para extraer el código
-        if "Código Mejorado" in analisis_text or "Codigo Mejorado" in analisis_text:
-            patterns = [
-                r'##\s*✨\s*Código Mejorado.*?```python\s*(.*?)\s*```',
-                r'✨\s*Código Mejorado.*?```python\s*(.*?)\s*```',
-                r'Código Mejorado.*?```python\s*(.*?)\s*```',
-                r'##\s*✨\s*Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                r'✨\s*Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                r'Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                # Sin especificador python
-                r'Código Mejorado.*?```\s*(def .*?)\s*```',
-                r'Codigo Mejorado.*?```\s*(def .*?)\s*```',
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, analisis_text, re.DOTALL | re.IGNORECASE)
-                if match:
-                    codigo_mejorado = match.group(1).strip()
-                    # Limpiar comentarios iniciales si existen
-                    if codigo_mejorado.startswith('#'):
-                        lines = codigo_mejorado.split('\n')
-                        # Encontrar la primera línea que no es comentario
-                        for i, line in enumerate(lines):
-                            if line.strip() and not line.strip().startswith('#'):
-                                codigo_mejorado = '\n'.join(lines[i:])
-                                break
-                    break
-        
-        # Eliminar la sección de código mejorado del análisis para evitar duplicación
-        if codigo_mejorado:
-            # Eliminar completamente la sección de código mejorado del texto de análisis
-            # Patrón principal: desde "✨" seguido de cualquier variación de "Código Mejorado" hasta "📝 Cambios"
-            analisis_sin_codigo = re.sub(
-                r'#+?\s*✨\s*[CcóÓ].*?(?=📝)',
-                '',
-                analisis_text,
-                flags=re.MULTILINE | re.DOTALL
-            )
-            
-            # Limpiar cualquier línea que solo contenga emoji ✨ con o sin letra
-            analisis_sin_codigo = re.sub(r'\n?\s*✨\s*[A-Za-z]?\s*\n?', '\n', analisis_sin_codigo)
-            
-            # Limpiar líneas vacías múltiples
-            analisis_sin_codigo = re.sub(r'\n{3,}', '\n\n', analisis_sin_codigo)
-            analisis_sin_codigo = re.sub(r'\s+$', '', analisis_sin_codigo, flags=re.MULTILINE)
-            st.markdown(analisis_sin_codigo.strip())
-        else:
-            st.markdown(analisis_text)
+        # Score y código mejorado vienen resueltos del backend
+        codigo_mejorado = data.get("codigo_mejorado")
+        st.markdown(quitar_codigo_mejorado(analisis_text) if codigo_mejorado else analisis_text)
         
         # Mostrar código mejorado en bloque copiable
         if codigo_mejorado:
@@ -376,6 +379,8 @@ if 'ultimo_analisis' in st.session_state and not analizar_button:
         with st.expander("ℹ️ Información del Análisis"):
             st.json({
                 "modelo_usado": data.get("modelo_usado", "N/A"),
+                "cache_hit": data.get("cache_hit", False),
+                "casi_duplicado_de": data.get("near_duplicate"),
                 "usuario_id": data.get("usuario_id", "Anónimo"),
                 "timestamp": data.get("timestamp", "N/A"),
                 "codigo_mejorado_disponible": codigo_mejorado is not None
@@ -391,16 +396,18 @@ if analizar_button:
             with st.spinner("🤖 Analizando tu código con Gemini 2.5 Flash... (puede tardar hasta 3 minutos)"):
                 try:
                     # Llamar al backend con token JWT si está logueado
-                    # Timeout extendido: Gemini 2.5 Flash con thinking puede tardar 2-3 min
+                    # Streaming SSE: los hallazgos aparecen a medida que Gemini los genera
+                    # Timeout de lectura entre fragmentos (Gemini con thinking puede demorar el primero)
                     response = requests.post(
-                        f"{BACKEND_URL}/api/analysis/",
+                        f"{BACKEND_URL}/api/analysis/stream",
                         json={"codigo": codigo_input},
                         headers=get_auth_headers(),
-                        timeout=200,  # 3+ minutos para análisis complejos
+                        stream=True,
+                        timeout=(10, 200),
                     )
                     
                     if response.status_code == 200:
-                        data = response.json()
+                        data = consumir_stream_analisis(response, st.empty())
                         
                         # Guardar en session_state para que persista después de rerun
                         st.session_state['ultimo_analisis'] = data
@@ -409,13 +416,8 @@ if analizar_button:
                         if 'historial_analisis' not in st.session_state:
                             st.session_state['historial_analisis'] = []
                         
-                        # Extraer score del análisis (si está disponible)
                         analisis_text = data.get("analisis", "")
-                        score = None
-                        import re
-                        score_match = re.search(r'Score de Calidad:\s*(\d+)/100', analisis_text)
-                        if score_match:
-                            score = int(score_match.group(1))
+                        score = data.get("score")
                         
                         # Agregar al historial
                         st.session_state['historial_analisis'].append({
@@ -435,58 +437,9 @@ if analizar_button:
                         # Análisis en markdown
                         analisis_text = data.get("analisis", "No se recibió análisis")
                         
-                        # Extraer código mejorado del análisis
-                        codigo_mejorado = None
-                        import re
-                        
-                        # Intentar múltiples patrones para extraer el código
-                        if "Código Mejorado" in analisis_text or "Codigo Mejorado" in analisis_text:
-                            patterns = [
-                                r'##\s*✨\s*Código Mejorado.*?```python\s*(.*?)\s*```',
-                                r'✨\s*Código Mejorado.*?```python\s*(.*?)\s*```',
-                                r'Código Mejorado.*?```python\s*(.*?)\s*```',
-                                r'##\s*✨\s*Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                                r'✨\s*Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                                r'Codigo Mejorado.*?```python\s*(.*?)\s*```',
-                                # Sin especificador python
-                                r'Código Mejorado.*?```\s*(def .*?)\s*```',
-                                r'Codigo Mejorado.*?```\s*(def .*?)\s*```',
-                            ]
-                            
-                            for pattern in patterns:
-                                match = re.search(pattern, analisis_text, re.DOTALL | re.IGNORECASE)
-                                if match:
-                                    codigo_mejorado = match.group(1).strip()
-                                    # Limpiar comentarios iniciales si existen
-                                    if codigo_mejorado.startswith('#'):
-                                        lines = codigo_mejorado.split('\n')
-                                        # Encontrar la primera línea que no es comentario
-                                        for i, line in enumerate(lines):
-                                            if line.strip() and not line.strip().startswith('#'):
-                                                codigo_mejorado = '\n'.join(lines[i:])
-                                                break
-                                    break
-                        
-                        # Eliminar la sección de código mejorado del análisis para evitar duplicación
-                        if codigo_mejorado:
-                            # Eliminar completamente la sección de código mejorado del texto de análisis
-                            # Patrón principal: desde "✨" seguido de cualquier variación de "Código Mejorado" hasta "📝 Cambios"
-                            analisis_sin_codigo = re.sub(
-                                r'#+?\s*✨\s*[CcóÓ].*?(?=📝)',
-                                '',
-                                analisis_text,
-                                flags=re.MULTILINE | re.DOTALL
-                            )
-                            
-                            # Limpiar cualquier línea que solo contenga emoji ✨ con o sin letra
-                            analisis_sin_codigo = re.sub(r'\n?\s*✨\s*[A-Za-z]?\s*\n?', '\n', analisis_sin_codigo)
-                            
-                            # Limpiar líneas vacías múltiples
-                            analisis_sin_codigo = re.sub(r'\n{3,}', '\n\n', analisis_sin_codigo)
-                            analisis_sin_codigo = re.sub(r'\s+$', '', analisis_sin_codigo, flags=re.MULTILINE)
-                            st.markdown(analisis_sin_codigo.strip())
-                        else:
-                            st.markdown(analisis_text)
+                        # Score y código mejorado vienen resueltos del backend
+                        codigo_mejorado = data.get("codigo_mejorado")
+                        st.markdown(quitar_codigo_mejorado(analisis_text) if codigo_mejorado else analisis_text)
                         
                         # Mostrar código mejorado en bloque copiable
                         if codigo_mejorado:
@@ -535,6 +488,8 @@ if analizar_button:
                         with st.expander("ℹ️ Información del Análisis"):
                             st.json({
                                 "modelo_usado": data.get("modelo_usado", "N/A"),
+                                "cache_hit": data.get("cache_hit", False),
+                                "casi_duplicado_de": data.get("near_duplicate"),
                                 "usuario_id": data.get("usuario_id", "Anónimo"),
                                 "timestamp": data.get("timestamp", "N/A"),
                                 "codigo_mejorado_disponible": codigo_mejorado is not None
@@ -543,6 +498,9 @@ if analizar_button:
                     else:
                         st.error(f"❌ Error {response.status_code}: {response.text}")
                         
+                except AnalisisStreamError as e:
+                    st.error(f"❌ {e}")
+
                 except requests.exceptions.Timeout:
                     st.error("⏱️ **Timeout**: El análisis excedió los 3 minutos.")
                     st.info("💡 **Sugerencias:**\n- Intenta de nuevo (Gemini puede estar ocupado)\n- El modelo está procesando tu código, a veces tarda más\n- Si persiste, divide el código en partes")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la normalización de código para las claves de caché
+
+Descripción: Mide, por llamada, `code_fingerprint` (parse + dump del AST) sobre
+código sintético del tamaño máximo aceptado (40k caracteres) contra el hash
+del texto que se usaba antes, y verifica que variantes de formato (comentarios,
+comillas, espacios, docstrings reindentados) den la misma clave.
+Uso: python scripts/bench_code_normalizer.py [--chars 40000] [--repeat 50]
+"""
+
+import argparse
+import hashlib
+import sys
+import timeit
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.application.code_normalizer import KIND_AST, code_fingerprint, normalize_text  # noqa: E402
+
+
+FUNCION = '''
+def procesar_{n}(items, umbral=10):
+    """Filtra los items mayores al umbral
+    y devuelve su suma."""
+    total = 0  # acumulador
+    for item in items:
+        if item > umbral and item % 2 == 0:
+            total += item * {n}
+        elif item < 0:
+            raise ValueError("item negativo")
+    return {{"total": total, "n": len(items)}}
+'''
+
+
+def synthetic_code(chars: int) -> str:
+    """Código Python válido de ~chars caracteres."""
+    partes, n = [], 0
+    while sum(len(p) for p in partes) < chars:
+        partes.append(FUNCION.format(n=n))
+        n += 1
+    return "".join(partes)[:chars].rsplit("\ndef ", 1)[0] + "\n"
+
+
+def reformat(code: str) -> str:
+    """Variante con otro formato: comentarios, comillas, espacios y docstrings."""
+    return (
+        "# encabezado agregado\n"
+        + code.replace('"', "'")
+        .replace("  # acumulador", "")
+        .replace("    y devuelve", "        y devuelve")
+        .replace("total = 0", "total=0")
+        + "\n\n\n"
+    )
+
+
+def per_call_ms(stmt, repeat: int) -> float:
+    """Mejor de 5 corridas, en milisegundos por llamada."""
+    return min(timeit.repeat(stmt, number=repeat, repeat=5)) / repeat * 1e3
+
+
+def main() -> int:
+    """Función principal."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, default=40000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    code = synthetic_code(args.chars)
+    variante = reformat(code)
+    print(f"🚀 Código sintético: {len(code):,} caracteres, {code.count(chr(10)):,} líneas")
+
+    original = code_fingerprint(code)
+    if original.kind != KIND_AST or code_fingerprint(variante) != original:
+        print("❌ La variante reformateada no produce la misma clave")
+        return 1
+    print("✅ Variante reformateada → misma clave")
+
+    rows = [
+        ("hash del texto", lambda: hashlib.sha256(normalize_text(code).encode("utf-8")).hexdigest()),
+        ("AST", lambda: code_fingerprint(code, canonical_docstrings=False)),
+        ("AST + docstrings", lambda: code_fingerprint(code)),
+        ("no parsea (raw)", lambda: code_fingerprint(code + "\ndef (")),
+    ]
+
+    print(f"{'clave':<20}{'ms/llamada':>12}")
+    for name, stmt in rows:
+        print(f"{name:<20}{per_call_ms(stmt, args.repeat):>12.2f}")
+
+    print("✅ Benchmark completado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark del codec JSON y del logging de respuestas de Gemini
+
+Descripción: Compara, por llamada, el decode de una respuesta de análisis y de
+batchEmbedContents con `json` (antes) vs `json_codec` (orjson si está
+instalado), y el costo de loguear la respuesta completa vs `json_codec.preview`.
+Uso: python scripts/bench_json_codec.py [--size-kb 200] [--repeat 200]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.core import json_codec  # noqa: E402
+
+
+def analysis_response(size_kb: int) -> bytes:
+    """Respuesta generateContent sintética con ~size_kb de markdown."""
+    text = ("## 🐛 Bugs Potenciales\n- índice fuera de rango en la línea 12\n" * 64)
+    text = (text * (size_kb * 1024 // len(text.encode("utf-8")) + 1))[: size_kb * 1024]
+    data = {
+        "candidates": [
+            {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}
+        ],
+        "usageMetadata": {"promptTokenCount": 1200, "candidatesTokenCount": 4000, "totalTokenCount": 5200},
+        "modelVersion": "gemini-2.5-flash",
+    }
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def embeddings_response(count: int = 100, dims: int = 768) -> bytes:
+    """Respuesta batchEmbedContents sintética (count vectores de dims floats)."""
+    vector = [0.0123456789 * (i % 97 - 48) for i in range(dims)]
+    return json.dumps({"embeddings": [{"values": vector} for _ in range(count)]}).encode("utf-8")
+
+
+def per_call_us(stmt, repeat: int) -> float:
+    """Mejor de 5 corridas, en microsegundos por llamada."""
+    return min(timeit.repeat(stmt, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main() -> int:
+    """Función principal."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    backend = "orjson" if json_codec.ORJSON_AVAILABLE else "json (orjson no instalado)"
+    print(f"🚀 Codec: {backend}")
+
+    analysis = analysis_response(args.size_kb)
+    embeddings = embeddings_response()
+    analysis_data = json.loads(analysis)
+    payload = {"requests": [{"content": {"parts": [{"text": "x" * 2000}]}}] * 100}
+
+    rows = [
+        ("decode análisis", lambda: json.loads(analysis), lambda: json_codec.loads(analysis)),
+        ("decode embeddings", lambda: json.loads(embeddings), lambda: json_codec.loads(embeddings)),
+        ("encode batch", lambda: json.dumps(payload).encode("utf-8"), lambda: json_codec.dumps(payload)),
+        ("log respuesta", lambda: f"Formato inesperado: {analysis_data}", lambda: f"Formato inesperado: {json_codec.preview(analysis_data)}"),
+    ]
+
+    print(f"{'operación':<20}{'antes (µs)':>14}{'después (µs)':>16}{'speedup':>10}")
+    for name, before, after in rows:
+        t_before = per_call_us(before, args.repeat)
+        t_after = per_call_us(after, args.repeat)
+        print(f"{name:<20}{t_before:>14.1f}{t_after:>16.1f}{t_before / t_after:>9.1f}x")
+
+    print("✅ Benchmark completado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
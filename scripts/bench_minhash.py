@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark de firmas MinHash y búsqueda LSH de casi duplicados
+
+Descripción: Mide el costo de la firma sobre código del tamaño máximo aceptado
+y la latencia de búsqueda en un índice LSH en memoria con `--rows` firmas
+(al azar, más un grupo de variantes reales de un mismo código). Reporta
+candidatos verificados por búsqueda, recall sobre las variantes y falsos
+positivos sobre código no relacionado.
+Uso: python scripts/bench_minhash.py [--rows 100000] [--queries 200] [--budget-ms 1.0]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_code_normalizer import reformat, synthetic_code  # noqa: E402
+
+from app.application.minhash import (  # noqa: E402
+    DEFAULT_BANDS,
+    DEFAULT_NUM_PERM,
+    LSHIndex,
+    minhash_signature,
+)
+
+
+THRESHOLD = 0.9
+
+
+def variant(code: str, rng: random.Random) -> str:
+    """Casi duplicado: una línea cambiada y otra borrada."""
+    lineas = code.split("\n")
+    lineas[rng.randrange(len(lineas))] = "    valor = 0"
+    del lineas[rng.randrange(len(lineas))]
+    return "\n".join(lineas)
+
+
+def main() -> int:
+    """Función principal."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    grande = synthetic_code(40_000)
+    started = time.perf_counter()
+    minhash_signature(grande)
+    print(f"🚀 Firma de {len(grande):,} caracteres: {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+    # Índice: firmas al azar (no colisionan) + variantes de un snippet real
+    index = LSHIndex(DEFAULT_BANDS)
+    started = time.perf_counter()
+    for item_id in range(args.rows):
+        index.add(item_id, tuple(rng.getrandbits(32) for _ in range(DEFAULT_NUM_PERM)))
+    base = synthetic_code(3_000)
+    index.add(args.rows, minhash_signature(base))
+    print(f"📦 Índice con {len(index):,} firmas en {time.perf_counter() - started:.1f} s")
+
+    consultas = [(variant(base, rng), True) for _ in range(args.queries // 2)]
+    consultas += [(reformat(base), True)]
+    consultas += [(synthetic_code(rng.randrange(500, 3_000)).replace("procesar", "otra"), False)
+                  for _ in range(args.queries // 2)]
+
+    tiempos, candidatos, aciertos, falsos = [], [], 0, 0
+    for codigo, esperado in consultas:
+        firma = minhash_signature(codigo)
+        started = time.perf_counter()
+        resultado = index.query(firma, THRESHOLD)
+        tiempos.append((time.perf_counter() - started) * 1e3)
+        candidatos.append(resultado.candidates)
+        encontrado = resultado.match is not None
+        aciertos += encontrado and esperado
+        falsos += encontrado and not esperado
+
+    positivos = sum(1 for _, esperado in consultas if esperado)
+    p99 = statistics.quantiles(tiempos, n=100)[98]
+    print(f"{'búsqueda':<28}{'valor':>12}")
+    print(f"{'latencia p50 (ms)':<28}{statistics.median(tiempos):>12.3f}")
+    print(f"{'latencia p99 (ms)':<28}{p99:>12.3f}")
+    print(f"{'candidatos por búsqueda':<28}{statistics.mean(candidatos):>12.2f}")
+    print(f"{'recall variantes':<28}{aciertos / positivos:>12.2%}")
+    print(f"{'falsos positivos':<28}{falsos:>12}")
+
+    if p99 > args.budget_ms:
+        print(f"❌ p99 por encima del presupuesto de {args.budget_ms} ms")
+        return 1
+    print("✅ Benchmark completado")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())